@@ -1,27 +1,36 @@
 from heapq import heappush, heappop, heapify
+from time import perf_counter
+import warnings
 import numpy as np
 
-from queue import PriorityQueue
+from openlist import TieBreakingOpenList
+
+
+def state_key(state):
+    """
+    :param state: a state (numpy array)
+    :return: a hashable key identifying the state, used for the explored table
+    """
+    return tuple(state.ravel().tolist())
+
 
 class PathNode:
-    def __init__(self, state, parent, cost, evaluation):
+    def __init__(self, state, parent, cost, evaluation, key=None, move=None):
         """
 
         :param state: the current state
         :param parent: the previous node (PathNode)
         :param cost: the cost from the start state to the current state i.e. g(n)
         :param evaluation: the state value f(n) = g(n) + h(n)
+        :param key: the hashable key of the state, computed with state_key if not given
+        :param move: the moves (LURD string, usually one letter) from the parent to this state, if known
         """
-        self.state = ()
-        row = state.shape[0]
-        col = state.shape[1]
-        for i in range(row):
-            for j in range(col):
-                self.state = self.state + (state[i,j],)
+        self.state = state_key(state) if key is None else key
         self.state1 = state
         self.parent = parent
         self.cost = cost
         self.evaluation = evaluation
+        self.move = move
 
     def __lt__(self, other):
         if self.evaluation < other.evaluation:
@@ -30,41 +39,373 @@ class PathNode:
             return False
 
 
-def a_star_search(start_state, goal_test, next_states, heuristic):
+def solution_moves(goal_node):
+    """
+    :param goal_node: a node returned by a_star_search with labeled=True
+    :return: the LURD move string from the start state to goal_node
+    """
+    moves = []
+    node = goal_node
+    while node.parent is not None:
+        moves.append(node.move)
+        node = node.parent
+    moves.reverse()
+    return "".join(moves)
+
+
+class SearchStats:
+    """
+    Optional instrumentation for a_star_search. Pass an instance as `stats` to collect cumulative time and call
+    counts per phase, plus counters that the plain return value does not include. When no stats object is given
+    the search runs the uninstrumented functions directly, so there is no overhead.
+    """
+    PHASES = ("goal_test", "successors", "heuristic", "hashing", "heap_push", "heap_pop")
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(self.PHASES, 0.0)
+        self.calls = dict.fromkeys(self.PHASES, 0)
+        self.total_seconds = 0.0
+        self.node_generated = 0
+        self.node_expanded = 0
+        self.duplicates_skipped = 0  # popped nodes dropped because explored already had them at <= cost
+        self.reopened = 0  # popped nodes expanded again because they were reached more cheaply
+        self.reexpanded = 0  # partial expansion: nodes popped again to add their next f layer of children
+        self.closed_duplicates_avoided = 0  # early duplicate detection: successors already expanded at <= cost
+        self.open_duplicates_avoided = 0  # early duplicate detection: successors already on open at <= cost
+        self.consistency_violations = 0  # consistent mode: edges seen where h(parent) > cost + h(child)
+        self.peak_heap_size = 0
+
+    def _timed(self, phase, fn):
+        seconds = self.seconds
+        calls = self.calls
+
+        def timed(*args):
+            start = perf_counter()
+            result = fn(*args)
+            seconds[phase] += perf_counter() - start
+            calls[phase] += 1
+            return result
+        return timed
+
+    def _timed_push(self, push):
+        timed = self._timed("heap_push", push)
+
+        def push_and_track(heap, node):
+            timed(heap, node)
+            if len(heap) > self.peak_heap_size:
+                self.peak_heap_size = len(heap)
+        return push_and_track
+
+    def instrument(self, goal_test, next_states, heuristic, make_key, push, pop):
+        """
+        :return: timed wrappers of the given functions, in the same order
+        """
+        return (self._timed("goal_test", goal_test),
+                self._timed("successors", next_states),
+                self._timed("heuristic", heuristic),
+                self._timed("hashing", make_key),
+                self._timed_push(push),
+                self._timed("heap_pop", pop))
+
+    def report(self):
+        """
+        :return: a human readable multi-line summary
+        """
+        lines = ["{:<12} {:>10} {:>10} {:>7}".format("PHASE", "SECONDS", "CALLS", "%")]
+        total = self.total_seconds or 1.0
+        for phase in self.PHASES:
+            lines.append("{:<12} {:>10.3f} {:>10} {:>6.1f}%".format(
+                phase, self.seconds[phase], self.calls[phase], 100 * self.seconds[phase] / total))
+        other = self.total_seconds - sum(self.seconds.values())
+        lines.append("{:<12} {:>10.3f} {:>10} {:>6.1f}%".format("other", other, "", 100 * other / total))
+        lines.append("Nodes generated: {}".format(self.node_generated))
+        lines.append("Nodes expanded: {}".format(self.node_expanded))
+        lines.append("Duplicates skipped: {}".format(self.duplicates_skipped))
+        lines.append("Reopened: {}".format(self.reopened))
+        lines.append("Re-expanded (partial expansion): {}".format(self.reexpanded))
+        lines.append("Duplicates avoided (closed/open): {}/{}".format(
+            self.closed_duplicates_avoided, self.open_duplicates_avoided))
+        lines.append("Consistency violations: {}".format(self.consistency_violations))
+        lines.append("Peak heap size: {}".format(self.peak_heap_size))
+        return "\n".join(lines)
+
+
+class SearchProgress:
     """
+    A progress event of iter_a_star_search. The last event of a search has done set, and goal_node set if a goal
+    was found.
+    """
+
+    def __init__(self, f_bound, node_generated, node_expanded, open_size, closed_size, elapsed_seconds,
+                 done=False, goal_node=None):
+        """
+
+        :param f_bound: the f value of the node expanded last, i.e. the f layer the search has reached
+        :param node_generated: the number of nodes generated so far
+        :param node_expanded: the number of nodes expanded so far
+        :param open_size: the number of nodes on the open list
+        :param closed_size: the number of states in the explored table
+        :param elapsed_seconds: the time since the search (or this run of a resumed search) started
+        :param done: True for the last event
+        :param goal_node: the goal node, for the last event of a successful search
+        """
+        self.f_bound = f_bound
+        self.node_generated = node_generated
+        self.node_expanded = node_expanded
+        self.open_size = open_size
+        self.closed_size = closed_size
+        self.elapsed_seconds = elapsed_seconds
+        self.done = done
+        self.goal_node = goal_node
+
+    @property
+    def nodes_per_second(self):
+        return self.node_expanded / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+def iter_a_star_search(start_state, goal_test, next_states, heuristic, stats=None, trace=None, key=None,
+                       step_cost=None, labeled=False, checkpoint=None, resume=None, progress_every=10000,
+                       partial_expansion=False, early_duplicate_detection=False, open_list=None,
+                       tie_breaking=None, consistent=False, consistency_sample=0, closed_set=None):
+    """
+    Generator form of a_star_search. It yields a SearchProgress every progress_every expansions and a final one with
+    done set. The caller drives the search: it can pause between events, stop early by closing the generator, or
+    feed the events into a progress display.
+
     :param start_state:
     :param goal_test: a function, return true only when the input is the goal state
     :param next_states: a function, return a list of all successor states
     :param heuristic: a function, return the heuristic function value of the given state
-    :return:
+    :param stats: an optional SearchStats, filled in with per-phase timings and counters
+    :param trace: an optional searchtrace.TraceWriter (or anything with expand(node) and goal(node)), told about
+        every expansion and the goal node
+    :param key: a function mapping a state to the hashable key used for duplicate detection, state_key by default.
+        States with equal keys must be interchangeable, e.g. symmetry.symmetric_key for symmetric levels
+    :param step_cost: a function (state, successor) -> cost of that edge, for successor functions whose steps are
+        not all a single move (e.g. macros.keeper_distance with macros.macro_next_states). Every edge costs 1 if None
+    :param labeled: if True, next_states returns (move, state) pairs instead of states, where move is the LURD string
+        of the edge (e.g. hw3.next_moves). The move is kept on the node, so the solution can be read back with
+        solution_moves, and the edge costs len(move)
+    :param checkpoint: an optional checkpoint.Checkpointer, asked before every expansion whether a snapshot of the
+        search is due. States must be numpy arrays and keys tuples or bytes, which is checked before the search starts
+    :param resume: a checkpoint.SearchCheckpoint to continue from, in which case start_state is ignored
+    :param progress_every: the number of expansions between progress events, or None for only the final event
+    :param partial_expansion: if True, run partial-expansion A* (PEA*). An expanded node only gets the successors
+        whose f equals its own stored f, and goes back on the open list with the smallest f of the rest, to add those
+        when the search reaches that f. Successors that are never needed are never allocated, at the price of
+        generating the successor states of a node once per f layer. Not compatible with checkpoint/resume
+    :param early_duplicate_detection: if True, look every successor up in a table of the best g each state has been
+        generated with, and drop it before its node is built or its heuristic computed if it is no cheaper than that.
+        Costs one table entry per distinct state generated
+    :param open_list: a factory of the open list, e.g. openlist.BucketOpenList. A plain heapq list by default
+    :param tie_breaking: the order of nodes with equal f: "high_g", "low_h", "lifo", "fifo" or a function mapping a
+        node to a secondary key, smallest first (see openlist.TieBreakingOpenList). By default nodes with equal f
+        pop in whatever order the heap leaves them
+    :param consistent: if True, rely on the heuristic being consistent (h(s) <= cost(s, s') + h(s') on every edge), so
+        that a state is reached at its lowest cost the first time it is expanded. Expanded states are then final: a
+        popped node is skipped if its state is closed, without comparing costs, and a successor whose state is closed
+        is dropped before its heuristic is computed. Every edge whose successor is kept is checked for free (f must
+        not drop along it), as is every dropped successor that was reached more cheaply than when it was closed. On
+        the first violation a RuntimeWarning is issued; the search carries on, but its solution may not be optimal
+    :param consistency_sample: with consistent, also compute the heuristic of every consistency_sample-th dropped
+        successor to check its edge. 0 (the default) checks none of them
+    :param closed_set: a factory of the explored table, e.g. a closedset.HashClosedSet (exact, with packed keys) or
+        closedset.BloomClosedSet (approximate). A dict by default. Not compatible with checkpoint/resume, partial
+        expansion or early duplicate detection
+    :return: a generator of SearchProgress
     """
-    pq = PriorityQueue()
-    initial_node = PathNode(start_state, None, 0, heuristic(start_state))
-    pq.put(initial_node)
-    explored = dict()
-
-    node_generated = 1
-    node_expanded = 0
+    if partial_expansion and (checkpoint is not None or resume is not None):
+        raise ValueError("partial expansion does not support checkpoints")
+    if consistency_sample and not consistent:
+        raise ValueError("consistency_sample needs consistent=True")
+    if closed_set is not None and (checkpoint is not None or resume is not None or partial_expansion
+                                   or early_duplicate_detection):
+        raise ValueError("closed_set cannot be combined with checkpoints, partial expansion or early duplicate "
+                         "detection")
+    make_key = state_key if key is None else key
+    push = heappush
+    pop = heappop
+    pq = []
+    if tie_breaking is not None:
+        if open_list is not None:
+            raise ValueError("tie_breaking and open_list cannot be combined")
+        open_list = lambda: TieBreakingOpenList(tie_breaking)
+    if open_list is not None:
+        pq = open_list()
+        push = type(pq).push
+        pop = type(pq).pop
+    start_time = perf_counter()
+    if stats is not None:
+        goal_test, next_states, heuristic, make_key, push, pop = stats.instrument(
+            goal_test, next_states, heuristic, make_key, push, pop)
 
-    while pq:
-        node = pq.get()
-        if goal_test(node.state1):
-            return node, node_generated, node_expanded
-        old_cost = explored.get(node.state)
-        if old_cost is not None and old_cost <= node.cost:
-            continue
-        explored[node.state] = node.cost
-        all_successors = next_states(node.state1)
-        node_expanded += 1
-        for s in all_successors:
-            new_cost = node.cost + 1
-            new_node = PathNode(s, node, new_cost, new_cost + heuristic(s))
-            node_generated += 1
-            pq.put(new_node)
+    if resume is None:
+        initial_node = PathNode(start_state, None, 0, heuristic(start_state), make_key(start_state))
+        push(pq, initial_node)
+        explored = dict() if closed_set is None else closed_set()
+        node_generated = 1
+        node_expanded = 0
+        duplicates_skipped = 0
+        reopened = 0
+    else:
+        restored, explored, (node_generated, node_expanded, duplicates_skipped, reopened) = resume.restore(make_key)
+        if open_list is None:
+            pq = restored
+        else:
+            for node in restored:
+                pq.push(node)
+    if checkpoint is not None:
+        # Fail now on states or keys that cannot be saved, not at the first save.
+        first = initial_node if resume is None else (restored[0] if restored else None)
+        if first is not None:
+            checkpoint.check(first.state1, first.state)
+    goal_node = None
+    reexpanded = 0
+    closed_duplicates_avoided = 0
+    open_duplicates_avoided = 0
+    consistency_violations = 0
+    dropped = 0  # consistent mode: closed successors dropped, for sampling
+    best_cost = None
+    if early_duplicate_detection:
+        best_cost = dict(explored)
+        for queued in pq:
+            if best_cost.get(queued.state, queued.cost) >= queued.cost:
+                best_cost[queued.state] = queued.cost
+    reentries = set()  # ids of the nodes on the open list that partial expansion put back
 
-    return None, node_generated, node_expanded
+    try:
+        while pq:
+            if checkpoint is not None and checkpoint.due(node_expanded):
+                checkpoint.save(pq, explored, (node_generated, node_expanded, duplicates_skipped, reopened))
+            node = pop(pq)
+            reentry = partial_expansion and id(node) in reentries
+            if reentry:
+                reentries.discard(id(node))
+                if explored[node.state] < node.cost:
+                    duplicates_skipped += 1
+                    continue
+                all_successors = next_states(node.state1)
+                reexpanded += 1
+            else:
+                if goal_test(node.state1):
+                    goal_node = node
+                    if trace is not None:
+                        trace.goal(node)
+                    break
+                if consistent:
+                    if node.state in explored:
+                        duplicates_skipped += 1
+                        continue
+                else:
+                    old_cost = explored.get(node.state)
+                    if old_cost is not None:
+                        if old_cost <= node.cost:
+                            duplicates_skipped += 1
+                            continue
+                        reopened += 1
+                explored[node.state] = node.cost
+                all_successors = next_states(node.state1)
+                node_expanded += 1
+                if trace is not None:
+                    trace.expand(node)
+            bound = node.evaluation
+            next_bound = None
+            for s in all_successors:
+                if labeled:
+                    move, s = s
+                    new_cost = node.cost + len(move)
+                else:
+                    move = None
+                    new_cost = node.cost + (1 if step_cost is None else step_cost(node.state1, s))
+                new_key = make_key(s)
+                if consistent:
+                    closed_cost = explored.get(new_key)
+                    if closed_cost is not None:
+                        closed_duplicates_avoided += 1
+                        violated = new_cost < closed_cost
+                        if not violated and consistency_sample and not reentry:
+                            dropped += 1
+                            if dropped % consistency_sample == 0:
+                                violated = node.evaluation > new_cost + heuristic(s)
+                        if violated:
+                            consistency_violations += 1
+                            if consistency_violations == 1:
+                                _warn_inconsistent(node)
+                        continue
+                if best_cost is not None:
+                    known_cost = best_cost.get(new_key)
+                    if known_cost is not None and known_cost <= new_cost:
+                        if new_key in explored:
+                            closed_duplicates_avoided += 1
+                        else:
+                            open_duplicates_avoided += 1
+                        continue
+                new_evaluation = new_cost + heuristic(s)
+                if consistent and not reentry and new_evaluation < node.evaluation:
+                    consistency_violations += 1
+                    if consistency_violations == 1:
+                        _warn_inconsistent(node)
+                if partial_expansion and new_evaluation != bound:
+                    # Successors below the bound were added when the node was first expanded (an inconsistent
+                    # heuristic can make them drop below it), and the ones above wait for a later re-expansion.
+                    if new_evaluation > bound:
+                        if next_bound is None or new_evaluation < next_bound:
+                            next_bound = new_evaluation
+                        continue
+                    if reentry:
+                        continue
+                if best_cost is not None:
+                    best_cost[new_key] = new_cost
+                new_node = PathNode(s, node, new_cost, new_evaluation, new_key, move)
+                node_generated += 1
+                push(pq, new_node)
+            if next_bound is not None:
+                node.evaluation = next_bound
+                reentries.add(id(node))
+                push(pq, node)
+            # Re-expansions of partial expansion do not count as expansions, so they never yield an event.
+            if progress_every and not reentry and node_expanded % progress_every == 0:
+                yield SearchProgress(bound, node_generated, node_expanded, len(pq), len(explored),
+                                     perf_counter() - start_time)
+    finally:
+        if stats is not None:
+            stats.total_seconds += perf_counter() - start_time
+            stats.node_generated += node_generated
+            stats.node_expanded += node_expanded
+            stats.duplicates_skipped += duplicates_skipped
+            stats.reopened += reopened
+            stats.reexpanded += reexpanded
+            stats.closed_duplicates_avoided += closed_duplicates_avoided
+            stats.open_duplicates_avoided += open_duplicates_avoided
+            stats.consistency_violations += consistency_violations
 
+    yield SearchProgress(goal_node.evaluation if goal_node else None, node_generated, node_expanded, len(pq),
+                         len(explored), perf_counter() - start_time, True, goal_node)
 
 
+def _warn_inconsistent(node):
+    warnings.warn("the heuristic is not consistent (seen on an edge from a node with g = {}), so the search with "
+                  "consistent=True may not find an optimal solution".format(node.cost), RuntimeWarning, stacklevel=3)
 
 
+def a_star_search(start_state, goal_test, next_states, heuristic, stats=None, trace=None, key=None,
+                  step_cost=None, labeled=False, checkpoint=None, resume=None, partial_expansion=False,
+                  early_duplicate_detection=False, open_list=None, tie_breaking=None, consistent=False,
+                  consistency_sample=0, closed_set=None):
+    """
+    :param start_state:
+    :param goal_test: a function, return true only when the input is the goal state
+    :param next_states: a function, return a list of all successor states
+    :param heuristic: a function, return the heuristic function value of the given state
+    :param stats, trace, key, step_cost, labeled, checkpoint, resume, partial_expansion, early_duplicate_detection,
+        open_list, tie_breaking, consistent, consistency_sample, closed_set: see iter_a_star_search
+    :return: the goal node (None if there is none), the number of nodes generated and the number of nodes expanded
+    """
+    for progress in iter_a_star_search(start_state, goal_test, next_states, heuristic, stats, trace, key,
+                                       step_cost, labeled, checkpoint, resume, progress_every=None,
+                                       partial_expansion=partial_expansion,
+                                       early_duplicate_detection=early_duplicate_detection, open_list=open_list,
+                                       tie_breaking=tie_breaking, consistent=consistent,
+                                       consistency_sample=consistency_sample, closed_set=closed_set):
+        pass
+    return progress.goal_node, progress.node_generated, progress.node_expanded
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Solve many levels at once on a process pool.
+
+`solve_batch` takes any iterable of levels (XSB `levels.Level`s, plain
+states, or (name, state) pairs) and a `SolverConfig`, and yields a
+`BatchResult` for each level as soon as it is solved, in completion
+order. Per-level fixed costs are paid once where possible:
+
+* the worker processes and their imports are reused for every level,
+* static layout tables (the tunnel/goal-room analysis used by macro
+  pushes) are computed once per distinct layout in the parent, and
+  shipped to the workers with each level of that layout, and
+* levels are read lazily, with only a bounded number in flight, so a
+  collection of thousands of levels is never held in memory at once.
+
+With `optimize`, each solution is shortened by postopt.optimize before
+it is returned, e.g. after an inexact engine such as "pi-corral".
+
+    for result in batch.solve_batch(levels.iter_levels("set.xsb"),
+                                    batch.SolverConfig("hUID", macros=True)):
+        print(result.name, result.status, result.depth)
+
+    python batch.py set.xsb -H hUID --macros -j 8
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+
+import astar
+import hw3
+import levels
+import macros
+import postopt
+from solvers import ENGINES, HEURISTICS
+
+State = npt.NDArray[np.int_]
+LevelInput = Union[levels.Level, State, list[list[int]], tuple[str, State]]
+
+
+@dataclass(frozen=True)
+class SolverConfig:
+    heuristic: str = "hUID"
+    engine: str = "astar"  # A key of solvers.ENGINES.
+    macros: bool = False  # Tunnel/goal-room macro pushes (numpy engines only).
+    optimize: bool = False  # Shorten solutions with postopt.optimize.
+
+    def check(self) -> None:
+        if self.heuristic not in HEURISTICS:
+            raise ValueError(f"unknown heuristic {self.heuristic!r}")
+        if self.engine not in ENGINES:
+            raise ValueError(f"unknown engine {self.engine!r}")
+        if self.macros and self.engine in ("flat", "push", "pi-corral"):
+            raise ValueError(f"macro pushes need a numpy engine, not {self.engine!r}")
+
+
+@dataclass
+class BatchResult:
+    index: int  # Position of the level in the input, from 0.
+    name: str
+    status: str  # solved, unsolvable or error.
+    moves: Optional[str] = None
+    depth: Optional[int] = None
+    nodes_generated: Optional[int] = None
+    nodes_expanded: Optional[int] = None
+    elapsed_seconds: Optional[float] = None
+    error: Optional[str] = None
+    optimize_error: Optional[str] = None  # The search's moves were kept.
+
+
+def _named(index: int, level: LevelInput) -> tuple[str, State]:
+    if isinstance(level, levels.Level):
+        return level.title or f"#{level.index}", level.state
+    if isinstance(level, tuple):
+        name, state = level
+        return name, np.asarray(state)
+    return f"#{index + 1}", np.asarray(level)
+
+
+def solve_level(index: int, name: str, state: State, config: SolverConfig,
+                analysis: Optional[macros.LevelAnalysis] = None) -> BatchResult:
+    """Solve one level in this process. Errors become an "error" result."""
+    try:
+        start = time.perf_counter()
+        successors = hw3.next_moves
+        if config.macros:
+            successors = macros.macro_next_moves(state, analysis)
+        goal_node, generated, expanded = ENGINES[config.engine](
+            state, hw3.goal_test, successors, HEURISTICS[config.heuristic],
+            labeled=True,
+        )
+    except Exception as err:  # Reported in the result, not raised.
+        return BatchResult(index, name, "error", error=repr(err))
+    if goal_node is None:
+        return BatchResult(index, name, "unsolvable", None, None,
+                           generated, expanded, time.perf_counter() - start)
+    moves = astar.solution_moves(goal_node)
+    optimize_error = None
+    if config.optimize:
+        try:
+            moves = postopt.optimize(state, moves)
+        except Exception as err:  # The level is solved anyway: keep the search's moves.
+            optimize_error = repr(err)
+    elapsed = time.perf_counter() - start
+    return BatchResult(index, name, "solved", moves, len(moves),
+                       generated, expanded, elapsed, optimize_error=optimize_error)
+
+
+def solve_batch(
+    level_inputs: Iterable[LevelInput],
+    config: SolverConfig = SolverConfig(),
+    max_workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> Iterator[BatchResult]:
+    """Yield a BatchResult per level, in completion order.
+
+    :param max_workers: pool size (CPU count by default). With an
+        executor, its number of workers, which bounds the levels in flight
+    :param executor: an existing executor to reuse across batches
+    """
+    config.check()
+    max_workers = max_workers or os.cpu_count() or 1
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers)
+    in_flight_limit = 2 * max_workers
+    pending: set[Future] = set()
+    try:
+        for index, level in enumerate(level_inputs):
+            name, state = _named(index, level)
+            analysis = None
+            if config.macros:
+                # analyze_level is cached by layout, so levels sharing a
+                # layout share one analysis.
+                try:
+                    analysis = macros.analyze_level(state)
+                except Exception as err:
+                    yield BatchResult(index, name, "error", error=repr(err))
+                    continue
+            pending.add(executor.submit(solve_level, index, name, state, config, analysis))
+            while len(pending) >= in_flight_limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Solve every level of an XSB collection.")
+    parser.add_argument("path")
+    parser.add_argument("-H", "--heuristic", default="hUID", choices=HEURISTICS.keys())
+    parser.add_argument("-E", "--engine", default="astar", choices=ENGINES.keys())
+    parser.add_argument("--macros", action="store_true", help="use macro pushes")
+    parser.add_argument("--optimize", action="store_true",
+                        help="shorten each solution after the search")
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    config = SolverConfig(args.heuristic, args.engine, args.macros, args.optimize)
+    start = time.perf_counter()
+    solved = total = 0
+    print(f"{'LEVEL':>20} | {'STATUS':>10} | {'DEPTH':>5} | {'NODES EXP':>9} | {'SECONDS':>8}")
+    for result in solve_batch(levels.iter_levels(args.path), config, args.workers):
+        total += 1
+        solved += result.status == "solved"
+        depth = result.depth if result.depth is not None else "-"
+        expanded = result.nodes_expanded if result.nodes_expanded is not None else "-"
+        seconds = f"{result.elapsed_seconds:8.3f}" if result.elapsed_seconds is not None else f"{'-':>8}"
+        print(f"{result.name:>20} | {result.status:>10} | {depth:>5} | {expanded:>9} | {seconds}")
+        if result.error:
+            print(f"    {result.error}", file=sys.stderr)
+        if result.optimize_error:
+            print(f"    optimizer failed: {result.optimize_error}", file=sys.stderr)
+    print(f"Solved {solved}/{total} in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
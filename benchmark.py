@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""Regression benchmarks for the Sokoban solver.
+
+Runs every configured level x heuristic x engine combination a number of
+times and records node counts, throughput, wall time percentiles and
+peak traced memory as JSON. Results can be compared against a stored
+baseline (a previous JSON report) or against the `[nodes, depth]`
+figures in the hw3.py problem comments, and regressions beyond a
+threshold are flagged.
+
+Examples:
+
+    python benchmark.py -l s1-s9 -H h1 hUID -r 5 -o base.json
+    python benchmark.py -l s1-s9 -H h1 hUID -r 5 -b base.json -t 0.1
+    python benchmark.py -l s1-s16 -H h0 -b reference
+    python benchmark.py -l s1-s19 -H hUID -r 1 --no-memory --by-engine \
+        -E astar tie-high_g tie-lifo tie-fifo tie-misplaced
+"""
+
+import json
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Iterable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+import astar
+import hw3
+import levels
+from solvers import ADMISSIBLE_HEURISTICS, ENGINES, EXACT_ENGINES, HEURISTICS
+
+State = npt.NDArray[np.int_]
+
+
+def reference_figures() -> dict[str, tuple[Optional[int], int]]:
+    """Parse the `[nodes, depth]` comments above `s1`...`s19` in hw3.py.
+
+    The node count is the number of expansions using h0 and is None
+    where the comment gives `??`.
+    """
+    with open(hw3.__file__, encoding="utf-8") as file:
+        source = file.read()
+    figures = {}
+    pattern = r"#\s*\[(\d+|\?\?),\s*(\d+)\].*\n(?:#.*\n|\s*\n)*(s\d+)\s*="
+    for nodes, depth, name in re.findall(pattern, source):
+        figures[name] = (None if nodes == "??" else int(nodes), int(depth))
+    return figures
+
+
+def resolve_levels(specs: Iterable[str]) -> list[tuple[str, State]]:
+    """Expand level specs into (name, state) pairs.
+
+    A spec is a predefined problem (`s7`), a range (`s1-s9`), an XSB
+    file (every level in it) or `FILE:N` for one level of a file.
+    """
+    resolved = []
+    for spec in specs:
+        match = re.match(r"^s(\d+)(?:-s?(\d+))?$", spec, re.IGNORECASE)
+        if match:
+            first = int(match.group(1))
+            last = int(match.group(2) or first)
+            for num in range(first, last + 1):
+                resolved.append((f"s{num}", np.array(getattr(hw3, f"s{num}"))))
+            continue
+        path, _, index = spec.rpartition(":")
+        if path and index.isdigit():
+            level = levels.load_level(path, int(index))
+            resolved.append((spec, level.state))
+        else:
+            for level in levels.iter_levels(spec):
+                resolved.append((f"{spec}:{level.index}", level.state))
+    return resolved
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Linearly interpolated percentile, `q` in [0, 100]."""
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+@dataclass
+class CaseResult:
+    level: str
+    heuristic: str
+    engine: str
+    repeats: int
+    solved: bool
+    depth: Optional[int]
+    nodes_generated: int
+    nodes_expanded: int
+    nodes_per_second: float
+    seconds: dict[str, float] = field(default_factory=dict)
+    peak_memory_bytes: Optional[int] = None
+
+
+def _solution_depth(goal_node: Optional[astar.PathNode]) -> Optional[int]:
+    # The number of moves, which is the number of edges only for engines
+    # whose steps are single moves (not e.g. the push engines).
+    if goal_node is None:
+        return None
+    return goal_node.cost
+
+
+def run_case(
+    level_name: str,
+    state: State,
+    heuristic_name: str,
+    engine_name: str,
+    repeats: int = 3,
+    track_memory: bool = True,
+) -> CaseResult:
+    """Benchmark one combination.
+
+    Timed runs are done without tracing; peak memory is measured in one
+    extra traced run so it does not skew the timings.
+    """
+    heuristic = HEURISTICS[heuristic_name]
+    engine = ENGINES[engine_name]
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        goal_node, generated, expanded = engine(
+            state, hw3.goal_test, hw3.next_states, heuristic
+        )
+        times.append(time.perf_counter() - start)
+
+    peak = None
+    if track_memory:
+        tracemalloc.start()
+        try:
+            engine(state, hw3.goal_test, hw3.next_states, heuristic)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    median = percentile(times, 50)
+    return CaseResult(
+        level=level_name,
+        heuristic=heuristic_name,
+        engine=engine_name,
+        repeats=repeats,
+        solved=goal_node is not None,
+        depth=_solution_depth(goal_node),
+        nodes_generated=generated,
+        nodes_expanded=expanded,
+        nodes_per_second=generated / median if median > 0 else 0.0,
+        seconds={
+            "min": min(times),
+            "p50": median,
+            "p90": percentile(times, 90),
+            "p99": percentile(times, 99),
+            "max": max(times),
+        },
+        peak_memory_bytes=peak,
+    )
+
+
+def run_benchmark(
+    level_specs: Iterable[str],
+    heuristic_names: Iterable[str],
+    engine_names: Iterable[str],
+    repeats: int = 3,
+    track_memory: bool = True,
+    progress: Optional[Callable[[str], None]] = None,
+) -> dict[str, Any]:
+    """Run every combination and return a JSON-serialisable report."""
+    heuristic_names = list(heuristic_names)
+    engine_names = list(engine_names)
+    results = []
+    for level_name, state in resolve_levels(level_specs):
+        for heuristic_name in heuristic_names:
+            for engine_name in engine_names:
+                if progress:
+                    progress(f"{level_name} {heuristic_name} {engine_name}")
+                result = run_case(
+                    level_name, state, heuristic_name, engine_name,
+                    repeats, track_memory,
+                )
+                results.append(asdict(result))
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def reference_baseline() -> dict[str, Any]:
+    """Turn the hw3.py comment figures into a baseline report."""
+    results = []
+    for name, (nodes, depth) in reference_figures().items():
+        results.append({
+            "level": name,
+            "heuristic": "h0",
+            "engine": "astar",
+            "depth": depth,
+            "nodes_expanded": nodes,
+        })
+    return {"meta": {"source": "hw3.py comments"}, "results": results}
+
+
+def compare(
+    report: dict[str, Any],
+    baseline: dict[str, Any],
+    threshold: float = 0.1,
+) -> list[str]:
+    """Return a description of every regression of `report` vs `baseline`.
+
+    Node counts and median time regress when they grow by more than
+    `threshold` (a fraction). A solution depth that differs from the
+    baseline is always a regression. Depths from the reference figures
+    are optimal depths, so they are only checked for exact engines with
+    admissible heuristics.
+    """
+    def key(r: dict[str, Any]) -> tuple[str, str, str]:
+        return (r["level"], r["heuristic"], r["engine"])
+
+    base = {key(r): r for r in baseline["results"]}
+    optimal = {
+        r["level"]: r["depth"]
+        for r in baseline["results"]
+        if baseline["meta"].get("source") == "hw3.py comments"
+    }
+    regressions = []
+    for result in report["results"]:
+        label = "{} {} {}".format(*key(result))
+        old = base.get(key(result), {})
+
+        expected_depth = old.get("depth")
+        if (expected_depth is None and result["engine"] in EXACT_ENGINES
+                and result["heuristic"] in ADMISSIBLE_HEURISTICS):
+            expected_depth = optimal.get(result["level"])
+        if expected_depth is not None and result["depth"] != expected_depth:
+            regressions.append(
+                f"{label}: depth {result['depth']} != {expected_depth}"
+            )
+
+        checks = [
+            ("nodes_generated", old.get("nodes_generated"), result["nodes_generated"]),
+            ("nodes_expanded", old.get("nodes_expanded"), result["nodes_expanded"]),
+            ("p50 seconds", old.get("seconds", {}).get("p50"), result["seconds"]["p50"]),
+        ]
+        for what, before, after in checks:
+            if before and after > before * (1 + threshold):
+                regressions.append(
+                    f"{label}: {what} {before:g} -> {after:g} "
+                    f"(+{(after / before - 1) * 100:.1f}%)"
+                )
+    return regressions
+
+
+def print_table(report: dict[str, Any]) -> None:
+    print(f"{'LEVEL':>12} | {'HEUR':>5} | {'ENGINE':>8} | {'NODES GEN':>9} | "
+          f"{'NODES EXP':>9} | {'NODES/S':>9} | {'P50 S':>8} | {'PEAK MB':>7} | D")
+    for r in report["results"]:
+        peak = r["peak_memory_bytes"]
+        peak_str = f"{peak / 2**20:7.2f}" if peak is not None else f"{'-':>7}"
+        print(f"{r['level']:>12} | {r['heuristic']:>5} | {r['engine']:>8} | "
+              f"{r['nodes_generated']:>9} | {r['nodes_expanded']:>9} | "
+              f"{r['nodes_per_second']:>9.0f} | {r['seconds']['p50']:>8.3f} | "
+              f"{peak_str} | {r['depth']}")
+
+
+def print_expansions_by_engine(report: dict[str, Any]) -> None:
+    """One row per level and heuristic, one column of expansions per
+    engine, with the change relative to the first engine."""
+    engines = list(dict.fromkeys(r["engine"] for r in report["results"]))
+    rows: dict[tuple[str, str], dict[str, int]] = {}
+    for r in report["results"]:
+        rows.setdefault((r["level"], r["heuristic"]), {})[r["engine"]] = r["nodes_expanded"]
+    print(f"{'LEVEL':>12} | {'HEUR':>5} | " + " | ".join(f"{e:>18}" for e in engines))
+    for (level, heuristic), expanded in rows.items():
+        first = expanded.get(engines[0])
+        cells = []
+        for engine in engines:
+            count = expanded.get(engine)
+            if count is None:
+                cells.append(f"{'-':>18}")
+            elif engine == engines[0] or not first:
+                cells.append(f"{count:>18}")
+            else:
+                cells.append(f"{count:>10} ({(count / first - 1) * 100:+5.1f}%)")
+        print(f"{level:>12} | {heuristic:>5} | " + " | ".join(cells))
+
+
+parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+parser.add_argument(
+    "-C", "--config",
+    help="JSON file with any of the keys levels/heuristics/engines/repeat",
+)
+parser.add_argument(
+    "-l", "--levels", nargs="+", default=["s1-s9"],
+    help="levels to run: s7, s1-s9, FILE or FILE:N (default: s1-s9)",
+)
+parser.add_argument(
+    "-H", "--heuristics", nargs="+", default=["h1", "hUID"],
+    choices=HEURISTICS.keys(),
+)
+parser.add_argument(
+    "-E", "--engines", nargs="+", default=["astar"], choices=ENGINES.keys(),
+)
+parser.add_argument("-r", "--repeat", type=int, default=3)
+parser.add_argument(
+    "--no-memory", dest="track_memory", action="store_false",
+    help="skip the extra traced run used to measure peak memory",
+)
+parser.add_argument(
+    "--by-engine", action="store_true",
+    help="also print expansions side by side per engine, e.g. to compare "
+         "the tie-breaking policies",
+)
+parser.add_argument("-o", "--output", help="write the JSON report here")
+parser.add_argument(
+    "-b", "--baseline",
+    help="JSON report to compare against, or `reference` for the "
+         "[nodes, depth] figures in hw3.py",
+)
+parser.add_argument(
+    "-t", "--threshold", type=float, default=0.1,
+    help="relative growth that counts as a regression (default: 0.1)",
+)
+
+
+def main() -> None:
+    args = parser.parse_args()
+    if args.config:
+        with open(args.config, encoding="utf-8") as file:
+            config = json.load(file)
+        for name in ("levels", "heuristics", "engines", "repeat"):
+            if name in config:
+                setattr(args, name, config[name])
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    report = run_benchmark(
+        args.levels,
+        args.heuristics,
+        args.engines,
+        args.repeat,
+        args.track_memory,
+        progress=lambda what: print(f"\rRunning {what}...", end="",
+                                    file=sys.stderr),
+    )
+    print("\r", end="", file=sys.stderr)
+    print_table(report)
+    if args.by_engine:
+        print()
+        print_expansions_by_engine(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        if args.baseline == "reference":
+            baseline = reference_baseline()
+        else:
+            with open(args.baseline, encoding="utf-8") as file:
+                baseline = json.load(file)
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Flat bytearray boards.
+
+A `FlatBoard` keeps a state as one `bytearray` of square values, row by
+row, with an extra border of walls around the level. Neighbours are
+found by adding a fixed offset to a flat index (-width, +width, -1, +1),
+and the border means a neighbour is never off the board. So the hot
+loops do plain integer indexing, with no bounds checks and no numpy
+scalars, and `bytes(board.cells)` is a ready-made hash key.
+
+The module mirrors the hw3 search functions under the same names, so
+they can be swapped in:
+
+    start = board.FlatBoard.from_state(s)
+    goal_node, *_ = astar.a_star_search(
+        start, board.goal_test, board.next_moves, board.h605721982,
+        key=board.board_key, labeled=True)
+
+`flat_a_star_search` does this conversion for callers written against
+the numpy functions, e.g. the "flat" engine of benchmark.py.
+"""
+
+from typing import Callable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+import astar
+import hw3
+from hw3 import blank, box, boxstar, keeper, keeperstar, star, wall
+
+State = npt.NDArray[np.int_]
+
+GOALS = (star, boxstar, keeperstar)
+
+
+class FlatBoard:
+    """A Sokoban state as a flat bytearray with a wall border.
+
+    Boards are treated as immutable: successors are new boards.
+    """
+
+    __slots__ = ("cells", "width", "keeper")
+
+    def __init__(self, cells: bytearray, width: int, keeper: int) -> None:
+        """
+        :param cells: square values, row by row, including the border
+        :param width: row length including the border (columns + 2)
+        :param keeper: flat index of the keeper
+        """
+        self.cells = cells
+        self.width = width
+        self.keeper = keeper
+
+    @classmethod
+    def from_state(cls, s: State) -> "FlatBoard":
+        padded = np.pad(np.asarray(s, dtype=np.uint8), 1, constant_values=wall)
+        cells = bytearray(padded.tobytes())
+        index = cells.find(keeper)
+        if index < 0:
+            index = cells.find(keeperstar)
+        return cls(cells, padded.shape[1], index)
+
+    def to_state(self) -> State:
+        flat = np.frombuffer(bytes(self.cells), dtype=np.uint8)
+        return flat.reshape(-1, self.width)[1:-1, 1:-1].astype(np.int_)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.cells) // self.width - 2, self.width - 2
+
+    def position(self, index: int) -> tuple[int, int]:
+        """(row, col) in the unpadded state of a flat index."""
+        row, col = divmod(index, self.width)
+        return row - 1, col - 1
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, FlatBoard) and self.cells == other.cells
+
+    def __hash__(self) -> int:
+        return hash(bytes(self.cells))
+
+    def __repr__(self) -> str:
+        return f"FlatBoard.from_state({self.to_state().tolist()})"
+
+
+def board_key(board: FlatBoard) -> bytes:
+    """State key for astar.a_star_search (`key=board_key`)."""
+    return bytes(board.cells)
+
+
+def goal_test(board: FlatBoard) -> bool:
+    return box not in board.cells
+
+
+def next_moves(board: FlatBoard) -> list[tuple[str, FlatBoard]]:
+    """Same successors, in the same order and with the same LURD labels,
+    as hw3.next_moves."""
+    cells = board.cells
+    width = board.width
+    k = board.keeper
+    current = star if cells[k] == keeperstar else blank
+    result = []
+    for D, offset in (("u", -width), ("d", width), ("l", -1), ("r", 1)):
+        k1 = k + offset
+        v1 = cells[k1]
+        if v1 == blank or v1 == star:
+            child = bytearray(cells)
+            child[k] = current
+            child[k1] = keeper if v1 == blank else keeperstar
+            result.append((D, FlatBoard(child, width, k1)))
+        elif v1 == box or v1 == boxstar:
+            k2 = k1 + offset
+            v2 = cells[k2]
+            if v2 == blank or v2 == star:
+                child = bytearray(cells)
+                child[k] = current
+                child[k1] = keeper if v1 == box else keeperstar
+                child[k2] = box if v2 == blank else boxstar
+                result.append((D.upper(), FlatBoard(child, width, k1)))
+    return result
+
+
+def next_states(board: FlatBoard) -> list[FlatBoard]:
+    return [child for _, child in next_moves(board)]
+
+
+def h0(board: FlatBoard) -> int:
+    return 0
+
+
+def h1(board: FlatBoard) -> int:
+    return board.cells.count(box)
+
+
+def h605721982(board: FlatBoard) -> int:
+    """Port of hw3.h605721982, returning the same values."""
+    cells = board.cells
+    width = board.width
+    goals = [divmod(i, width) for i, v in enumerate(cells) if v in GOALS]
+    k_row, k_col = divmod(board.keeper, width)
+    count = 0
+    i = cells.find(box)
+    while i >= 0:
+        row, col = divmod(i, width)
+        count += min(abs(row - g_row) + abs(col - g_col) for g_row, g_col in goals)
+        count += abs(row - k_row) + abs(col - k_col) - 1
+        if ((cells[i - width] == wall or cells[i + width] == wall)
+                and (cells[i - 1] == wall or cells[i + 1] == wall)):
+            return count + 10000000000000
+        i = cells.find(box, i + 1)
+    return count
+
+
+FLAT_HEURISTICS: dict[Callable, Callable[[FlatBoard], int]] = {
+    hw3.h0: h0,
+    hw3.h1: h1,
+    hw3.h605721982: h605721982,
+}
+
+
+def flat_heuristic(heuristic: Callable[[State], int]) -> Callable[[FlatBoard], int]:
+    """The FlatBoard version of a numpy heuristic: its port if there is
+    one, else a (slow) wrapper that converts each board back to a state."""
+    port = FLAT_HEURISTICS.get(heuristic)
+    if port is not None:
+        return port
+    return lambda board: heuristic(board.to_state())
+
+
+def flat_a_star_search(start_state: State, numpy_goal_test=None, numpy_next_states=None,
+                       heuristic: Optional[Callable[[State], int]] = None, **kwargs):
+    """astar.a_star_search on FlatBoards, with the numpy calling convention.
+
+    The goal test and successor function are accepted for compatibility
+    and replaced by the FlatBoard functions of this module (so they must
+    be hw3's). With labeled=True the FlatBoard next_moves is used. The
+    nodes of the result hold FlatBoards.
+    """
+    successors = next_moves if kwargs.get("labeled") else next_states
+    kwargs.setdefault("key", board_key)
+    return astar.a_star_search(
+        FlatBoard.from_state(start_state),
+        goal_test,
+        successors,
+        flat_heuristic(heuristic or hw3.h0),
+        **kwargs,
+    )
@@ -0,0 +1,220 @@
+"""Checkpoint and resume for long A* searches.
+
+Pass a `Checkpointer` as the `checkpoint` argument of
+`astar.a_star_search`. Every `every` expansions, it writes a snapshot of
+the open list, the explored table and the counters to `path`, replacing
+the previous snapshot. The snapshot is a NumPy .npz archive: node states
+are stored as int8 rows, parents as indices, and moves as one
+concatenated string, so nothing is pickled.
+
+`resume_search` continues from the latest snapshot. The open list keeps
+its exact heap order, so a resumed search expands the same nodes in the
+same order and returns the same result as an uninterrupted one:
+
+    astar.a_star_search(start, goal_test, next_moves, h, labeled=True,
+                        checkpoint=Checkpointer("s17.ckpt.npz"))
+    # ... crash, restart ...
+    checkpoint.resume_search("s17.ckpt.npz", goal_test, next_moves, h,
+                             labeled=True)
+
+Resume with the same successor function, heuristic and key that wrote
+the checkpoint. States are stored, not keys, so keys are recomputed on
+load (default and symmetry keys alike). Only numpy states with tuple or
+bytes keys can be checkpointed (not FlatBoards, nor the int keys of
+closedset.StatePacker); the search checks this before it starts.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+import astar
+
+State = npt.NDArray[np.int_]
+VERSION = 1
+
+
+@dataclass
+class SearchCheckpoint:
+    shape: tuple[int, int]
+    dtype: str
+    states: np.ndarray  # (nodes, cells) int8, parents before children.
+    parents: np.ndarray  # Index into states, -1 for the start node.
+    costs: np.ndarray
+    evaluations: np.ndarray
+    moves: Optional[list[str]]  # None for unlabeled searches.
+    heap: np.ndarray  # Node indices in heap list order.
+    explored_states: np.ndarray  # (explored, cells) int8.
+    explored_costs: np.ndarray
+    # node_generated, node_expanded, duplicates_skipped, reopened.
+    counters: tuple[int, int, int, int]
+
+    def restore(self, make_key: Callable[[State], Hashable]):
+        """
+        :return: the open list, explored table and counters to continue
+            the search with, the nodes rebuilt with make_key
+        """
+        nodes: list[astar.PathNode] = []
+        for i, row in enumerate(self.states):
+            state = row.reshape(self.shape).astype(self.dtype)
+            parent = nodes[self.parents[i]] if self.parents[i] >= 0 else None
+            nodes.append(astar.PathNode(
+                state, parent, int(self.costs[i]), int(self.evaluations[i]),
+                make_key(state), None if self.moves is None else self.moves[i]))
+        pq = [nodes[i] for i in self.heap]
+        explored = {
+            make_key(row.reshape(self.shape).astype(self.dtype)): int(cost)
+            for row, cost in zip(self.explored_states, self.explored_costs)
+        }
+        return pq, explored, self.counters
+
+
+def _key_row(key: Hashable) -> np.ndarray:
+    # Both kinds of key in use are the squares of a board: state_key's
+    # tuple, or the int8 bytes of a canonical image (symmetry keys).
+    if isinstance(key, tuple):
+        return np.array(key, dtype=np.int8)
+    if isinstance(key, bytes):
+        return np.frombuffer(key, dtype=np.int8)
+    raise TypeError(f"cannot checkpoint state keys of type {type(key).__name__}")
+
+
+def check_checkpointable(state, key: Hashable) -> None:
+    """Raise TypeError if a search with states and keys like these could
+    not be checkpointed, rather than at its first save."""
+    if not isinstance(state, np.ndarray):
+        raise TypeError(f"cannot checkpoint states of type {type(state).__name__}")
+    _key_row(key)
+
+
+def capture(pq: list, explored: dict, counters: tuple[int, int, int, int]
+            ) -> SearchCheckpoint:
+    """Snapshot the open list, explored table and counters of a search."""
+    index: dict[int, int] = {}
+    nodes: list[astar.PathNode] = []
+    for node in pq:
+        # Walk up to the first node already seen, then number the chain
+        # top-down so parents always come before their children.
+        chain = []
+        while node is not None and id(node) not in index:
+            chain.append(node)
+            node = node.parent
+        for node in reversed(chain):
+            index[id(node)] = len(nodes)
+            nodes.append(node)
+
+    first = nodes[0].state1 if nodes else np.zeros((0, 0), dtype=np.int8)
+    cells = first.size
+    states = np.empty((len(nodes), cells), dtype=np.int8)
+    for i, node in enumerate(nodes):
+        states[i] = node.state1.ravel()
+    labeled = bool(nodes) and nodes[-1].move is not None
+    explored_states = np.empty((len(explored), cells), dtype=np.int8)
+    for i, key in enumerate(explored):
+        explored_states[i] = _key_row(key)
+    return SearchCheckpoint(
+        shape=first.shape,
+        dtype=first.dtype.str,
+        states=states,
+        parents=np.array([index[id(n.parent)] if n.parent is not None else -1
+                          for n in nodes], dtype=np.int64),
+        costs=np.array([n.cost for n in nodes], dtype=np.int64),
+        evaluations=np.array([n.evaluation for n in nodes], dtype=np.int64),
+        moves=[n.move or "" for n in nodes] if labeled else None,
+        heap=np.array([index[id(n)] for n in pq], dtype=np.int64),
+        explored_states=explored_states,
+        explored_costs=np.fromiter(explored.values(), dtype=np.int64,
+                                   count=len(explored)),
+        counters=tuple(counters),
+    )
+
+
+def save_checkpoint(path: str, checkpoint: SearchCheckpoint,
+                    compress: bool = True) -> None:
+    """Write a checkpoint atomically: a crash mid-write leaves the
+    previous file in place."""
+    moves = checkpoint.moves
+    arrays = dict(
+        version=np.array(VERSION),
+        shape=np.array(checkpoint.shape, dtype=np.int64),
+        dtype=np.array(checkpoint.dtype),
+        states=checkpoint.states,
+        parents=checkpoint.parents,
+        costs=checkpoint.costs,
+        evaluations=checkpoint.evaluations,
+        heap=checkpoint.heap,
+        explored_states=checkpoint.explored_states,
+        explored_costs=checkpoint.explored_costs,
+        counters=np.array(checkpoint.counters, dtype=np.int64),
+    )
+    if moves is not None:
+        arrays["moves"] = np.frombuffer("".join(moves).encode("ascii"), dtype=np.uint8)
+        arrays["move_lengths"] = np.array([len(m) for m in moves], dtype=np.int64)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        (np.savez_compressed if compress else np.savez)(file, **arrays)
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path: str) -> SearchCheckpoint:
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["version"]) != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} checkpoint")
+        moves = None
+        if "moves" in data:
+            text = data["moves"].tobytes().decode("ascii")
+            ends = np.cumsum(data["move_lengths"]).tolist()
+            moves = [text[start:end] for start, end in zip([0] + ends, ends)]
+        return SearchCheckpoint(
+            shape=tuple(data["shape"].tolist()),
+            dtype=str(data["dtype"]),
+            states=data["states"],
+            parents=data["parents"],
+            costs=data["costs"],
+            evaluations=data["evaluations"],
+            moves=moves,
+            heap=data["heap"],
+            explored_states=data["explored_states"],
+            explored_costs=data["explored_costs"],
+            counters=tuple(data["counters"].tolist()),
+        )
+
+
+class Checkpointer:
+    """Search hook that saves a checkpoint every `every` expansions."""
+
+    def __init__(self, path: str, every: int = 100000, compress: bool = True) -> None:
+        self.path = path
+        self.every = every
+        self.compress = compress
+        self.saved = 0
+        self._next: Optional[int] = None
+
+    def check(self, state, key: Hashable) -> None:
+        """Called by the search with its first state and key."""
+        check_checkpointable(state, key)
+
+    def due(self, node_expanded: int) -> bool:
+        if self._next is None:
+            # Count from where the search (possibly a resumed one) starts.
+            self._next = node_expanded + self.every
+        return node_expanded >= self._next
+
+    def save(self, pq: list, explored: dict, counters: tuple[int, int, int, int]) -> None:
+        save_checkpoint(self.path, capture(pq, explored, counters), self.compress)
+        self.saved += 1
+        self._next = counters[1] + self.every
+
+
+def resume_search(path: str, goal_test, next_states, heuristic, **kwargs):
+    """Continue the search saved in checkpoint file `path`.
+
+    Takes the same arguments as astar.a_star_search after the start state
+    (which comes from the checkpoint) and returns what it returns, counters
+    included from the original start.
+    """
+    return astar.a_star_search(None, goal_test, next_states, heuristic,
+                               resume=load_checkpoint(path), **kwargs)
@@ -0,0 +1,251 @@
+"""Compact closed sets for very large searches.
+
+By default astar.a_star_search keeps its explored table in a dict from
+state keys (tuples of every square, several hundred bytes each) to
+costs, which dominates the memory of long searches such as s17. This
+module has two smaller replacements, passed as `closed_set=` (a
+zero-argument factory, like `open_list=`):
+
+* `HashClosedSet` is exact. Keys are packed integers (see
+  `StatePacker`: one bit per floor square for the boxes, plus the
+  keeper's square) stored in an open-addressing hash table of NumPy
+  uint64 words, next to an int32 cost per slot. A state takes
+  8 * words + 4 bytes per slot, about 17 bytes at the default load.
+
+* `BloomClosedSet` is approximate (bit-state hashing): a Bloom filter of
+  k bits per state in a bit array sized for a capacity and a false
+  positive rate, about 14.4 bits per state at 0.1%. Costs are not kept,
+  so a state is never reopened once closed, and a false positive prunes
+  a state that was never expanded: the search may then miss the optimal
+  solution, or any solution. It works with any hashable key.
+
+    packer = closedset.StatePacker(start)
+    astar.a_star_search(start, goal_test, next_states, h, key=packer,
+                        closed_set=partial(closedset.HashClosedSet, packer.bits))
+    astar.a_star_search(start, goal_test, next_states, h, key=packer,
+                        closed_set=partial(closedset.BloomClosedSet, 10_000_000, 1e-4))
+
+`packed_a_star_search` and `bloom_a_star_search` do this with the
+calling convention of benchmark.py's engines ("packed", "bloom").
+"""
+
+from math import ceil, log
+from typing import Hashable, Iterator, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+import astar
+from hw3 import box, boxstar, keeper, keeperstar, star, wall
+from symmetry import playable_area
+
+State = npt.NDArray[np.int_]
+
+_MULTIPLIER = 0x9E3779B97F4A7C15  # 2**64 / golden ratio, for Fibonacci hashing
+_WORD = (1 << 64) - 1
+
+
+class StatePacker:
+    """State key function packing a state of one level into an int.
+
+    Bit i is set if there is a box on the i-th playable square of the
+    level (in row-major order), and the bits above those hold the index
+    of the keeper's square. Walls and goals are the same in every state
+    of a level, so they are left out.
+    """
+
+    def __init__(self, start_state: State) -> None:
+        start_state = np.asarray(start_state)
+        self.shape = start_state.shape
+        self.squares = np.flatnonzero(playable_area(start_state))
+        self.index = np.full(start_state.size, -1, dtype=np.int64)
+        self.index[self.squares] = np.arange(len(self.squares))
+        self.bits = len(self.squares) + max(1, (len(self.squares) - 1).bit_length())
+        self._layout = np.where(np.isin(start_state, (star, boxstar, keeperstar)), star, 0)
+        self._layout[start_state == wall] = wall
+
+    def __call__(self, s: State) -> int:
+        flat = s.ravel()
+        values = flat[self.squares]
+        boxes = np.packbits((values == box) | (values == boxstar), bitorder="little")
+        keeper_square = self.index[np.flatnonzero((flat == keeper) | (flat == keeperstar))[0]]
+        return (int.from_bytes(boxes.tobytes(), "little")
+                | int(keeper_square) << len(self.squares))
+
+    def unpack(self, key: int) -> State:
+        """The state of a packed key, with the walls and goals of the
+        start state (squares outside the playable area are left blank)."""
+        s = self._layout.copy().ravel()
+        n = len(self.squares)
+        for i, square in enumerate(self.squares):
+            if key >> i & 1:
+                s[square] = boxstar if s[square] == star else box
+        square = self.squares[key >> n]
+        s[square] = keeperstar if s[square] == star else keeper
+        return s.reshape(self.shape)
+
+
+class HashClosedSet:
+    """Exact closed set of packed int keys, mapping each to its cost."""
+
+    def __init__(self, key_bits: int, capacity: int = 1 << 16, max_load: float = 0.7) -> None:
+        """
+        :param key_bits: the width of the keys, e.g. StatePacker.bits
+        :param capacity: the initial number of slots, rounded up to a
+            power of two. The table doubles when it gets fuller than
+            max_load
+        """
+        self.words = max(1, ceil(key_bits / 64))
+        self.max_load = max_load
+        self._size = 0
+        self._allocate(1 << max(3, (capacity - 1).bit_length()))
+
+    def _allocate(self, slots: int) -> None:
+        self._mask = slots - 1
+        self._shift = 64 - (slots.bit_length() - 1)
+        self._keys = np.zeros((slots, self.words), dtype=np.uint64)
+        self._costs = np.full(slots, -1, dtype=np.int32)  # -1: empty slot
+        self._limit = int(slots * self.max_load)
+
+    def _split(self, key: int) -> list[int]:
+        return [(key >> (64 * i)) & _WORD for i in range(self.words)]
+
+    def _slot(self, words: list[int]) -> int:
+        """The slot holding these key words, or the empty slot where they
+        would go."""
+        folded = 0
+        for word in words:
+            folded ^= word
+        slot = ((folded * _MULTIPLIER) & _WORD) >> self._shift
+        keys = self._keys
+        costs = self._costs
+        while costs[slot] >= 0:
+            row = keys[slot]
+            if all(int(row[i]) == word for i, word in enumerate(words)):
+                return slot
+            slot = (slot + 1) & self._mask
+        return slot
+
+    def get(self, key: int, default: Optional[int] = None) -> Optional[int]:
+        cost = int(self._costs[self._slot(self._split(key))])
+        return default if cost < 0 else cost
+
+    def __getitem__(self, key: int) -> int:
+        cost = self.get(key)
+        if cost is None:
+            raise KeyError(key)
+        return cost
+
+    def __contains__(self, key: int) -> bool:
+        return self._costs[self._slot(self._split(key))] >= 0
+
+    def __setitem__(self, key: int, cost: int) -> None:
+        words = self._split(key)
+        slot = self._slot(words)
+        if self._costs[slot] < 0:
+            if self._size >= self._limit:
+                self._grow()
+                slot = self._slot(words)
+            self._size += 1
+            self._keys[slot] = words
+        self._costs[slot] = cost
+
+    def _grow(self) -> None:
+        keys, costs = self._keys, self._costs
+        self._allocate(2 * len(costs))
+        for slot in np.flatnonzero(costs >= 0):
+            words = [int(word) for word in keys[slot]]
+            new_slot = self._slot(words)
+            self._keys[new_slot] = words
+            self._costs[new_slot] = costs[slot]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[int]:
+        for slot in np.flatnonzero(self._costs >= 0):
+            yield sum(int(word) << (64 * i) for i, word in enumerate(self._keys[slot]))
+
+    @property
+    def nbytes(self) -> int:
+        return self._keys.nbytes + self._costs.nbytes
+
+
+class BloomClosedSet:
+    """Approximate closed set: a Bloom filter over any hashable keys.
+
+    Members have no cost; `get` returns 0 for them, so a closed state is
+    never reopened.
+    """
+
+    def __init__(self, capacity: int = 1 << 22, error_rate: float = 1e-3) -> None:
+        """
+        :param capacity: the number of states the filter is sized for
+        :param error_rate: the false positive rate once capacity states
+            are in. It grows beyond that
+        """
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = max(8, ceil(-capacity * log(error_rate) / log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self._size = 0
+
+    def _positions(self, key: Hashable) -> Iterator[int]:
+        # Double hashing: position i is h1 + i * h2 (Kirsch and Mitzenmacher).
+        h1 = hash(key) & _WORD
+        h2 = ((h1 * _MULTIPLIER) & _WORD) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def __contains__(self, key: Hashable) -> bool:
+        array = self._array
+        return all(array[p >> 3] >> (p & 7) & 1 for p in self._positions(key))
+
+    def get(self, key: Hashable, default: Optional[int] = None) -> Optional[int]:
+        return 0 if key in self else default
+
+    def __getitem__(self, key: Hashable) -> int:
+        if key not in self:
+            raise KeyError(key)
+        return 0
+
+    def __setitem__(self, key: Hashable, cost: int) -> None:
+        array = self._array
+        new = False
+        for p in self._positions(key):
+            byte, bit = p >> 3, 1 << (p & 7)
+            if not array[byte] & bit:
+                array[byte] |= bit
+                new = True
+        self._size += new
+
+    def __len__(self) -> int:
+        """The number of keys added (keys taken for false positives excluded)."""
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._array)
+
+    @property
+    def false_positive_rate(self) -> float:
+        """The expected false positive rate at the current fill."""
+        return (1 - np.exp(-self.hashes * self._size / self.bits)) ** self.hashes
+
+
+def packed_a_star_search(start_state: State, goal_test, next_states, heuristic, **kwargs):
+    """astar.a_star_search with packed keys and a HashClosedSet."""
+    packer = StatePacker(start_state)
+    return astar.a_star_search(start_state, goal_test, next_states, heuristic, key=packer,
+                               closed_set=lambda: HashClosedSet(packer.bits), **kwargs)
+
+
+def bloom_a_star_search(start_state: State, goal_test, next_states, heuristic,
+                        capacity: int = 1 << 22, error_rate: float = 1e-3, **kwargs):
+    """astar.a_star_search with packed keys and a BloomClosedSet."""
+    return astar.a_star_search(start_state, goal_test, next_states, heuristic,
+                               key=StatePacker(start_state),
+                               closed_set=lambda: BloomClosedSet(capacity, error_rate), **kwargs)
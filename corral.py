@@ -0,0 +1,201 @@
+"""Push-level search with PI-corral pruning.
+
+`next_pushes` is a labeled successor function on `board.FlatBoard`s whose
+steps are whole pushes: the keeper walks (by a shortest path) to a
+square next to a box and pushes it once. The move string of each step
+is the walk plus the push, e.g. "lluR", so a labeled search costs each
+step its number of moves and stays move-optimal. Far fewer states are
+generated, since keeper positions between pushes are never states of
+their own.
+
+A corral is an area the keeper cannot reach, together with the boxes
+that fence it off. `next_pushes_pi` finds the corrals that must be
+dealt with sooner or later, and restricts the pushes to one of them:
+a PI-corral is one where
+
+* every push the keeper can make of one of its boxes goes into the
+  corral (so no push of these boxes can wait while the keeper stays
+  outside), and
+* some box in it is off a goal (so it cannot be left as it is).
+
+The keeper can then make every push into the corral right away, and the
+pushes of other boxes can be reordered after one of them, so only the
+pushes into the PI-corral with the fewest pushes are generated. A
+PI-corral without any possible push is a deadlock (e.g. a box in a
+corner off a goal), and the state gets no successors.
+
+    start = board.FlatBoard.from_state(s)
+    goal_node, *_ = astar.a_star_search(
+        start, board.goal_test, corral.next_pushes_pi, board.h605721982,
+        key=board.board_key, labeled=True)
+
+or, with the numpy calling convention of benchmark.py's "push" and
+"pi-corral" engines, `push_a_star_search(s, goal_test, next_states, h)`.
+
+The pruning keeps every level solvable and does not change the number
+of pushes needed, but moving a corral push earlier can lengthen the
+keeper's walks, so solutions are not always move-optimal. That is why
+it is opt-in.
+"""
+
+from collections import deque
+from typing import Callable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+import astar
+import hw3
+from board import FlatBoard, board_key, flat_heuristic, goal_test
+from hw3 import blank, box, boxstar, keeper, keeperstar, star, wall
+
+State = npt.NDArray[np.int_]
+Push = tuple[int, int, str]  # (box square, offset, direction)
+
+
+def _directions(width: int) -> tuple[tuple[str, int], ...]:
+    return (("u", -width), ("d", width), ("l", -1), ("r", 1))
+
+
+def reachable(b: FlatBoard) -> dict[int, int]:
+    """Squares the keeper can walk to, each mapped to the square it is
+    first reached from (the keeper's own square to -1)."""
+    cells = b.cells
+    offsets = (-b.width, b.width, -1, 1)
+    parents = {b.keeper: -1}
+    frontier = deque([b.keeper])
+    while frontier:
+        square = frontier.popleft()
+        for offset in offsets:
+            neighbour = square + offset
+            if neighbour not in parents and (cells[neighbour] == blank or cells[neighbour] == star):
+                parents[neighbour] = square
+                frontier.append(neighbour)
+    return parents
+
+
+def walk(parents: dict[int, int], square: int, width: int) -> str:
+    """Shortest LURD walk of the keeper to a reachable square."""
+    letters = {-width: "u", width: "d", -1: "l", 1: "r"}
+    steps = []
+    previous = parents[square]
+    while previous >= 0:
+        steps.append(letters[square - previous])
+        square, previous = previous, parents[previous]
+    steps.reverse()
+    return "".join(steps)
+
+
+def _pushes(b: FlatBoard, parents: dict[int, int]) -> list[Push]:
+    """Every push the keeper can make, box by box in square order."""
+    cells = b.cells
+    directions = _directions(b.width)
+    result = []
+    for square, v in enumerate(cells):
+        if v != box and v != boxstar:
+            continue
+        for D, offset in directions:
+            if square - offset in parents:
+                # The keeper walks away first, so its square is free too.
+                target = cells[square + offset]
+                if target == blank or target == star or square + offset == b.keeper:
+                    result.append((square, offset, D))
+    return result
+
+
+def apply_push(b: FlatBoard, push: Push) -> FlatBoard:
+    """The board after a push the keeper can make (walk included)."""
+    square, offset, _ = push
+    cells = bytearray(b.cells)
+    cells[b.keeper] = star if cells[b.keeper] == keeperstar else blank
+    cells[square] = keeperstar if cells[square] == boxstar else keeper
+    target = square + offset
+    cells[target] = boxstar if cells[target] == star else box
+    return FlatBoard(cells, b.width, square)
+
+
+def pi_corral(b: FlatBoard, parents: dict[int, int],
+              pushes: list[Push]) -> Optional[list[Push]]:
+    """The pushes into the PI-corral of `b` with the fewest of them, or
+    None if there is no PI-corral.
+
+    :param parents: reachable(b)
+    :param pushes: the pushes the keeper can make, as from _pushes
+    """
+    cells = b.cells
+    offsets = (-b.width, b.width, -1, 1)
+    seen = set()
+    best = None
+    for start, v in enumerate(cells):
+        if (v != box and v != boxstar) or start in seen:
+            continue
+        # The corral of this box: the squares connected to it that are
+        # neither walls nor reachable, boxes included. Corrals sharing a
+        # box are one corral.
+        corral = {start}
+        stack = [start]
+        while stack:
+            square = stack.pop()
+            for offset in offsets:
+                neighbour = square + offset
+                if (neighbour not in corral and neighbour not in parents
+                        and cells[neighbour] != wall):
+                    corral.add(neighbour)
+                    stack.append(neighbour)
+        seen |= corral
+        if not any(cells[square] == box for square in corral):
+            continue
+        corral_pushes = [push for push in pushes if push[0] in corral]
+        if any(push[0] + push[1] not in corral for push in corral_pushes):
+            continue
+        if best is None or len(corral_pushes) < len(best):
+            best = corral_pushes
+            if not best:
+                break
+    return best
+
+
+def _next_pushes(b: FlatBoard, prune: bool) -> list[tuple[str, FlatBoard]]:
+    parents = reachable(b)
+    pushes = _pushes(b, parents)
+    if prune:
+        corral_pushes = pi_corral(b, parents, pushes)
+        if corral_pushes is not None:
+            pushes = corral_pushes
+    return [(walk(parents, square - offset, b.width) + D.upper(), apply_push(b, (square, offset, D)))
+            for square, offset, D in pushes]
+
+
+def next_pushes(b: FlatBoard) -> list[tuple[str, FlatBoard]]:
+    """Labeled push-level successors: every push, with the keeper's
+    shortest walk to it."""
+    return _next_pushes(b, False)
+
+
+def next_pushes_pi(b: FlatBoard) -> list[tuple[str, FlatBoard]]:
+    """`next_pushes`, restricted to the pushes into a PI-corral if there
+    is one."""
+    return _next_pushes(b, True)
+
+
+def push_a_star_search(start_state: State, numpy_goal_test=None, numpy_next_states=None,
+                       heuristic: Optional[Callable[[State], int]] = None,
+                       pi_corrals: bool = True, **kwargs):
+    """astar.a_star_search over pushes, with the numpy calling convention.
+
+    As with board.flat_a_star_search, the goal test and successor
+    function are replaced by the FlatBoard ones (so they must be hw3's),
+    and the nodes of the result hold FlatBoards. The search is always
+    labeled, since a step costs its number of moves.
+
+    :param pi_corrals: prune with PI-corrals (`next_pushes_pi`)
+    """
+    kwargs["labeled"] = True
+    kwargs.setdefault("key", board_key)
+    return astar.a_star_search(
+        FlatBoard.from_state(start_state),
+        goal_test,
+        next_pushes_pi if pi_corrals else next_pushes,
+        flat_heuristic(heuristic or hw3.h0),
+        **kwargs,
+    )
@@ -0,0 +1,258 @@
+"""Local deadlock patterns, compiled into a lookup table.
+
+A push can freeze boxes for good: a box against two walls at a corner,
+four boxes (or boxes and walls) in a 2x2 block, a zig-zag of boxes along
+a wall, and so on. If one of the frozen boxes is off a goal, the level
+can no longer be solved. Such patterns are local: they show up in the
+3x3 window around the box just pushed.
+
+Each square of the window is one of four classes (floor, wall, box off
+a goal, box on a goal), so a window is a 9-digit base-4 code and the
+whole pattern library is a table of 4**9 entries indexed by that code.
+An entry is worked out the first time its window is seen, by the freeze
+test below, which assumes nothing about the squares outside the window
+(they count as floor), so a deadlock is only flagged where the window
+alone proves it. From then on, checking a push costs nine square reads
+and one table lookup. `compile_table()` enumerates every window up front
+instead (a couple of seconds), e.g. before forking worker processes.
+
+A box is frozen if it is blocked both horizontally and vertically, and
+blocked along an axis if on either side there is a wall, or a box that is
+itself frozen when this box is taken for a wall. A window is a deadlock
+if its middle box is frozen and a box frozen with it is off a goal.
+
+    successors = deadlock.next_moves  # hw3.next_moves without deadlocks
+    goal_node, *_ = astar.a_star_search(start, goal_test, successors, h,
+                                        labeled=True)
+
+More patterns can be added without touching the search with
+`register_pattern`, e.g. to rule out squares that are known to be dead
+in a family of levels.
+"""
+
+from typing import Callable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+import astar
+import board
+import hw3
+from board import FlatBoard
+from hw3 import (applyDelta, blank, box, boxstar, getSquare, keeper, keeperstar, star,
+                 successorDeltas, wall)
+
+State = npt.NDArray[np.int_]
+
+FLOOR, WALL, BOX, BOXSTAR = range(4)
+SIZE = 4 ** 9
+
+# The class of each square value.
+CLASSES = {blank: FLOOR, wall: WALL, box: BOX, keeper: FLOOR, star: FLOOR,
+           boxstar: BOXSTAR, keeperstar: FLOOR}
+# (row, col) offsets of the window squares, digit 0 first.
+WINDOW = [(d_row, d_col) for d_row in (-1, 0, 1) for d_col in (-1, 0, 1)]
+
+# Pattern characters of register_pattern and the classes they match.
+PATTERN_CLASSES = {
+    " ": (FLOOR,), "-": (FLOOR,), ".": (FLOOR,), "#": (WALL,),
+    "$": (BOX,), "*": (BOXSTAR,), "B": (BOX, BOXSTAR), "?": (FLOOR, WALL, BOX, BOXSTAR),
+}
+
+UNKNOWN, SAFE, DEADLOCK = range(3)
+_table = bytearray(SIZE)  # UNKNOWN until looked up
+
+
+def window_code(classes: list[int]) -> int:
+    """The table index of a window, given the classes of its 9 squares."""
+    code = 0
+    for c in reversed(classes):
+        code = code * 4 + c
+    return code
+
+
+def _frozen(window: dict[tuple[int, int], int], square: tuple[int, int],
+            walls: frozenset, involved: set) -> bool:
+    """The freeze test for the box on `square`, with `walls` taken for
+    walls. Boxes found frozen on the way are added to `involved`."""
+    row, col = square
+    for axis in (((0, -1), (0, 1)), ((-1, 0), (1, 0))):
+        sides = [(row + d_row, col + d_col) for d_row, d_col in axis]
+        if any(window.get(side, FLOOR) == WALL or side in walls for side in sides):
+            continue
+        found = set()
+        if not any(window.get(side, FLOOR) in (BOX, BOXSTAR)
+                   and _frozen(window, side, walls | {square}, found)
+                   for side in sides):
+            return False
+        involved |= found
+    involved.add(square)
+    return True
+
+
+def _is_deadlock(classes: list[int]) -> bool:
+    window = dict(zip(WINDOW, classes))
+    involved = set()
+    if not _frozen(window, (0, 0), frozenset(), involved):
+        return False
+    return any(window[square] == BOX for square in involved)
+
+
+def _allowed(rows: list[str], anchor: tuple[int, int]) -> Optional[list[tuple[int, ...]]]:
+    """The classes allowed at each window square by a pattern whose box
+    at `anchor` is in the middle, or None if the pattern does not fit."""
+    allowed = [PATTERN_CLASSES["?"]] * 9
+    for r, line in enumerate(rows):
+        for c, char in enumerate(line):
+            offset = (r - anchor[0], c - anchor[1])
+            if offset in WINDOW:
+                allowed[WINDOW.index(offset)] = PATTERN_CLASSES[char]
+            elif char != "?":
+                return None
+    return allowed
+
+
+def _pattern_codes(rows: list[str]) -> set[int]:
+    codes = set()
+    for r, line in enumerate(rows):
+        for c, char in enumerate(line):
+            if char not in "$*B":
+                continue
+            allowed = _allowed(rows, (r, c))
+            if allowed is None:
+                continue
+            matching = [0]
+            for i, options in enumerate(allowed):
+                matching = [code + option * 4 ** i for code in matching for option in options]
+            codes.update(matching)
+    return codes
+
+
+def _fill(code: int) -> int:
+    classes = [(code >> (2 * i)) & 3 for i in range(9)]
+    entry = DEADLOCK if _is_deadlock(classes) else SAFE
+    _table[code] = entry
+    return entry
+
+
+def lookup(code: int) -> bool:
+    """Whether the window with this code is a deadlock."""
+    entry = _table[code]
+    if entry == UNKNOWN:
+        entry = _fill(code)
+    return entry == DEADLOCK
+
+
+def compile_table() -> int:
+    """Work out every window with a box in the middle now rather than on
+    first sight. Returns the number of deadlock windows."""
+    for code in range(SIZE):
+        middle = (code >> 8) & 3
+        if (middle == BOX or middle == BOXSTAR) and _table[code] == UNKNOWN:
+            _fill(code)
+    return _table.count(DEADLOCK)
+
+
+def register_pattern(rows: list[str]) -> None:
+    """Add a deadlock pattern to the table.
+
+    :param rows: the pattern, at most 3x3 around each of its boxes, in
+        XSB characters ("#" wall, "$" box off a goal, "*" box on a goal,
+        " ", "-" or "." floor) plus "B" for any box and "?" for any
+        square. Every window that matches it with one of its boxes in the
+        middle becomes a deadlock.
+    """
+    for line in rows:
+        for char in line:
+            if char not in PATTERN_CLASSES:
+                raise ValueError(f"unknown pattern character {char!r}")
+    codes = _pattern_codes(rows)
+    if not codes:
+        raise ValueError("a pattern needs a box with the rest of it within one square")
+    for code in codes:
+        _table[code] = DEADLOCK
+
+
+def is_deadlock(s: State, row: int, col: int) -> bool:
+    """Whether the box on (row, col) of s sits in a deadlock pattern.
+    Squares off the board count as walls."""
+    code = 0
+    for d_row, d_col in reversed(WINDOW):
+        code = code * 4 + CLASSES[int(getSquare(s, row + d_row, col + d_col))]
+    return lookup(code)
+
+
+def flat_is_deadlock(b: FlatBoard, square: int) -> bool:
+    """is_deadlock for the box on a flat index of a FlatBoard."""
+    cells = b.cells
+    width = b.width
+    code = 0
+    for d_row, d_col in reversed(WINDOW):
+        code = code * 4 + CLASSES[cells[square + d_row * width + d_col]]
+    return lookup(code)
+
+
+def next_moves(s: State) -> list[tuple[str, State]]:
+    """hw3.next_moves without the pushes that make a deadlock."""
+    result = []
+    for D, delta in successorDeltas(s):
+        if len(delta) == 3:
+            child = applyDelta(s, delta)
+            box_row, box_col, _ = delta[2]
+            if not is_deadlock(child, box_row, box_col):
+                result.append((D.upper(), child))
+        else:
+            result.append((D, applyDelta(s, delta)))
+    return result
+
+
+def next_states(s: State) -> list[State]:
+    """hw3.next_states without the pushes that make a deadlock."""
+    return [child for _, child in next_moves(s)]
+
+
+def flat_next_moves(b: FlatBoard) -> list[tuple[str, FlatBoard]]:
+    """board.next_moves without the pushes that make a deadlock."""
+    width = b.width
+    offsets = {"U": -width, "D": width, "L": -1, "R": 1}
+    return [(move, child) for move, child in board.next_moves(b)
+            if move.islower() or not flat_is_deadlock(child, child.keeper + offsets[move])]
+
+
+def _pushed_into_deadlock(parent: State, child: State) -> bool:
+    """Whether a box that moved from parent to child sits in a deadlock
+    pattern. Works for any number of pushes, e.g. a macro push."""
+    boxes = (child == box) | (child == boxstar)
+    moved = boxes & (parent != box) & (parent != boxstar)
+    return any(is_deadlock(child, row, col) for row, col in zip(*np.nonzero(moved)))
+
+
+def filter_deadlocks(successors: Callable, labeled: bool = False) -> Callable:
+    """Wrap a numpy successor function (e.g. macros.macro_next_moves) so
+    that it drops the successors that push a box into a deadlock.
+
+    :param labeled: whether successors returns (move, state) pairs
+    """
+    if labeled:
+        def filtered(s: State) -> list:
+            return [(move, child) for move, child in successors(s)
+                    if not _pushed_into_deadlock(s, child)]
+    else:
+        def filtered(s: State) -> list:
+            return [child for child in successors(s) if not _pushed_into_deadlock(s, child)]
+    return filtered
+
+
+def pruned_a_star_search(start_state: State, goal_test=None, numpy_next_states=None,
+                         heuristic: Optional[Callable[[State], int]] = None, **kwargs):
+    """astar.a_star_search without the pushes into a deadlock, with the
+    calling convention of benchmark.py's engines. hw3's successor
+    functions are swapped for this module's faster ones; any other
+    (e.g. macro pushes) is wrapped with filter_deadlocks."""
+    labeled = kwargs.get("labeled", False)
+    if numpy_next_states in (None, hw3.next_states, hw3.next_moves):
+        successors = next_moves if labeled else next_states
+    else:
+        successors = filter_deadlocks(numpy_next_states, labeled)
+    return astar.a_star_search(start_state, goal_test or hw3.goal_test, successors,
+                               heuristic or hw3.h0, **kwargs)
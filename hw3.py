@@ -33,22 +33,43 @@ import numpy as np
 # generated nodes (node_generated) and expanded nodes (node_expanded), and the solution depth (len(path)-1). a_star
 # also provides the following functions for printing states and moves: prettyMoves(path): Translate the solution to a
 # list of moves printlists(path): Visualize the solution and Print a list of states
-def a_star(start_state, goal_test, successors, heuristic):
-    goal_node, node_generated, node_expanded = astar.a_star_search(start_state, goal_test, successors, heuristic)
+#
+# If a solution_cache.SolutionCache is passed as cache, it is consulted first and the solution is stored in it after
+# the search, as a move string (see movesString) with the heuristic that found it.
+#
+# With labeled=True, successors returns (move, state) pairs (see next_moves). Each node then records its move, and
+# the solution is read back as a LURD move string instead of a list of boards. Boards are only regenerated
+# (iterStates) if they are printed.
+def a_star(start_state, goal_test, successors, heuristic, cache=None, labeled=False):
+    if cache is not None:
+        hit = cache.get(start_state, heuristic.__name__, "astar")
+        if hit is not None:
+            print('Nodes Generated by A*: {} (cached)'.format(hit.nodes_generated))
+            print('Nodes Expanded by A*: {} (cached)'.format(hit.nodes_expanded))
+            print('Solution Depth: {} (cached)'.format(hit.depth))
+            return
+    goal_node, node_generated, node_expanded = astar.a_star_search(start_state, goal_test, successors, heuristic,
+                                                                   labeled=labeled)
     if goal_node:
-        node = goal_node
-        path = [node.state1]
-        while node.parent:
-            node = node.parent
-            path.append(node.state1)
-        path.reverse()
-
-        # print('My path:{}'.format(path))
-        # print(prettyMoves(path))
-        # printlists(path)
+        if labeled:
+            moves = astar.solution_moves(goal_node)
+        else:
+            node = goal_node
+            path = [node.state1]
+            while node.parent:
+                node = node.parent
+                path.append(node.state1)
+            path.reverse()
+            moves = movesString(path)
+
+        # print('My moves:{}'.format(moves))
+        # print(prettyMoves(moves))
+        # printlists(iterStates(start_state, moves))
         print('Nodes Generated by A*: {}'.format(node_generated))
         print('Nodes Expanded by A*: {}'.format(node_expanded))
-        print('Solution Depth: {}'.format(len(path) - 1))
+        print('Solution Depth: {}'.format(len(moves)))
+        if cache is not None:
+            cache.put(start_state, moves, heuristic.__name__, "astar", node_generated, node_expanded)
     else:
         print('no solution found')
 
@@ -57,8 +78,8 @@ def a_star(start_state, goal_test, successors, heuristic):
 # Transform the input state to numpy array. For other functions, the state s is presented as a numpy array.
 # Goal-test and next-states stay the same throughout the assignment
 # You can just call sokoban(init-state, heuristic function) to test the result
-def sokoban(s, h):
-    return a_star(np.array(s), goal_test, next_states, h)
+def sokoban(s, h, cache=None):
+    return a_star(np.array(s), goal_test, next_moves, h, cache, labeled=True)
 
 
 # Define some global variables
@@ -159,12 +180,37 @@ def goal_test(s):
 # A shallow copy (e.g, direcly set s1 = s) constructs a new compound object and then inserts references 
 # into it to the objects found in the original. In this case, any change in the numpy array s1 will also affect
 # the original array s. Thus, you may need a deep copy (e.g, s1 = np.copy(s)) to construct an indepedent array.
+#
+# Legality is checked on the shared parent s first (see moveDelta), so only legal moves pay for a copy, and each
+# child is made by patching the 2-3 squares that actually change.
 def next_states(s):
-    up = np.copy(s)
-    down = np.copy(s)
-    left = np.copy(s)
-    right = np.copy(s)
-    return cleanUpList([try_move(up, "u"), try_move(down, "d"),try_move(left, "l"),try_move(right, "r")])
+    return [applyDelta(s, delta) for D, delta in successorDeltas(s)]
+
+# The (row, col) offset of each direction the keeper can move in, in the order successors are generated.
+DIRECTIONS = {"u": (-1, 0), "d": (1, 0), "l": (0, -1), "r": (0, 1)}
+
+# Like next_states, but returns (move, state) pairs where move is the LURD letter of the move: the direction D,
+# in uppercase if the move pushes a box.
+def next_moves(s):
+    return [(D.upper() if len(delta) == 3 else D, applyDelta(s, delta)) for D, delta in successorDeltas(s)]
+
+# Returns the list of (D, delta) pairs for every legal move of the keeper in state s, without copying s.
+# A delta can be kept around and applied later with applyDelta, so nothing is allocated for moves that are never used.
+def successorDeltas(s):
+    k_row, k_col = getKeeperPosition(s)
+    result = []
+    for D in DIRECTIONS:
+        delta = moveDelta(s, k_row, k_col, D)
+        if delta is not None:
+            result.append((D, delta))
+    return result
+
+# Returns a copy of s with the (row, col, value) patches of delta written into it. s itself is left untouched.
+def applyDelta(s, delta):
+    child = np.copy(s)
+    for row, col, v in delta:
+        child[row, col] = v
+    return child
 
 #checks if out of bounds and returns wall, otherwise returns value in the State
 def getSquare(State,row, col):
@@ -176,76 +222,44 @@ def getSquare(State,row, col):
 
 #essentially sets a State[row][col] to some value v
 def set_square(State, row, col, v):
-    State[row][col] = v   
-    
-#go through each possibility (up, down , left, right) and basically finds the position one and 2 away from the keeper in a specific direction.  Then, performs a number of checks to see if valid to move or not. If invalid, returns none. Else performs movement and returns updated State.
-def try_move(State,D):
-    k_pos = getKeeperPosition(State)
-    k_row = k_pos[0]
-    k_col = k_pos[1]
-    
+    State[row, col] = v
+
+#works out the squares that change when the keeper at (k_row, k_col) moves one step in direction D, reading State only.
+#returns a list of (row, col, value) patches, or None if the move is blocked by a wall or a box that cannot be pushed.
+def moveDelta(State, k_row, k_col, D):
+    d_row, d_col = DIRECTIONS[D]
+    mov1_row = k_row + d_row
+    mov1_col = k_col + d_col
+    mov1 = getSquare(State, mov1_row, mov1_col)
+
     cur = blank
-    if State[k_row][k_col] == keeperstar:
+    if State[k_row, k_col] == keeperstar:
         cur = star
 
-    if D == "d":
-        mov1_row = k_row + 1
-        mov1_col = k_col
-        mov2_row = k_row + 2
-        mov2_col = k_col
-    
-    elif D == "u":
-        mov1_row = k_row - 1
-        mov1_col = k_col
-        mov2_row = k_row - 2
-        mov2_col = k_col
-
-    elif D == "l":
-        mov1_row = k_row 
-        mov1_col = k_col -1
-        mov2_row = k_row 
-        mov2_col = k_col -2
-
-    elif D == "r":
-        mov1_row = k_row 
-        mov1_col = k_col +1
-        mov2_row = k_row 
-        mov2_col = k_col +2
-
-    mov1 = getSquare(State, mov1_row, mov1_col)
-    mov2 = getSquare(State, mov2_row, mov2_col)
-  
-    if mov1 == wall: 
-        return None
-    elif mov1 == blank:
-        set_square(State, k_row, k_col, cur)
-        set_square(State, mov1_row, mov1_col, keeper)
+    if mov1 == blank:
+        return [(k_row, k_col, cur), (mov1_row, mov1_col, keeper)]
     elif mov1 == star:
-        set_square(State, k_row, k_col, cur)
-        set_square(State, mov1_row, mov1_col, keeperstar)    
-    elif mov1 == box:
-        if mov2 == blank: 
-            set_square(State, k_row, k_col, cur)
-            set_square(State, mov1_row, mov1_col, keeper)
-            set_square(State, mov2_row, mov2_col, box)
-        elif mov2 == star:
-            set_square(State, k_row, k_col, cur)
-            set_square(State, mov1_row, mov1_col, keeper)
-            set_square(State, mov2_row, mov2_col, boxstar)    
-        elif mov2 == wall or mov2 == box or mov2 == boxstar: 
-            return None      
-    elif mov1 == boxstar:
-        if mov2 == blank:
-            set_square(State, k_row, k_col, cur)
-            set_square(State, mov1_row, mov1_col, keeperstar)
-            set_square(State, mov2_row, mov2_col, box)
-        elif mov2 == star:
-            set_square(State, k_row, k_col, cur)
-            set_square(State, mov1_row, mov1_col, keeperstar)
-            set_square(State, mov2_row, mov2_col, boxstar)    
-        elif mov2 == wall or mov2 == boxstar or mov2 == box: 
-            return None  
-    
+        return [(k_row, k_col, cur), (mov1_row, mov1_col, keeperstar)]
+    elif mov1 == box or mov1 == boxstar:
+        mov2_row = mov1_row + d_row
+        mov2_col = mov1_col + d_col
+        mov2 = getSquare(State, mov2_row, mov2_col)
+        if mov2 != blank and mov2 != star:
+            return None
+        return [(k_row, k_col, cur),
+                (mov1_row, mov1_col, keeper if mov1 == box else keeperstar),
+                (mov2_row, mov2_col, box if mov2 == blank else boxstar)]
+    return None
+
+#moves the keeper in State one step in direction D ("u", "d", "l" or "r") in place. If invalid, returns none. Else
+#performs movement and returns updated State.
+def try_move(State,D):
+    k_row, k_col = getKeeperPosition(State)
+    delta = moveDelta(State, k_row, k_col, D)
+    if delta is None:
+        return None
+    for row, col, v in delta:
+        set_square(State, row, col, v)
     return State
 
 #testing for next_states
@@ -627,8 +641,10 @@ def detectDiff(s, s1):
     return 'fail'
 
 
-# Translates a list of states into a list of moves
+# Translates a list of states, or a LURD move string, into a list of moves
 def prettyMoves(lists):
+    if isinstance(lists, str):
+        return [MOVE_NAMES[letter.lower()] for letter in lists]
     initial = 0
     action = []
     for states in (lists):
@@ -639,6 +655,37 @@ def prettyMoves(lists):
     return action
 
 
+# The LURD letter of each direction. A push is written in uppercase.
+MOVE_LETTERS = {"Up": "u", "Down": "d", "Left": "l", "Right": "r"}
+MOVE_NAMES = {letter: name for name, letter in MOVE_LETTERS.items()}
+
+# Translates a list of states into a move string in the standard LURD format, e.g. "llDru".
+def movesString(lists):
+    moves = []
+    for previous, states in zip(lists, lists[1:]):
+        letter = MOVE_LETTERS[detectDiff(previous, states)]
+        row, col = getKeeperPosition(states)
+        if isBox(previous[row, col]) or isBoxstar(previous[row, col]):
+            letter = letter.upper()
+        moves.append(letter)
+    return "".join(moves)
+
+# Inverse of movesString: lazily replays the move string on state s, yielding each state visited, starting with s.
+# Raises ValueError if a move is illegal.
+def iterStates(s, moves):
+    state = s
+    yield state
+    for i, letter in enumerate(moves):
+        state = try_move(np.copy(state), letter.lower())
+        if state is None:
+            raise ValueError("illegal move {!r} after {} moves".format(letter, i))
+        yield state
+
+# Like iterStates, but returns the whole list of states.
+def replayMoves(s, moves):
+    return list(iterStates(s, moves))
+
+
 # Print the content of the square to stdout.
 def printsquare(v):
     if (v == blank):
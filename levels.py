@@ -0,0 +1,142 @@
+"""Reader for Sokoban levels in the standard XSB (.sok/.xsb/.txt) format.
+
+Boards are parsed straight into the 0-6 numpy encoding used by `hw3`:
+
+    ' ' '-' '_'  blank       '.'  star
+    '#'          wall        '*'  boxstar
+    '$'          box         '+'  keeperstar
+    '@'          keeper
+
+Collection files are read one line at a time, so a file with thousands
+of levels can be iterated over without holding it all in memory.
+Lines starting with ';' are comments; a comment right before a board
+is used as its title unless a `Title:` line follows the board. A
+level is yielded as soon as a blank line or the next board ends it.
+"""
+
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import IO, Iterable, Iterator, Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from hw3 import blank, box, boxstar, keeper, keeperstar, star, wall
+
+State = npt.NDArray[np.int_]
+Source = Union[str, IO[str], Iterable[str]]
+
+XSB_SQUARES: dict[str, int] = {
+    " ": blank,
+    "-": blank,
+    "_": blank,
+    "#": wall,
+    "$": box,
+    "@": keeper,
+    ".": star,
+    "*": boxstar,
+    "+": keeperstar,
+}
+
+XSB_CHARS = {v: k for k, v in XSB_SQUARES.items() if k not in "-_"}
+
+
+@dataclass
+class Level:
+    index: int  # 1-based position within the collection.
+    state: State
+    title: Optional[str] = None
+    metadata: dict[str, str] = field(default_factory=dict)
+
+
+def parse_level(lines: Iterable[str]) -> State:
+    """Parse the rows of one XSB board into a numpy state.
+
+    Rows shorter than the widest row are padded with blanks.
+    """
+    rows = [line.rstrip("\r\n") for line in lines]
+    width = max((len(row) for row in rows), default=0)
+    try:
+        state = [
+            [XSB_SQUARES[ch] for ch in row] + [blank] * (width - len(row))
+            for row in rows
+        ]
+    except KeyError as err:
+        raise ValueError(f"invalid XSB square {err.args[0]!r}") from None
+    if not state or width == 0:
+        raise ValueError("empty level")
+    return np.array(state)
+
+
+def format_level(state: State) -> str:
+    """Inverse of `parse_level`, with trailing blanks trimmed."""
+    return "\n".join(
+        "".join(XSB_CHARS[int(v)] for v in row).rstrip()
+        for row in state
+    )
+
+
+def _is_board_line(line: str) -> bool:
+    line = line.rstrip("\r\n")
+    return "#" in line and all(ch in XSB_SQUARES for ch in line)
+
+
+def iter_levels(source: Source) -> Iterator[Level]:
+    """Lazily yield every level of an XSB collection.
+
+    `source` may be a path, an open text file or any iterable of lines.
+    """
+    if isinstance(source, str):
+        with open(source, encoding="utf-8", errors="replace") as file:
+            yield from iter_levels(file)
+        return
+
+    count = 0
+    board: list[str] = []
+    pending: Optional[Level] = None
+    comment: Optional[str] = None
+
+    for line in source:
+        if _is_board_line(line):
+            if not board and pending is not None:
+                yield pending
+                pending = None
+            board.append(line)
+            continue
+
+        if board:
+            count += 1
+            pending = Level(count, parse_level(board), comment)
+            board = []
+            comment = None
+
+        text = line.strip()
+        if not text and pending is not None:
+            yield pending
+            pending = None
+        elif text.startswith(";"):
+            comment = text.lstrip("; ") or None
+        elif ":" in text and pending is not None:
+            key, _, value = text.partition(":")
+            key, value = key.strip(), value.strip()
+            pending.metadata[key] = value
+            if key.lower() == "title":
+                pending.title = value
+
+    if board:
+        count += 1
+        pending = Level(count, parse_level(board), comment)
+    if pending is not None:
+        yield pending
+
+
+def load_level(source: Source, which: Union[int, str] = 1) -> Level:
+    """Return a single level by 1-based index or by title."""
+    levels = iter_levels(source)
+    if isinstance(which, int):
+        level = next(islice(levels, which - 1, None), None)
+    else:
+        level = next((lv for lv in levels if lv.title == which), None)
+    if level is None:
+        raise LookupError(f"no level {which!r} in collection")
+    return level
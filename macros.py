@@ -0,0 +1,257 @@
+"""Tunnel and goal-room macro pushes.
+
+Static level analysis finds
+
+* tunnel squares: squares with walls on both sides across a push
+  direction, so a box pushed along them blocks the corridor, and
+* goal rooms: regions holding goals that are cut off from the (larger)
+  rest of the level by a single entrance square, with a packing order
+  that fills the goals farthest from the entrance first.
+
+The analysis depends only on the layout (walls, reachable squares and
+goals), so it is cached by `layout_key` and shared between states and
+between levels with the same layout.
+
+`macro_next_states` turns such chains of forced pushes into a single
+successor. A push that lands a box in a tunnel keeps pushing it along
+to the last square of the tunnel, stopping early on a goal or in front
+of an obstacle. The box is never pushed out of the far end, since what
+lies beyond may be a dead corner the box must not enter.
+A push onto a goal room's entrance, or inside the room, continues
+straight to the next goal in the packing order if that goal lies
+ahead with nothing in the way. Each macro successor costs as many
+moves as the keeper makes, which a labeled search takes from the length
+of its move string:
+
+    successors = macros.macro_next_moves(start)
+    goal_node, *_ = astar.a_star_search(start, goal_test, successors, h,
+                                        labeled=True)
+    astar.solution_moves(goal_node)  # e.g. "...rDDDD..."
+
+(`macro_next_states` with `step_cost=keeper_distance` is the unlabeled
+equivalent.)
+
+Macros never park a box halfway through a tunnel or short of its goal
+in a room. Like other tunnel/goal-room macro schemes, they keep the
+usual levels solvable and optimal, but cannot guarantee optimality on
+every contrived level. That is why they are opt-in.
+"""
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from hw3 import (DIRECTIONS, applyDelta, blank, box, boxstar, getKeeperPosition,
+                 isBoxstar, keeperstar, manhattan_dist, moveDelta, star)
+from symmetry import playable_area
+
+State = npt.NDArray[np.int_]
+Square = tuple[int, int]
+
+STEPS = list(DIRECTIONS.values())
+
+
+@dataclass
+class GoalRoom:
+    entrance: Square
+    squares: frozenset[Square]
+    packing_order: list[Square]  # Goals, filled first to last.
+
+
+@dataclass
+class LevelAnalysis:
+    # tunnel[D][row, col]: a box pushed in direction D through (row, col)
+    # has walls on both sides.
+    tunnel: dict[str, np.ndarray]
+    rooms: list[GoalRoom] = field(default_factory=list)
+    # The goal room each entrance/room square belongs to.
+    room_of: dict[Square, GoalRoom] = field(default_factory=dict)
+
+
+def layout_key(s: State) -> bytes:
+    """Bytes identifying the static layout (walls, unreachable squares
+    and goals) of a level, whatever its boxes and keeper."""
+    blocked = ~playable_area(s)
+    goals = np.isin(s, (star, boxstar, keeperstar))
+    return (np.array(s.shape, dtype=np.int32).tobytes()
+            + np.packbits(blocked).tobytes() + np.packbits(goals).tobytes())
+
+
+def _unpack_layout(key: bytes) -> tuple[np.ndarray, np.ndarray]:
+    shape = tuple(np.frombuffer(key[:8], dtype=np.int32))
+    size = shape[0] * shape[1]
+    bits = np.unpackbits(np.frombuffer(key[8:], dtype=np.uint8))
+    half = len(bits) // 2
+    blocked = bits[:size].astype(bool).reshape(shape)
+    goals = bits[half:half + size].astype(bool).reshape(shape)
+    return blocked, goals
+
+
+def _components(area: np.ndarray, removed: Square) -> list[set[Square]]:
+    """Connected components of `area` without the square `removed`."""
+    seen = {removed}
+    components = []
+    for row, col in zip(*np.nonzero(area)):
+        if (row, col) in seen:
+            continue
+        component = set()
+        stack = [(int(row), int(col))]
+        while stack:
+            square = stack.pop()
+            if square in seen:
+                continue
+            seen.add(square)
+            component.add(square)
+            for d_row, d_col in STEPS:
+                r, c = square[0] + d_row, square[1] + d_col
+                if 0 <= r < area.shape[0] and 0 <= c < area.shape[1] and area[r, c]:
+                    stack.append((r, c))
+        components.append(component)
+    return components
+
+
+def _packing_order(entrance: Square, squares: frozenset[Square],
+                   goals: set[Square]) -> list[Square]:
+    distance = {entrance: 0}
+    frontier = [entrance]
+    while frontier:
+        next_frontier = []
+        for row, col in frontier:
+            for d_row, d_col in STEPS:
+                square = (row + d_row, col + d_col)
+                if square in squares and square not in distance:
+                    distance[square] = distance[(row, col)] + 1
+                    next_frontier.append(square)
+        frontier = next_frontier
+    return sorted((g for g in squares if g in goals),
+                  key=lambda g: -distance.get(g, -1))
+
+
+@lru_cache(maxsize=256)
+def _analyze(key: bytes) -> LevelAnalysis:
+    blocked, goal_mask = _unpack_layout(key)
+    area = ~blocked
+    blocked = np.pad(blocked, 1, constant_values=True)
+    tunnel = {
+        "u": blocked[1:-1, :-2] & blocked[1:-1, 2:] & area,
+        "l": blocked[:-2, 1:-1] & blocked[2:, 1:-1] & area,
+    }
+    tunnel["d"] = tunnel["u"]
+    tunnel["r"] = tunnel["l"]
+
+    goals = {(int(r), int(c)) for r, c in zip(*np.nonzero(goal_mask))}
+    candidates = []
+    for row, col in zip(*np.nonzero(area)):
+        entrance = (int(row), int(col))
+        components = _components(area, entrance)
+        largest = max(components, key=len, default=None)
+        for component in components:
+            if component is largest or not component & goals:
+                continue
+            candidates.append((entrance, frozenset(component)))
+
+    analysis = LevelAnalysis(tunnel)
+    for entrance, squares in candidates:
+        # Keep only maximal rooms.
+        if any(squares < other for _, other in candidates):
+            continue
+        room = GoalRoom(entrance, squares, _packing_order(entrance, squares, goals))
+        analysis.rooms.append(room)
+        for square in squares | {entrance}:
+            analysis.room_of[square] = room
+    return analysis
+
+
+def analyze_level(s: State) -> LevelAnalysis:
+    """Tunnels and goal rooms of the level of s, cached by layout."""
+    return _analyze(layout_key(s))
+
+
+def keeper_distance(s: State, s1: State) -> int:
+    """Number of moves between a state and its (macro) successor."""
+    return manhattan_dist(*getKeeperPosition(s), *getKeeperPosition(s1))
+
+
+def _push_again(s: State, row: int, col: int, D: str) -> tuple[int, int]:
+    """Push the box at (row, col) one more square in direction D in
+    place, the keeper being right behind it. Returns the new box square."""
+    d_row, d_col = DIRECTIONS[D]
+    for r, c, v in moveDelta(s, row - d_row, col - d_col, D):
+        s[r, c] = v
+    return row + d_row, col + d_col
+
+
+def _is_free(s: State, row: int, col: int) -> bool:
+    return (0 <= row < s.shape[0] and 0 <= col < s.shape[1]
+            and (s[row, col] == blank or s[row, col] == star))
+
+
+def _extend_push(s: State, row: int, col: int, D: str,
+                 analysis: LevelAnalysis) -> int:
+    """Continue the push of the box just pushed to (row, col) in place.
+    Returns the number of extra pushes made."""
+    d_row, d_col = DIRECTIONS[D]
+    room = analysis.room_of.get((row, col))
+    if room is not None:
+        target = next((g for g in room.packing_order if not isBoxstar(s[g])), None)
+        if target is None or target == (row, col):
+            return 0
+        steps = (target[0] - row) * d_row + (target[1] - col) * d_col
+        if steps <= 0 or (row + steps * d_row, col + steps * d_col) != target:
+            return 0
+        if not all(_is_free(s, row + i * d_row, col + i * d_col)
+                   for i in range(1, steps + 1)):
+            return 0
+        for _ in range(steps):
+            row, col = _push_again(s, row, col, D)
+        return steps
+
+    tunnel = analysis.tunnel[D]
+    pushes = 0
+    while (tunnel[row, col] and s[row, col] == box
+           and _is_free(s, row + d_row, col + d_col)
+           and tunnel[row + d_row, col + d_col]):
+        row, col = _push_again(s, row, col, D)
+        pushes += 1
+    return pushes
+
+
+def macro_next_moves(start: State, analysis: Optional[LevelAnalysis] = None
+                     ) -> Callable[[State], list[tuple[str, State]]]:
+    """Labeled successor function for the level of `start` that emits
+    tunnel and goal-room macro pushes instead of the single pushes they
+    start with. Each successor comes with its LURD moves, e.g. "RRR".
+    `analysis` may be passed in if it is already known (e.g. computed
+    once for a batch of levels sharing the layout)."""
+    if analysis is None:
+        analysis = analyze_level(start)
+
+    def next_moves(s: State) -> list[tuple[str, State]]:
+        k_row, k_col = getKeeperPosition(s)
+        result = []
+        for D in DIRECTIONS:
+            delta = moveDelta(s, k_row, k_col, D)
+            if delta is None:
+                continue
+            child = applyDelta(s, delta)
+            if len(delta) == 3:
+                box_row, box_col, _ = delta[2]
+                pushes = 1 + _extend_push(child, box_row, box_col, D, analysis)
+                result.append((D.upper() * pushes, child))
+            else:
+                result.append((D, child))
+        return result
+    return next_moves
+
+
+def macro_next_states(start: State) -> Callable[[State], list[State]]:
+    """Unlabeled form of `macro_next_moves`, for use with
+    `step_cost=keeper_distance`."""
+    next_moves = macro_next_moves(start)
+
+    def next_states(s: State) -> list[State]:
+        return [child for _, child in next_moves(s)]
+    return next_states
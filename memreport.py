@@ -0,0 +1,216 @@
+"""Memory accounting for a finished search.
+
+`take_report` takes a tracemalloc snapshot and sorts the memory still
+allocated into what holds it:
+
+* PathNode objects, the nodes on the open list and their ancestors,
+* state arrays, the boards made by the successor function,
+* state keys, the hashable keys of the states (tuples by default),
+* the explored dict, its hash table (keys counted above), and
+* the open list, the heap's array of node references,
+
+with everything else under "other". An allocation is attributed by its
+innermost frame in numpy (state arrays) or in this project's modules,
+resolved to the function whose code holds that line. FUNCTIONS maps the
+functions (or classes) that build keys, nodes and tables to their
+category, and other project functions, the successor functions among
+them, to state arrays. Lines of the search loop itself are attributed
+by the names their bytecode uses (SEARCH_LOOP_NAMES, e.g. a line
+calling `PathNode` builds a node); a search loop that no longer uses one
+of those names is an error at import, not a silent misattribution. One
+frame is enough for all that, and deeper tracebacks make tracing several
+times slower.
+The report also has the peak resident set size of the process, for
+sizing workers.
+
+Take the snapshot while the search's tables are still alive, e.g. at the
+final event of astar.iter_a_star_search:
+
+    tracemalloc.start(memreport.FRAMES)
+    for progress in astar.iter_a_star_search(...):
+        if progress.done:
+            report = memreport.take_report()
+    tracemalloc.stop()
+    print(report.format())
+
+or `python test_hw3.py -m s12 hUID --memory`.
+"""
+
+import dis
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import CodeType
+from typing import Optional
+
+import numpy as np
+
+import astar
+
+FRAMES = 1  # Frames per traceback to pass to tracemalloc.start.
+
+CATEGORIES = ("PathNode objects", "state arrays", "state keys", "explored dict", "open list", "other")
+
+# The category of what a function allocates, by module file and qualified
+# name. A class name covers all its methods.
+FUNCTIONS = {
+    ("astar.py", "PathNode"): "PathNode objects",
+    ("astar.py", "state_key"): "state keys",
+    ("board.py", "board_key"): "state keys",
+    ("symmetry.py", "canonical_key.<locals>.key"): "state keys",
+    ("closedset.py", "StatePacker"): "state keys",
+    ("closedset.py", "HashClosedSet"): "explored dict",
+    ("closedset.py", "BloomClosedSet"): "explored dict",
+    ("openlist.py", "HeapOpenList"): "open list",
+    ("openlist.py", "BucketOpenList"): "open list",
+    ("openlist.py", "TieBreakingOpenList"): "open list",
+}
+# Functions whose lines are attributed by SEARCH_LOOP_NAMES.
+SEARCH_LOOPS = {("astar.py", "iter_a_star_search")}
+# Names used on a line of a search loop, in order of precedence, and the
+# category of what that line allocates.
+SEARCH_LOOP_NAMES = {
+    "PathNode": "PathNode objects",
+    "make_key": "state keys",
+    "push": "open list",
+    "explored": "explored dict",
+}
+
+_DIRECTORY = os.path.dirname(os.path.abspath(astar.__file__))
+_NUMPY_DIRECTORY = os.path.dirname(os.path.abspath(np.__file__))
+_HARNESSES = ("test_hw3.py", "memreport.py", "benchmark.py")
+_LOADS = {"LOAD_GLOBAL", "LOAD_NAME", "LOAD_FAST", "LOAD_DEREF", "LOAD_CLOSURE", "LOAD_ATTR"}
+
+
+def _code_objects(code: CodeType):
+    yield code
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            yield from _code_objects(const)
+
+
+@lru_cache(maxsize=None)
+def _functions(filename: str) -> dict[int, CodeType]:
+    """The innermost code object holding each line of a source file."""
+    with open(filename, encoding="utf-8") as file:
+        module = compile(file.read(), filename, "exec")
+    lines = {}
+    for code in _code_objects(module):  # Outer code objects come first.
+        if code is module:
+            continue
+        for _, _, lineno in code.co_lines():
+            if lineno is not None:
+                lines[lineno] = code
+    return lines
+
+
+@lru_cache(maxsize=None)
+def _search_loop_lines(filename: str, qualname: str) -> dict[int, str]:
+    """The category of every line of a search loop that uses one of
+    SEARCH_LOOP_NAMES."""
+    code = next(c for c in set(_functions(filename).values()) if _qualname(c) == qualname)
+    names: dict[int, set] = {}
+    for instruction in dis.get_instructions(code):
+        if instruction.opname in _LOADS and instruction.positions.lineno is not None:
+            names.setdefault(instruction.positions.lineno, set()).add(instruction.argval)
+    used = set().union(*names.values())
+    missing = set(SEARCH_LOOP_NAMES) - used
+    if missing:
+        raise RuntimeError(f"{qualname} no longer uses {sorted(missing)}; update memreport.SEARCH_LOOP_NAMES")
+    categories = {}
+    for lineno, line_names in names.items():
+        for name, category in SEARCH_LOOP_NAMES.items():
+            if name in line_names:
+                categories[lineno] = category
+                break
+    return categories
+
+
+def _qualname(code: CodeType) -> str:
+    return getattr(code, "co_qualname", code.co_name)
+
+
+def function_category(filename: str, lineno: int) -> str:
+    """The category of an allocation on a line of a project module."""
+    name = os.path.basename(filename)
+    code = _functions(filename).get(lineno)
+    if code is None:
+        return "other"  # Module-level code.
+    qualname = _qualname(code)
+    if (name, qualname) in SEARCH_LOOPS:
+        return _search_loop_lines(filename, qualname).get(lineno, "other")
+    for (module, function), category in FUNCTIONS.items():
+        if module == name and (qualname == function or qualname.startswith(function + ".")):
+            return category
+    return "state arrays"
+
+
+for _filename, _qualified in SEARCH_LOOPS:
+    _search_loop_lines(os.path.join(_DIRECTORY, _filename), _qualified)
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """The peak resident set size of this process, or None where the
+    resource module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # kB on Linux
+
+
+def classify(traceback: tracemalloc.Traceback) -> str:
+    """The category of an allocation, from its traceback."""
+    for frame in reversed(traceback):  # Innermost frame first.
+        if frame.filename.startswith(_NUMPY_DIRECTORY):
+            return "state arrays"
+        directory, name = os.path.split(frame.filename)
+        if directory != _DIRECTORY:
+            continue
+        if name in _HARNESSES:
+            return "other"
+        return function_category(frame.filename, frame.lineno)
+    return "other"
+
+
+@dataclass
+class MemoryReport:
+    peak_rss_bytes: Optional[int]
+    traced_current_bytes: int
+    traced_peak_bytes: int
+    # Bytes and blocks still allocated when the snapshot was taken.
+    categories: dict[str, int] = field(default_factory=dict)
+    blocks: dict[str, int] = field(default_factory=dict)
+
+    def format(self) -> str:
+        lines = [f"{'CATEGORY':<18} {'MB':>9} {'BLOCKS':>10} {'%':>6}"]
+        total = sum(self.categories.values()) or 1
+        for name in CATEGORIES:
+            size = self.categories.get(name, 0)
+            lines.append(f"{name:<18} {size / 1e6:>9.2f} {self.blocks.get(name, 0):>10} "
+                         f"{100 * size / total:>5.1f}%")
+        lines.append(f"Traced now/peak: {self.traced_current_bytes / 1e6:.2f}/"
+                     f"{self.traced_peak_bytes / 1e6:.2f} MB")
+        if self.peak_rss_bytes is not None:
+            lines.append(f"Peak RSS: {self.peak_rss_bytes / 1e6:.2f} MB")
+        return "\n".join(lines)
+
+
+def take_report(snapshot: Optional[tracemalloc.Snapshot] = None) -> MemoryReport:
+    """Account for the memory allocated since tracemalloc.start().
+
+    :param snapshot: a snapshot to account for, taken now if None
+    """
+    if snapshot is None:
+        snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    report = MemoryReport(peak_rss_bytes(), current, peak,
+                          dict.fromkeys(CATEGORIES, 0), dict.fromkeys(CATEGORIES, 0))
+    for statistic in snapshot.statistics("traceback"):
+        category = classify(statistic.traceback)
+        report.categories[category] += statistic.size
+        report.blocks[category] += statistic.count
+    return report
@@ -0,0 +1,193 @@
+"""Open list implementations for astar.a_star_search.
+
+By default the search keeps its open list in a plain heapq list. Passing
+`open_list=` a class (or any zero-argument factory) from this module
+swaps in an object with the same interface: `push(node)`, `pop()`,
+`len()` and iteration.
+
+`BucketOpenList` exploits the fact that f is a small integer: nodes go
+in an array of buckets indexed by f, and pop takes from the lowest
+non-empty bucket, so both are O(1) apart from the occasional scan to the
+next bucket. Within a bucket, ties are broken LIFO (newest first, which
+tends to go deep towards a goal) or FIFO, optionally after preferring the
+highest g. Values of f at or above `limit` (e.g. the dead-box penalty of
+the UID heuristic) go to an overflow heap that is only used once every
+bucket is empty.
+
+    astar.a_star_search(start, goal_test, next_states, h,
+                        open_list=openlist.BucketOpenList)
+    astar.a_star_search(start, goal_test, next_states, h,
+                        open_list=partial(openlist.BucketOpenList, order="fifo"))
+
+`TieBreakingOpenList` is a binary heap ordered by f and then by a
+configurable tie-breaking policy (`TIE_BREAKING`, or any function of a
+node that returns a secondary key, smallest first). The engine builds
+one for `astar.a_star_search(..., tie_breaking="high_g")`.
+
+Iterating an open list yields its nodes in an order that, pushed one by
+one into an empty open list of the same kind, rebuilds it exactly. This
+is how checkpoints restore them.
+"""
+
+from collections import deque
+from heapq import heappop, heappush
+from itertools import count
+from typing import Callable, Iterator, Union
+
+ORDERS = ("lifo", "fifo")
+
+# Secondary keys of nodes with equal f, smallest first. For equal f, a
+# higher g is the same as a lower h, so "low_h" is an alias of "high_g".
+TIE_BREAKING: dict[str, Callable] = {
+    "high_g": lambda node: -node.cost,
+    "low_h": lambda node: -node.cost,
+    "lifo": None,
+    "fifo": None,
+}
+
+
+class HeapOpenList:
+    """The default binary heap, as an object. Ties are broken by the
+    heap's internal order, exactly as with the plain heapq list."""
+
+    def __init__(self) -> None:
+        self._heap: list = []
+
+    def push(self, node) -> None:
+        heappush(self._heap, node)
+
+    def pop(self):
+        return heappop(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._heap)
+
+
+class BucketOpenList:
+    """Open list of buckets indexed by integer f."""
+
+    def __init__(self, order: str = "lifo", high_g_first: bool = False,
+                 limit: int = 1 << 16) -> None:
+        """
+        :param order: "lifo" or "fifo", the order among nodes with equal
+            f (and equal g, if high_g_first)
+        :param high_g_first: among nodes with equal f, pop the highest g
+            first, i.e. the nodes closest to a goal by the heuristic
+        :param limit: f values from here up go to the overflow heap
+        """
+        if order not in ORDERS:
+            raise ValueError(f"order must be one of {ORDERS}, not {order!r}")
+        self.order = order
+        self.high_g_first = high_g_first
+        self.limit = limit
+        self._buckets: list = []
+        self._min = 0  # No non-empty bucket below this index.
+        self._size = 0
+        self._overflow: list = []
+
+    def _new_bucket(self):
+        return deque() if self.order == "fifo" else []
+
+    def push(self, node) -> None:
+        f = node.evaluation
+        self._size += 1
+        if f >= self.limit:
+            heappush(self._overflow, node)
+            return
+        buckets = self._buckets
+        while len(buckets) <= f:
+            # With high_g_first, a bucket is a list of sub-buckets by g.
+            buckets.append([] if self.high_g_first else self._new_bucket())
+        bucket = buckets[f]
+        if self.high_g_first:
+            g = node.cost
+            while len(bucket) <= g:
+                bucket.append(self._new_bucket())
+            bucket = bucket[g]
+        bucket.append(node)
+        if f < self._min:
+            self._min = f
+
+    def _take(self, bucket):
+        if not self.high_g_first:
+            return bucket.popleft() if self.order == "fifo" else bucket.pop()
+        sub_bucket = bucket[-1]
+        node = sub_bucket.popleft() if self.order == "fifo" else sub_bucket.pop()
+        # Keep the last sub-bucket non-empty, so a bucket is empty
+        # exactly when it has no sub-buckets left.
+        while bucket and not bucket[-1]:
+            bucket.pop()
+        return node
+
+    def pop(self):
+        if not self._size:
+            raise IndexError("pop from an empty open list")
+        buckets = self._buckets
+        f = self._min
+        while f < len(buckets):
+            if buckets[f]:
+                self._min = f
+                self._size -= 1
+                return self._take(buckets[f])
+            f += 1
+        self._min = f
+        self._size -= 1
+        return heappop(self._overflow)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator:
+        for bucket in self._buckets:
+            if self.high_g_first:
+                for sub_bucket in bucket:
+                    yield from sub_bucket
+            else:
+                yield from bucket
+        yield from self._overflow
+
+
+class TieBreakingOpenList:
+    """Binary heap of (f, secondary key, sequence number, node) entries.
+
+    The sequence number breaks the remaining ties first in, first out
+    (last in, first out for the "lifo" policy), so the pop order no
+    longer depends on the heap's internal layout.
+    """
+
+    def __init__(self, policy: Union[str, Callable] = "high_g") -> None:
+        """
+        :param policy: a name in TIE_BREAKING, or a function mapping a
+            node to a secondary key (e.g. the number of misplaced boxes)
+        """
+        if callable(policy):
+            self._secondary = policy
+        elif policy in TIE_BREAKING:
+            self._secondary = TIE_BREAKING[policy]
+        else:
+            raise ValueError(f"unknown tie-breaking policy {policy!r}")
+        self._lifo = policy == "lifo"
+        self._heap: list = []
+        self._sequence = count()
+
+    def push(self, node) -> None:
+        sequence = next(self._sequence)
+        if self._lifo:
+            sequence = -sequence
+        secondary = 0 if self._secondary is None else self._secondary(node)
+        heappush(self._heap, (node.evaluation, secondary, sequence, node))
+
+    def pop(self):
+        return heappop(self._heap)[-1]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator:
+        # In push order: pushing them again gives new sequence numbers in
+        # the same relative order.
+        order = sorted(self._heap, key=lambda entry: -entry[2] if self._lifo else entry[2])
+        return (entry[-1] for entry in order)
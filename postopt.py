@@ -0,0 +1,152 @@
+"""Shortening valid but suboptimal solutions.
+
+Inexact searches (the "pi-corral" engine, or an inadmissible heuristic)
+find solutions quickly but often with more moves than needed. `optimize`
+takes such a solution and shortens it in two stages:
+
+1. Walks. The solution is cut into pushes, and the keeper's walk to each
+   push is replaced by a shortest one (a BFS over the squares it can
+   reach, as in corral.py). This keeps the pushes and their order, and
+   drops any moves after the last push.
+
+2. Windows. For each run of `window` consecutive pushes, a push-level A*
+   (corral.next_pushes, so the cost is still moves) looks for a cheaper
+   way from the board before the run to the board after it, keeper
+   included; for the last run, to any solved board. It is cut off after
+   `max_expansions` expansions. A cheaper way found is spliced in, which
+   leaves the rest of the solution valid as it is. Windows overlap by
+   half, and passes repeat until one finds nothing.
+
+Every step only replaces a part of the solution with a cheaper part
+between the same boards, so the result is valid and never longer:
+
+    moves = astar.solution_moves(goal_node)
+    shorter = postopt.optimize(start, moves)
+"""
+
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+
+import astar
+import validator
+from board import GOALS, FlatBoard, board_key, goal_test
+from corral import Push, apply_push, next_pushes, reachable, walk
+from hw3 import blank, box, boxstar, star
+
+State = npt.NDArray[np.int_]
+Step = tuple[FlatBoard, str]  # (board before a push, walk + push)
+
+
+def _pushes(start: FlatBoard, moves: str) -> list[Push]:
+    """The pushes a valid solution makes, in order."""
+    # Only the boxes are kept up to date on the board; the keeper is k.
+    cells = bytearray(start.cells)
+    offsets = {"u": -start.width, "d": start.width, "l": -1, "r": 1}
+    k = start.keeper
+    pushes = []
+    for letter in moves.lower():
+        offset = offsets[letter]
+        k += offset
+        if cells[k] == box or cells[k] == boxstar:
+            pushes.append((k, offset, letter))
+            cells[k] = star if cells[k] == boxstar else blank
+            cells[k + offset] = boxstar if cells[k + offset] == star else box
+    return pushes
+
+
+def _steps(start: FlatBoard, pushes: list[Push]) -> list[Step]:
+    """The pushes, each with the keeper's shortest walk to it."""
+    steps = []
+    b = start
+    for push in pushes:
+        square, offset, D = push
+        steps.append((b, walk(reachable(b), square - offset, b.width) + D.upper()))
+        b = apply_push(b, push)
+    return steps
+
+
+def shorten_walks(level, moves: str) -> str:
+    """A solution with the same pushes as `moves`, and the shortest walks
+    between them.
+
+    :param level: the start state, as a numpy state, nested lists or a
+        FlatBoard
+    :param moves: a valid solution, as a LURD string
+    """
+    start = _board(level, moves)
+    return "".join(step for _, step in _steps(start, _pushes(start, moves)))
+
+
+def _board(level, moves: str) -> FlatBoard:
+    start = level if isinstance(level, FlatBoard) else FlatBoard.from_state(np.asarray(level))
+    result = validator.validate(start, moves, strict=False)
+    if not result.ok:
+        raise ValueError(f"not a valid solution: {result.error}")
+    return start
+
+
+def _search_window(b: FlatBoard, target: Optional[FlatBoard], bound: int,
+                   max_expansions: int) -> Optional[list[Step]]:
+    """Steps from b to target (to any solved board if None) costing less
+    than bound, or None if none was found within max_expansions."""
+    if target is None:
+        is_goal = goal_test
+        goals = [square for square, v in enumerate(b.cells) if v in GOALS]
+    else:
+        cells = target.cells
+        is_goal = lambda board: board.cells == cells
+        goals = [square for square, v in enumerate(cells) if v == box or v == boxstar]
+
+    def heuristic(board: FlatBoard) -> int:
+        # Every target square without a box needs at least one push.
+        return sum(board.cells[square] != box and board.cells[square] != boxstar for square in goals)
+
+    search = astar.iter_a_star_search(b, is_goal, next_pushes, heuristic, key=board_key, labeled=True,
+                                      progress_every=max_expansions)
+    progress = next(search)
+    search.close()
+    goal_node = progress.goal_node
+    if not progress.done or goal_node is None or goal_node.cost >= bound:
+        return None
+    steps = []
+    node = goal_node
+    while node.parent is not None:
+        steps.append((node.parent.state1, node.move))
+        node = node.parent
+    steps.reverse()
+    return steps
+
+
+def optimize(level, moves: str, window: int = 6, max_expansions: int = 2000) -> str:
+    """Shorten a solution: shortest walks, then local re-search.
+
+    :param level: the start state, as a numpy state, nested lists or a
+        FlatBoard
+    :param moves: a valid solution, as a LURD string (push case is not
+        checked)
+    :param window: the number of pushes re-searched at a time
+    :param max_expansions: the expansions allowed per window search
+    :return: a valid solution no longer than the shortest-walk one
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    if max_expansions < 1:
+        raise ValueError("max_expansions must be at least 1")
+    start = _board(level, moves)
+    steps = _steps(start, _pushes(start, moves))
+    improved = True
+    while improved:
+        improved = False
+        i = 0
+        while i < len(steps):
+            end = min(i + window, len(steps))
+            target = steps[end][0] if end < len(steps) else None
+            bound = sum(len(step) for _, step in steps[i:end])
+            found = _search_window(steps[i][0], target, bound, max_expansions)
+            if found is not None:
+                steps[i:end] = found
+                improved = True
+            i += max(1, window // 2)
+    return "".join(step for _, step in steps)
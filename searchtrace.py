@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Compact binary traces of A* searches for offline analysis.
+
+Pass a `TraceWriter` as the `trace` argument of `astar.a_star_search`
+and every expansion is appended to the file as a fixed-size record of
+(state hash, parent hash, g, h, kind). Records are packed into an
+in-memory buffer and written out in large blocks, so tracing adds
+little to the search itself. The goal node, if found, is written last
+with kind GOAL.
+
+`summarize_trace` reads a trace back into per-f-layer expansion counts
+and, given the optimal depth (taken from the goal record by default),
+the heuristic error along the solution path and across all expansions.
+
+    python searchtrace.py s13.trace
+"""
+
+import struct
+from argparse import ArgumentParser
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterator, NamedTuple, Optional
+
+MAGIC = b"SOKTRACE"
+VERSION = 1
+HEADER = struct.Struct("<8sHH")
+RECORD = struct.Struct("<qqiqB")
+
+EXPAND = 0
+GOAL = 1
+
+
+class TraceRecord(NamedTuple):
+    state_hash: int
+    parent_hash: int  # 0 for the start state.
+    g: int
+    h: int
+    kind: int
+
+    @property
+    def f(self) -> int:
+        return self.g + self.h
+
+
+class TraceWriter:
+    """Buffered writer of trace records, usable as a context manager."""
+
+    def __init__(self, path: str, buffer_records: int = 65536) -> None:
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self._buffer = bytearray(RECORD.size * buffer_records)
+        self._offset = 0
+        self.records = 0
+
+    def _write(self, node, kind: int) -> None:
+        parent = node.parent
+        RECORD.pack_into(
+            self._buffer,
+            self._offset,
+            hash(node.state),
+            hash(parent.state) if parent is not None else 0,
+            node.cost,
+            node.evaluation - node.cost,
+            kind,
+        )
+        self._offset += RECORD.size
+        self.records += 1
+        if self._offset == len(self._buffer):
+            self.flush()
+
+    def expand(self, node) -> None:
+        """Record the expansion of an `astar.PathNode`."""
+        self._write(node, EXPAND)
+
+    def goal(self, node) -> None:
+        """Record the goal node the search returns."""
+        self._write(node, GOAL)
+
+    def flush(self) -> None:
+        self._file.write(memoryview(self._buffer)[:self._offset])
+        self._offset = 0
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_trace(path: str, chunk_records: int = 65536) -> Iterator[TraceRecord]:
+    """Yield the records of a trace file in the order they were written."""
+    with open(path, "rb") as file:
+        magic, version, record_size = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a version {VERSION} search trace")
+        while True:
+            chunk = file.read(RECORD.size * chunk_records)
+            if not chunk:
+                return
+            if len(chunk) % RECORD.size:
+                raise ValueError(f"{path} ends with a truncated record")
+            for fields in RECORD.iter_unpack(chunk):
+                yield TraceRecord(*fields)
+
+
+@dataclass
+class TraceSummary:
+    expansions: int = 0
+    expansions_per_f: Counter = field(default_factory=Counter)
+    depth: Optional[int] = None
+    # (g, h, true distance to goal) for each expanded node on the solution path.
+    solution_path: list[tuple[int, int, int]] = field(default_factory=list)
+    # How far below the optimal depth each expansion's f was.
+    f_gap: Counter = field(default_factory=Counter)
+
+    @property
+    def mean_path_error(self) -> Optional[float]:
+        if not self.solution_path:
+            return None
+        return sum(d - h for _, h, d in self.solution_path) / len(self.solution_path)
+
+    def report(self) -> str:
+        lines = [f"Expansions: {self.expansions}", "", "    F | EXPANDED"]
+        for f in sorted(self.expansions_per_f):
+            lines.append(f"{f:>5} | {self.expansions_per_f[f]:>8}")
+        if self.depth is not None:
+            lines.append("")
+            lines.append(f"Optimal depth: {self.depth}")
+            lines.append("D - F | EXPANDED")
+            for gap in sorted(self.f_gap):
+                lines.append(f"{gap:>5} | {self.f_gap[gap]:>8}")
+        if self.solution_path:
+            lines.append("")
+            lines.append("    G |     H |    H* | ERROR")
+            for g, h, d in self.solution_path:
+                lines.append(f"{g:>5} | {h:>5} | {d:>5} | {d - h:>5}")
+            lines.append(f"Mean heuristic error on path: {self.mean_path_error:.2f}")
+        return "\n".join(lines)
+
+
+def summarize_trace(path: str, depth: Optional[int] = None) -> TraceSummary:
+    """Aggregate a trace into per-f-layer histograms and heuristic error.
+
+    `depth` is the true solution depth; it defaults to the g of the goal
+    record. The solution path is recovered by following parent hashes
+    back from the goal, so it needs one pass that keeps the parent and
+    (g, h) of every expanded state.
+    """
+    summary = TraceSummary()
+    parents: dict[int, tuple[int, int, int]] = {}
+    goal: Optional[TraceRecord] = None
+    for record in read_trace(path):
+        if record.kind == GOAL:
+            goal = record
+            continue
+        summary.expansions += 1
+        summary.expansions_per_f[record.f] += 1
+        parents[record.state_hash] = (record.parent_hash, record.g, record.h)
+
+    summary.depth = depth if depth is not None else (goal.g if goal else None)
+    if summary.depth is None:
+        return summary
+
+    for f, count in summary.expansions_per_f.items():
+        summary.f_gap[summary.depth - f] += count
+
+    if goal is not None:
+        entry = parents.get(goal.parent_hash)
+        while entry is not None:
+            parent_hash, g, h = entry
+            summary.solution_path.append((g, h, summary.depth - g))
+            entry = parents.get(parent_hash) if parent_hash else None
+        summary.solution_path.reverse()
+    return summary
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Summarize an A* search trace.")
+    parser.add_argument("path")
+    parser.add_argument(
+        "-d", "--depth", type=int,
+        help="true solution depth (default: depth of the traced goal)",
+    )
+    args = parser.parse_args()
+    print(summarize_trace(args.path, args.depth).report())
+
+
+if __name__ == "__main__":
+    main()
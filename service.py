@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Asyncio Sokoban solve service.
+
+`SolveService.solve` runs one search in its own worker process, with at
+most `max_workers` of them running at once, and returns a structured
+result instead of printing. While the search runs, progress events are
+passed to an optional callback. A request can have a deadline, and
+cancelling the awaiting task (e.g. because the client went away) kills
+its worker. A slow level therefore never holds up the others beyond
+its own worker slot.
+
+`serve` exposes the service on a local TCP socket, speaking one JSON
+object per line. A client sends
+
+    {"id": "a", "op": "solve", "level": "#####\\n#@$.#\\n#####",
+     "heuristic": "hUID", "deadline": 30}
+    {"id": "a", "op": "cancel"}
+
+where `level` is XSB text or a 0-6 matrix. The server answers with
+`{"id": "a", "event": "progress", ...}` lines, then a single
+`{"id": "a", "event": "result", "status": ..., ...}` line.
+
+    python service.py --port 8161 --workers 4
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+from argparse import ArgumentParser
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+
+import astar
+import hw3
+import levels
+from solvers import HEURISTICS
+
+Level = Union[str, list[list[int]], np.ndarray]
+Result = dict[str, Any]
+ProgressCallback = Callable[[dict[str, Any]], None]
+
+POLL_SECONDS = 0.02
+
+
+def _solve_in_worker(conn, state: list[list[int]], heuristic_name: str,
+                     progress_every: int) -> None:
+    try:
+        for progress in astar.iter_a_star_search(
+            np.array(state),
+            hw3.goal_test,
+            hw3.next_moves,
+            HEURISTICS[heuristic_name],
+            labeled=True,
+            progress_every=progress_every,
+        ):
+            if not progress.done:
+                conn.send({
+                    "event": "progress",
+                    "f": progress.f_bound,
+                    "nodes_generated": progress.node_generated,
+                    "nodes_expanded": progress.node_expanded,
+                    "open_size": progress.open_size,
+                    "closed_size": progress.closed_size,
+                    "elapsed_seconds": progress.elapsed_seconds,
+                    "nodes_per_second": progress.nodes_per_second,
+                })
+        goal_node = progress.goal_node
+        moves = astar.solution_moves(goal_node) if goal_node else None
+        conn.send({
+            "event": "result",
+            "status": "solved" if goal_node else "unsolvable",
+            "moves": moves,
+            "depth": len(moves) if moves is not None else None,
+            "nodes_generated": progress.node_generated,
+            "nodes_expanded": progress.node_expanded,
+            "elapsed_seconds": progress.elapsed_seconds,
+        })
+    except Exception as err:  # Reported to the caller, not raised.
+        conn.send({"event": "result", "status": "error", "error": repr(err)})
+    finally:
+        conn.close()
+
+
+def parse_level(level: Level) -> list[list[int]]:
+    """Accept XSB text or a 0-6 matrix and return a 0-6 matrix."""
+    if isinstance(level, str):
+        return levels.parse_level(level.splitlines()).tolist()
+    state = np.array(level)
+    if state.ndim != 2 or not np.isin(state, range(7)).all():
+        raise ValueError("level must be a 2D matrix of values 0-6")
+    return state.tolist()
+
+
+class SolveService:
+    def __init__(self, max_workers: Optional[int] = None,
+                 progress_every: int = 10000) -> None:
+        """
+        :param max_workers: most searches running at once (CPU count by default)
+        :param progress_every: expansions between progress events
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.progress_every = progress_every
+        self._slots = asyncio.Semaphore(self.max_workers)
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn")
+
+    async def solve(
+        self,
+        level: Level,
+        heuristic: str = "hUID",
+        deadline: Optional[float] = None,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Result:
+        """Solve a level in a worker process and return its result.
+
+        :param deadline: seconds allowed, counted from the call (time
+            spent waiting for a free worker included)
+        The status of the result is one of solved, unsolvable, timeout or
+        error. Cancelling the task terminates the worker.
+        """
+        if not isinstance(heuristic, str) or heuristic not in HEURISTICS:
+            return {"status": "error", "error": f"unknown heuristic {heuristic!r}"}
+        if deadline is not None and (isinstance(deadline, bool)
+                                     or not isinstance(deadline, (int, float))):
+            return {"status": "error", "error": f"deadline must be a number, not {deadline!r}"}
+        try:
+            state = parse_level(level)
+        except ValueError as err:
+            return {"status": "error", "error": str(err)}
+
+        loop = asyncio.get_running_loop()
+        expires = None if deadline is None else loop.time() + deadline
+        try:
+            await asyncio.wait_for(
+                self._slots.acquire(),
+                None if expires is None else max(expires - loop.time(), 0),
+            )
+        except asyncio.TimeoutError:
+            return {"status": "timeout"}
+
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_solve_in_worker,
+            args=(sender, state, heuristic, self.progress_every),
+            daemon=True,
+        )
+        try:
+            process.start()
+            sender.close()
+            while True:
+                if expires is not None and loop.time() >= expires:
+                    return {"status": "timeout"}
+                if receiver.poll():
+                    try:
+                        message = receiver.recv()
+                    except EOFError:
+                        return {"status": "error", "error": "worker died"}
+                    if message.pop("event") == "result":
+                        return message
+                    if on_progress is not None:
+                        on_progress(message)
+                    continue
+                if not process.is_alive() and not receiver.poll():
+                    return {"status": "error", "error": "worker died"}
+                await asyncio.sleep(POLL_SECONDS)
+        finally:
+            try:
+                # pid is None if the process failed to start.
+                if process.pid is not None:
+                    if process.is_alive():
+                        process.terminate()
+                    await loop.run_in_executor(None, process.join)
+                sender.close()
+                receiver.close()
+            finally:
+                self._slots.release()
+
+
+async def _handle_client(service: SolveService, reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter) -> None:
+    jobs: dict[Any, asyncio.Task] = {}
+    reporters: set[asyncio.Task] = set()
+
+    def send(message: dict[str, Any]) -> None:
+        writer.write(json.dumps(message).encode() + b"\n")
+
+    async def report(request_id: Any, job: asyncio.Task) -> None:
+        try:
+            result = await job
+        except asyncio.CancelledError:
+            result = {"status": "cancelled"}
+        except Exception as err:  # Reported to the client, not raised.
+            result = {"status": "error", "error": repr(err)}
+        finally:
+            jobs.pop(request_id, None)
+        send({"id": request_id, "event": "result", **result})
+        await writer.drain()
+
+    try:
+        while line := await reader.readline():
+            try:
+                request = json.loads(line)
+                request_id = request.get("id")
+                op = request.get("op", "solve")
+            except (ValueError, AttributeError):
+                send({"event": "error", "error": "expected one JSON object per line"})
+                continue
+            if request_id is not None and not isinstance(request_id, (str, int, float)):
+                send({"event": "error", "error": "id must be a string, a number or null"})
+                continue
+            if op == "solve":
+                if request_id in jobs:
+                    send({"id": request_id, "event": "error", "error": "duplicate id"})
+                    continue
+                jobs[request_id] = asyncio.create_task(service.solve(
+                    request.get("level", ""),
+                    request.get("heuristic", "hUID"),
+                    request.get("deadline"),
+                    lambda event, i=request_id: send(
+                        {"id": i, "event": "progress", **event}),
+                ))
+                reporter = asyncio.create_task(report(request_id, jobs[request_id]))
+                reporters.add(reporter)
+                reporter.add_done_callback(reporters.discard)
+            elif op == "cancel" and request_id in jobs:
+                jobs[request_id].cancel()
+            else:
+                send({"id": request_id, "event": "error", "error": f"bad op {op!r}"})
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        # The client is gone, so nobody wants the remaining results.
+        for job in list(jobs.values()):
+            job.cancel()
+        await asyncio.gather(*reporters, return_exceptions=True)
+        writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8161,
+                max_workers: Optional[int] = None) -> asyncio.AbstractServer:
+    """Start the JSON-lines server and return it (already listening)."""
+    service = SolveService(max_workers)
+    return await asyncio.start_server(
+        lambda r, w: _handle_client(service, r, w), host, port)
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Run the Sokoban solve service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8161)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    async def run() -> None:
+        server = await serve(args.host, args.port, args.workers)
+        address = server.sockets[0].getsockname()
+        print(f"Serving on {address[0]}:{address[1]}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Persistent on-disk store of solved levels.
+
+Solutions are kept in a SQLite database keyed by a canonical hash of the
+start state, together with the heuristic and engine that produced them
+and the search statistics of that run. A level can hold one solution per
+(heuristic, engine) pair. The store is bounded by a number of entries
+and/or a total size of stored move strings; when either limit is
+exceeded the least recently used entries are evicted.
+
+    with SolutionCache("solutions.db", max_entries=10000) as cache:
+        hit = cache.get(state)
+        if hit is None:
+            ...
+            cache.put(state, "dLLurR", "h1", "astar")
+"""
+
+import hashlib
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+
+State = npt.NDArray[np.int_]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS solutions (
+    level TEXT NOT NULL,
+    heuristic TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    moves TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    nodes_generated INTEGER,
+    nodes_expanded INTEGER,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (level, heuristic, engine)
+);
+CREATE INDEX IF NOT EXISTS solutions_last_used ON solutions (last_used);
+"""
+
+
+def level_hash(state: State) -> str:
+    """Canonical hash of a start state.
+
+    Equal boards hash equally whatever the dtype or container they came
+    in (nested lists, int64 or int8 arrays).
+    """
+    board = np.asarray(state, dtype=np.int8)
+    digest = hashlib.sha256()
+    digest.update(np.array(board.shape, dtype=np.int32).tobytes())
+    digest.update(np.ascontiguousarray(board).tobytes())
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedSolution:
+    moves: str  # LURD format, pushes in uppercase.
+    depth: int
+    heuristic: str
+    engine: str
+    nodes_generated: Optional[int]
+    nodes_expanded: Optional[int]
+
+
+class SolutionCache:
+    """SQLite-backed solution store with LRU eviction."""
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        """
+        :param path: database file, created if missing (":memory:" works)
+        :param max_entries: most solutions to keep, unbounded if None
+        :param max_bytes: most total bytes of move strings to keep
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def get(
+        self,
+        state: State,
+        heuristic: Optional[str] = None,
+        engine: Optional[str] = None,
+    ) -> Optional[CachedSolution]:
+        """Return the shortest stored solution of `state`, if any.
+
+        Passing `heuristic` and/or `engine` restricts the lookup to
+        solutions produced by them.
+        """
+        query = ("SELECT rowid, moves, depth, heuristic, engine, "
+                 "nodes_generated, nodes_expanded FROM solutions WHERE level = ?")
+        params: list = [level_hash(state)]
+        if heuristic is not None:
+            query += " AND heuristic = ?"
+            params.append(heuristic)
+        if engine is not None:
+            query += " AND engine = ?"
+            params.append(engine)
+        row = self._db.execute(query + " ORDER BY depth LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        with self._db:
+            self._db.execute(
+                "UPDATE solutions SET last_used = ? WHERE rowid = ?",
+                (time.time(), row[0]),
+            )
+        return CachedSolution(*row[1:])
+
+    def put(
+        self,
+        state: State,
+        moves: str,
+        heuristic: str,
+        engine: str,
+        nodes_generated: Optional[int] = None,
+        nodes_expanded: Optional[int] = None,
+    ) -> None:
+        """Store a solution, keeping an existing one if it is shorter."""
+        now = time.time()
+        key = level_hash(state)
+        with self._db:
+            self._db.execute(
+                "INSERT INTO solutions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (level, heuristic, engine) DO UPDATE SET "
+                "moves = excluded.moves, depth = excluded.depth, "
+                "nodes_generated = excluded.nodes_generated, "
+                "nodes_expanded = excluded.nodes_expanded, "
+                "last_used = excluded.last_used "
+                "WHERE excluded.depth < solutions.depth",
+                (key, heuristic, engine, moves, len(moves),
+                 nodes_generated, nodes_expanded, now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.max_entries is not None:
+            self._db.execute(
+                "DELETE FROM solutions WHERE rowid IN (SELECT rowid FROM "
+                "solutions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        if self.max_bytes is not None:
+            self._db.execute(
+                "DELETE FROM solutions WHERE rowid IN (SELECT rowid FROM "
+                "(SELECT rowid, SUM(LENGTH(moves)) OVER (ORDER BY last_used "
+                "DESC, rowid DESC) AS running FROM solutions) WHERE running > ?)",
+                (self.max_bytes,),
+            )
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "SolutionCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,72 @@
+"""The heuristics and search engines the tools can run, by name.
+
+benchmark.py, batch.py and service.py look heuristics and engines up
+here, so a new one is available to all of them once it is added:
+
+    goal_node, generated, expanded = solvers.ENGINES["pi-corral"](
+        state, hw3.goal_test, hw3.next_moves, solvers.HEURISTICS["hUID"],
+        labeled=True)
+
+Every engine takes the numpy calling convention of astar.a_star_search
+(start state, goal test, successor function, heuristic, then keyword
+arguments) and returns what it returns.
+"""
+
+import re
+from functools import partial
+from typing import Callable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+import astar
+import board
+import closedset
+import corral
+import deadlock
+import hw3
+import openlist
+
+State = npt.NDArray[np.int_]
+HeuristicFunction = Callable[[State], int]
+Engine = Callable[..., tuple[Optional[astar.PathNode], int, int]]
+
+HEURISTICS: dict[str, HeuristicFunction] = {
+    "h0": hw3.h0,
+    "h1": hw3.h1,
+}
+for _name in dir(hw3):
+    if re.match(r"h\d{9}$", _name):
+        HEURISTICS["hUID"] = getattr(hw3, _name)
+        break
+
+
+def _misplaced_boxes(node: astar.PathNode) -> int:
+    # Tie-breaking key: among equal f, prefer states with fewer boxes off goals.
+    return hw3.h1(node.state1)
+
+
+ENGINES: dict[str, Engine] = {
+    "astar": astar.a_star_search,
+    "flat": board.flat_a_star_search,
+    "pea": partial(astar.a_star_search, partial_expansion=True),
+    "dedup": partial(astar.a_star_search, early_duplicate_detection=True),
+    "consistent": partial(astar.a_star_search, consistent=True),
+    "deadlock": deadlock.pruned_a_star_search,
+    "packed": closedset.packed_a_star_search,
+    "bloom": closedset.bloom_a_star_search,
+    "bucket": partial(astar.a_star_search, open_list=openlist.BucketOpenList),
+    "tie-high_g": partial(astar.a_star_search, tie_breaking="high_g"),
+    "tie-lifo": partial(astar.a_star_search, tie_breaking="lifo"),
+    "tie-fifo": partial(astar.a_star_search, tie_breaking="fifo"),
+    "tie-misplaced": partial(astar.a_star_search, tie_breaking=_misplaced_boxes),
+    "push": partial(corral.push_a_star_search, pi_corrals=False),
+    "pi-corral": corral.push_a_star_search,
+}
+
+# Engines that return move-optimal solutions with an admissible heuristic.
+# PI-corral pruning and the Bloom closed set can return longer ones.
+EXACT_ENGINES = {"astar", "flat", "pea", "dedup", "consistent", "deadlock", "packed", "bucket",
+                 "tie-high_g", "tie-lifo", "tie-fifo", "tie-misplaced", "push"}
+# Heuristics that never overestimate, so exact engines find optimal depths.
+ADMISSIBLE_HEURISTICS = {"h0", "h1"}
@@ -0,0 +1,89 @@
+"""Board symmetries and symmetry-aware state keys.
+
+A level automorphism is one of the 8 rotations/reflections of the board
+that maps every wall to a wall and every goal to a goal (squares the
+keeper can never reach count as walls). Two states that are images of
+each other under an automorphism are the same distance from a goal, so
+A* only needs to expand one of them. `symmetric_key` builds a state key
+that maps all images of a state to one canonical representative, for
+use as the `key` argument of `astar.a_star_search`:
+
+    key = symmetry.symmetric_key(start)
+    astar.a_star_search(start, goal_test, next_states, h, key=key)
+
+The search still stores the real successor states in its nodes, and
+only the explored table is deduplicated. So the parent chain of the
+returned goal node is already a real path from the start state, and no
+mapping back through the symmetry is needed at the end.
+"""
+
+from typing import Callable, Hashable, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from hw3 import boxstar, getKeeperPosition, keeperstar, star, wall
+
+State = npt.NDArray[np.int_]
+Transform = Callable[[np.ndarray], np.ndarray]
+
+TRANSFORMS: dict[str, Transform] = {
+    "identity": lambda a: a,
+    "rot90": lambda a: np.rot90(a, 1),
+    "rot180": lambda a: np.rot90(a, 2),
+    "rot270": lambda a: np.rot90(a, 3),
+    "flip_lr": np.fliplr,
+    "flip_ud": np.flipud,
+    "transpose": np.transpose,
+    "anti_transpose": lambda a: np.rot90(a, 2).T,
+}
+
+
+def playable_area(s: State) -> np.ndarray:
+    """Boolean mask of the squares the keeper can ever stand on or push
+    a box onto, i.e. the non-wall squares connected to the keeper."""
+    area = np.zeros(s.shape, dtype=bool)
+    stack = [getKeeperPosition(s)]
+    while stack:
+        row, col = stack.pop()
+        if (row < 0 or row >= s.shape[0] or col < 0 or col >= s.shape[1]
+                or area[row, col] or s[row, col] == wall):
+            continue
+        area[row, col] = True
+        stack.extend(((row - 1, col), (row + 1, col),
+                      (row, col - 1), (row, col + 1)))
+    return area
+
+
+def level_symmetries(s: State) -> list[str]:
+    """Names of the transforms in TRANSFORMS that are automorphisms of
+    the level of state s. Always starts with "identity"."""
+    blocked = ~playable_area(s)
+    goals = np.isin(s, (star, boxstar, keeperstar))
+    found = []
+    for name, transform in TRANSFORMS.items():
+        if (transform(blocked).shape == blocked.shape
+                and np.array_equal(transform(blocked), blocked)
+                and np.array_equal(transform(goals), goals)):
+            found.append(name)
+    return found
+
+
+def canonical_key(symmetries: list[str]) -> Callable[[State], Hashable]:
+    """Return a key function mapping a state to the smallest byte string
+    among its images under `symmetries`."""
+    transforms = [TRANSFORMS[name] for name in symmetries]
+
+    def key(state: State) -> bytes:
+        board = state.astype(np.int8)
+        return min(np.ascontiguousarray(t(board)).tobytes() for t in transforms)
+    return key
+
+
+def symmetric_key(s: State) -> Optional[Callable[[State], Hashable]]:
+    """Key function for the level of s, or None if the level has no
+    symmetry besides the identity (then the default key is cheaper)."""
+    symmetries = level_symmetries(s)
+    if len(symmetries) == 1:
+        return None
+    return canonical_key(symmetries)
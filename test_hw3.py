@@ -19,19 +19,44 @@ The other test cases are invented.
 #       expected to expand >= 10000 nodes, so they can take a long time
 #       to complete without a good heuristic.
 
+import asyncio
+import inspect
+import json
+import os
 import re
 import sys
+import tempfile
 import time
+import tracemalloc
 import unittest
+import warnings
 from argparse import ArgumentParser
 from dataclasses import dataclass
-from typing import Callable, Iterable, Optional, Type
+from functools import partial
+from typing import Callable, Iterable, Iterator, Optional, Type
 
 import numpy as np
 import numpy.typing as npt
 
 import astar
+import batch
+import benchmark
+import board
+import checkpoint
+import closedset
+import corral
+import deadlock
 import hw3
+import levels
+import macros
+import memreport
+import openlist
+import postopt
+import searchtrace
+import service
+import solution_cache
+import symmetry
+import validator
 from hw3 import goal_test, h0, h1, next_states
 
 State = npt.NDArray[np.int_]
@@ -557,6 +582,1084 @@ class TestNextStates(unittest.TestCase):
         )
 
 
+class TestSuccessorDeltas(unittest.TestCase):
+    def test_blocked_moves_produce_no_delta(self) -> None:
+        start = np.array([[1, 1, 1],
+                          [3, 2, 2],
+                          [1, 1, 1]])
+        self.assertEqual(hw3.successorDeltas(start), [])
+
+    def test_deltas_do_not_touch_parent(self) -> None:
+        start = np.array(S1)
+        before = start.copy()
+        deltas = hw3.successorDeltas(start)
+        self.assertTrue(np.array_equal(start, before))
+        self.assertEqual([D for D, _ in deltas], ["d", "l", "r"])
+
+    def test_push_patches_three_squares(self) -> None:
+        start = np.array([[1, 1, 1, 1],
+                          [6, 5, 0, 1],
+                          [1, 1, 1, 1]])
+        (D, delta), = hw3.successorDeltas(start)
+        self.assertEqual(D, "r")
+        self.assertEqual(sorted(delta), [(1, 0, 4), (1, 1, 6), (1, 2, 2)])
+        child = hw3.applyDelta(start, delta)
+        self.assertTrue(np.array_equal(child, [[1, 1, 1, 1],
+                                               [4, 6, 2, 1],
+                                               [1, 1, 1, 1]]))
+        self.assertEqual(start[1, 0], 6)
+
+    def test_try_move_still_moves_in_place(self) -> None:
+        start = np.array([[1, 1, 1],
+                          [3, 2, 0],
+                          [1, 1, 1]])
+        self.assertIs(hw3.try_move(start, "r"), start)
+        self.assertTrue(np.array_equal(start, [[1, 1, 1],
+                                               [0, 3, 2],
+                                               [1, 1, 1]]))
+        self.assertIsNone(hw3.try_move(start, "u"))
+
+
+class TestLevels(unittest.TestCase):
+    S1_XSB = [
+        "######",
+        "# @  #",
+        "# $  #",
+        "## ###",
+        "#    #",
+        "#   .#",
+        "######",
+    ]
+
+    def test_parse_matches_predefined_problem(self) -> None:
+        received = levels.parse_level(self.S1_XSB)
+        self.assertTrue(np.array_equal(received, S1))
+
+    def test_format_round_trips(self) -> None:
+        for problem in (S1, S16, S17):
+            text = levels.format_level(np.array(problem))
+            received = levels.parse_level(text.splitlines())
+            self.assertTrue(np.array_equal(received, problem))
+
+    def test_ragged_rows_are_padded_with_blanks(self) -> None:
+        received = levels.parse_level(["  ###", "#+*$#", "###"])
+        self.assertTrue(np.array_equal(received, [[0, 0, 1, 1, 1],
+                                                  [1, 6, 5, 2, 1],
+                                                  [1, 1, 1, 0, 0]]))
+
+    def test_invalid_square(self) -> None:
+        with self.assertRaises(ValueError):
+            levels.parse_level(["#@x.#"])
+
+    def test_iter_levels_reads_titles_and_metadata(self) -> None:
+        collection = [
+            "; first",
+            "",
+            *self.S1_XSB,
+            "",
+            "#####",
+            "#@$.#",
+            "#####",
+            "Title: Second",
+            "Author: nobody",
+        ]
+        first, second = levels.iter_levels(collection)
+        self.assertEqual((first.index, first.title), (1, "first"))
+        self.assertTrue(np.array_equal(first.state, S1))
+        self.assertEqual((second.index, second.title), (2, "Second"))
+        self.assertEqual(second.metadata["Author"], "nobody")
+
+    def test_iter_levels_is_lazy(self) -> None:
+        def lines() -> Iterable[str]:
+            yield from ["#####", "#@$.#", "#####", ""]
+            yield from ["#####", "#.$@#", "#####", ""]
+            raise AssertionError("read past the second level")
+
+        received = levels.iter_levels(lines())
+        self.assertEqual(next(received).index, 1)
+        self.assertEqual(levels.load_level(lines(), 2).index, 2)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_reference_figures_match_skeleton_comments(self) -> None:
+        figures = benchmark.reference_figures()
+        self.assertEqual(figures["s1"], (80, 7))
+        self.assertEqual(figures["s17"], (3301278, 76))
+        self.assertEqual(figures["s18"], (None, 25))
+        for num in range(1, 20):
+            self.assertEqual(figures[f"s{num}"][1], OPTIMAL_DEPTHS[num])
+
+    def test_run_benchmark_report(self) -> None:
+        report = benchmark.run_benchmark(["s1-s2"], ["h1"], ["astar"], 2)
+        self.assertEqual(
+            [r["level"] for r in report["results"]], ["s1", "s2"])
+        first = report["results"][0]
+        self.assertEqual(first["depth"], OPTIMAL_DEPTHS[1])
+        self.assertGreater(first["nodes_generated"], first["nodes_expanded"])
+        self.assertLessEqual(first["seconds"]["min"], first["seconds"]["p50"])
+        self.assertGreater(first["peak_memory_bytes"], 0)
+
+    def test_compare_flags_regressions(self) -> None:
+        report = benchmark.run_benchmark(["s1"], ["h1"], ["astar"], 1, False)
+        self.assertEqual(benchmark.compare(report, report), [])
+
+        baseline = {"meta": {}, "results": [dict(report["results"][0])]}
+        baseline["results"][0]["nodes_expanded"] //= 2
+        baseline["results"][0]["depth"] = 6
+        regressions = benchmark.compare(report, baseline, 0.1)
+        self.assertEqual(len(regressions), 2)
+
+        reference = benchmark.reference_baseline()
+        self.assertEqual(benchmark.compare(report, reference), [])
+        # Inexact engines and heuristics are not held to the optimal depths.
+        longer = {"meta": {}, "results": []}
+        for engine, heuristic in (("pi-corral", "h1"), ("astar", "hUID"), ("astar", "h1")):
+            longer["results"].append(dict(report["results"][0], engine=engine, heuristic=heuristic,
+                                          depth=OPTIMAL_DEPTHS[1] + 2))
+        regressions = benchmark.compare(longer, reference)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("s1 h1 astar"))
+
+
+class TestSearchStats(unittest.TestCase):
+    def test_counters_match_return_value(self) -> None:
+        stats = astar.SearchStats()
+        goal_node, generated, expanded = astar.a_star_search(
+            np.array(S7), goal_test, next_states, h1, stats)
+        self.assertEqual(_get_depth_of_solution(goal_node), OPTIMAL_DEPTHS[7])
+        self.assertEqual(stats.node_generated, generated)
+        self.assertEqual(stats.node_expanded, expanded)
+        self.assertEqual(stats.calls["heuristic"], generated)
+        self.assertEqual(stats.calls["successors"], expanded)
+        # Every pop either finds the goal, is a duplicate or is expanded.
+        self.assertEqual(
+            stats.calls["heap_pop"],
+            1 + stats.duplicates_skipped + expanded,
+        )
+        self.assertGreater(stats.peak_heap_size, 0)
+        self.assertGreater(stats.total_seconds, 0)
+        self.assertIn("Peak heap size", stats.report())
+
+    def test_same_result_without_stats(self) -> None:
+        _, *with_stats = astar.a_star_search(
+            np.array(S5), goal_test, next_states, h1, astar.SearchStats())
+        _, *without = astar.a_star_search(
+            np.array(S5), goal_test, next_states, h1)
+        self.assertEqual(with_stats, without)
+
+
+class TestSearchTrace(unittest.TestCase):
+    def setUp(self) -> None:
+        handle, self.path = tempfile.mkstemp(suffix=".trace")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def test_round_trip_and_summary(self) -> None:
+        # A tiny buffer forces several flushes during the search.
+        with searchtrace.TraceWriter(self.path, buffer_records=7) as trace:
+            goal_node, _, expanded = astar.a_star_search(
+                np.array(S6), goal_test, next_states, h1, trace=trace)
+        records = list(searchtrace.read_trace(self.path))
+        self.assertEqual(len(records), expanded + 1)
+        self.assertEqual(records[0].parent_hash, 0)
+        self.assertEqual(records[-1].kind, searchtrace.GOAL)
+
+        summary = searchtrace.summarize_trace(self.path)
+        self.assertEqual(summary.expansions, expanded)
+        self.assertEqual(sum(summary.expansions_per_f.values()), expanded)
+        self.assertEqual(summary.depth, OPTIMAL_DEPTHS[6])
+        self.assertEqual(_get_depth_of_solution(goal_node),
+                         len(summary.solution_path))
+        # h1 is admissible, so it never overestimates along the path.
+        for g, h, true_distance in summary.solution_path:
+            self.assertLessEqual(h, true_distance)
+
+    def test_rejects_other_files(self) -> None:
+        with open(self.path, "wb") as file:
+            file.write(b"not a trace at all")
+        with self.assertRaises(ValueError):
+            list(searchtrace.read_trace(self.path))
+
+
+class TestSolutionCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = solution_cache.SolutionCache(":memory:")
+        self.addCleanup(self.cache.close)
+
+    def test_level_hash_is_canonical(self) -> None:
+        self.assertEqual(
+            solution_cache.level_hash(S1),
+            solution_cache.level_hash(np.array(S1, dtype=np.int8)),
+        )
+        self.assertNotEqual(
+            solution_cache.level_hash(S1),
+            solution_cache.level_hash(np.array(S1).T),
+        )
+
+    def test_moves_string_round_trip(self) -> None:
+        goal_node, *_ = astar.a_star_search(np.array(S6), goal_test, next_states, h1)
+        path = []
+        while goal_node:
+            path.append(goal_node.state1)
+            goal_node = goal_node.parent
+        path.reverse()
+        moves = hw3.movesString(path)
+        self.assertEqual(len(moves), OPTIMAL_DEPTHS[6])
+        self.assertEqual(moves, a_star(S6, h1).moves)
+        replayed = hw3.replayMoves(np.array(S6), moves)
+        for expected, received in zip(path, replayed):
+            self.assertTrue(np.array_equal(expected, received))
+        with self.assertRaises(ValueError):
+            hw3.replayMoves(np.array(S1), "u")
+
+    def test_keeps_shortest_solution_per_heuristic(self) -> None:
+        self.cache.put(S1, "dDDlurRlr", "h1", "astar")
+        self.cache.put(S1, "DDDldRR", "h1", "astar", 150, 57)
+        self.cache.put(S1, "dDDldRRll", "h1", "astar")
+        self.cache.put(S1, "DDDldRR", "h0", "astar")
+        self.assertEqual(len(self.cache), 2)
+        hit = self.cache.get(np.array(S1), "h1")
+        self.assertEqual((hit.moves, hit.depth), ("DDDldRR", 7))
+        self.assertEqual(hit.nodes_expanded, 57)
+        self.assertIsNone(self.cache.get(S1, "hUID"))
+        self.assertIsNone(self.cache.get(S2))
+
+    def test_evicts_least_recently_used(self) -> None:
+        self.cache.max_entries = 2
+        self.cache.put(S1, "u", "h1", "astar")
+        self.cache.put(S2, "uu", "h1", "astar")
+        self.cache.get(S1)
+        self.cache.put(S3, "uuu", "h1", "astar")
+        self.assertIsNotNone(self.cache.get(S1))
+        self.assertIsNone(self.cache.get(S2))
+        self.assertIsNotNone(self.cache.get(S3))
+
+        self.cache.max_entries = None
+        self.cache.max_bytes = 4
+        self.cache.put(S4, "uuuu", "h1", "astar")
+        self.assertEqual(len(self.cache), 1)
+        self.assertIsNotNone(self.cache.get(S4))
+
+    def test_harness_replays_cached_solution(self) -> None:
+        first = a_star(S5, h1, cache=self.cache)
+        second = a_star(S5, h1, cache=self.cache)
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(second.solution_depth, first.solution_depth)
+        self.assertEqual(second.num_nodes_expanded, first.num_nodes_expanded)
+        self.assertEqual(second.moves, first.moves)
+        self.assertTrue(goal_test(list(second.states())[-1]))
+
+
+class TestSymmetry(unittest.TestCase):
+    MIRRORED = levels.parse_level([
+        "#######",
+        "#.   .#",
+        "# $ $ #",
+        "#  @  #",
+        "#     #",
+        "#######",
+    ])
+
+    def test_detects_automorphisms(self) -> None:
+        self.assertEqual(symmetry.level_symmetries(self.MIRRORED),
+                         ["identity", "flip_lr"])
+        square = levels.parse_level(["#####", "#. .#", "# @ #", "#. .#", "#####"])
+        self.assertEqual(symmetry.level_symmetries(square),
+                         list(symmetry.TRANSFORMS))
+        # The walls of s18 are mirror-symmetric but its goals are not.
+        self.assertEqual(symmetry.level_symmetries(np.array(S18)), ["identity"])
+        self.assertIsNone(symmetry.symmetric_key(np.array(S1)))
+
+    def test_mirror_images_share_a_key(self) -> None:
+        key = symmetry.symmetric_key(self.MIRRORED)
+        (_, left), = [m for m in hw3.successorDeltas(self.MIRRORED) if m[0] == "l"]
+        (_, right), = [m for m in hw3.successorDeltas(self.MIRRORED) if m[0] == "r"]
+        self.assertEqual(key(hw3.applyDelta(self.MIRRORED, left)),
+                         key(hw3.applyDelta(self.MIRRORED, right)))
+
+    def test_search_stays_optimal_with_fewer_expansions(self) -> None:
+        plain_goal, _, plain_expanded = astar.a_star_search(
+            self.MIRRORED, goal_test, next_states, h1)
+        goal_node, _, expanded = astar.a_star_search(
+            self.MIRRORED, goal_test, next_states, h1,
+            key=symmetry.symmetric_key(self.MIRRORED))
+        self.assertLess(expanded, plain_expanded)
+        self.assertEqual(_get_depth_of_solution(goal_node),
+                         _get_depth_of_solution(plain_goal))
+        # The returned chain is a real path from the start state.
+        path = []
+        node = goal_node
+        while node:
+            path.append(node.state1)
+            node = node.parent
+        path.reverse()
+        moves = hw3.movesString(path)
+        replayed = hw3.replayMoves(self.MIRRORED, moves)
+        self.assertTrue(goal_test(replayed[-1]))
+
+
+class TestMacros(unittest.TestCase):
+    def test_finds_goal_room_and_packing_order(self) -> None:
+        analysis = macros.analyze_level(np.array(S10))
+        room, = analysis.rooms
+        self.assertEqual(room.entrance, (5, 5))
+        self.assertEqual(room.packing_order, [(8, 5), (7, 5), (6, 5)])
+        # The layout analysis is shared by states of the same level.
+        self.assertIs(macros.analyze_level(np.array(S10)), analysis)
+
+    def test_tunnel_push_runs_to_end_of_tunnel(self) -> None:
+        start = levels.parse_level([
+            "#########",
+            "#@$    .#",
+            "## #### #",
+            "#########",
+        ])
+        analysis = macros.analyze_level(start)
+        self.assertTrue(analysis.tunnel["r"][1, 3])
+        self.assertFalse(analysis.tunnel["r"][1, 2])
+        # From (1,3) to (1,6) the box has walls above and below; (1,7)
+        # is open below, so the macro stops the box at (1,6).
+        successors = macros.macro_next_states(start)(start)
+        self.assertEqual(len(successors), 1)
+        self.assertTrue(np.array_equal(
+            successors[0], levels.parse_level([
+                "#########",
+                "#    @$.#",
+                "## #### #",
+                "#########",
+            ])))
+        self.assertEqual(macros.keeper_distance(start, successors[0]), 4)
+
+    def test_macro_search_is_optimal_with_fewer_expansions(self) -> None:
+        start = np.array(S10)
+        goal_node, _, expanded = astar.a_star_search(
+            start, goal_test, macros.macro_next_states(start), hUID,
+            step_cost=macros.keeper_distance)
+        _, _, plain_expanded = astar.a_star_search(
+            start, goal_test, next_states, hUID)
+        self.assertEqual(goal_node.cost, OPTIMAL_DEPTHS[10])
+        self.assertLess(expanded, plain_expanded)
+
+
+class TestMoveStrings(unittest.TestCase):
+    def test_next_moves_labels_next_states(self) -> None:
+        start = np.array([[1, 0, 1, 1],
+                          [1, 2, 1, 1],
+                          [4, 6, 5, 0],
+                          [1, 5, 1, 1],
+                          [1, 4, 1, 1]])
+        labeled = hw3.next_moves(start)
+        self.assertEqual([move for move, _ in labeled], ["U", "D", "l", "R"])
+        for (_, received), expected in zip(labeled, next_states(start)):
+            self.assertTrue(np.array_equal(received, expected))
+
+    def test_nodes_record_moves(self) -> None:
+        goal_node, generated, expanded = astar.a_star_search(
+            np.array(S1), goal_test, hw3.next_moves, h1, labeled=True)
+        _, *unlabeled = astar.a_star_search(np.array(S1), goal_test, next_states, h1)
+        self.assertEqual([generated, expanded], unlabeled)
+        moves = astar.solution_moves(goal_node)
+        self.assertEqual(len(moves), OPTIMAL_DEPTHS[1])
+        final = list(hw3.iterStates(np.array(S1), moves))[-1]
+        self.assertTrue(np.array_equal(final, goal_node.state1))
+        self.assertEqual(hw3.prettyMoves(moves)[0], "Down")
+
+    def test_macro_moves_spell_out_every_push(self) -> None:
+        start = np.array(S10)
+        goal_node, *_ = astar.a_star_search(
+            start, goal_test, macros.macro_next_moves(start), hUID,
+            labeled=True)
+        moves = astar.solution_moves(goal_node)
+        self.assertEqual(len(moves), OPTIMAL_DEPTHS[10])
+        self.assertEqual(goal_node.cost, len(moves))
+        self.assertTrue(goal_test(hw3.replayMoves(start, moves)[-1]))
+
+
+class TestService(unittest.TestCase):
+    def test_solve_returns_structured_result(self) -> None:
+        events = []
+
+        async def run() -> dict:
+            solver = service.SolveService(max_workers=2, progress_every=1)
+            return await solver.solve(S1, "h1", on_progress=events.append)
+        result = asyncio.run(run())
+        self.assertEqual(result["status"], "solved")
+        self.assertEqual(result["depth"], OPTIMAL_DEPTHS[1])
+        self.assertTrue(goal_test(hw3.replayMoves(np.array(S1), result["moves"])[-1]))
+        self.assertTrue(events)
+        self.assertEqual(events[-1]["nodes_expanded"], len(events))
+
+    def test_deadline_and_cancellation_stop_the_worker(self) -> None:
+        async def run() -> tuple[dict, bool]:
+            solver = service.SolveService(max_workers=1)
+            timed_out = await solver.solve(S17, "h0", deadline=0.5)
+            task = asyncio.create_task(solver.solve(S17, "h0"))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # The slot was released, so another request can run.
+            return timed_out, await solver.solve(S1, "h1", deadline=30)
+        timed_out, result = asyncio.run(run())
+        self.assertEqual(timed_out, {"status": "timeout"})
+        self.assertEqual(result["status"], "solved")
+
+    def test_bad_requests_are_errors(self) -> None:
+        async def run() -> list[dict]:
+            solver = service.SolveService(max_workers=1)
+            return [await solver.solve(S1, "h9"),
+                    await solver.solve(S1, ["h1"]),
+                    await solver.solve(S1, "h1", deadline="5"),
+                    await solver.solve([[1, 9]], "h1"),
+                    await solver.solve("#####\n#@$x#\n#####", "h1")]
+        for result in asyncio.run(run()):
+            self.assertEqual(result["status"], "error")
+
+    def test_failed_worker_start_releases_its_slot(self) -> None:
+        async def run() -> tuple[dict, dict]:
+            solver = service.SolveService(max_workers=1)
+            context = solver._context
+
+            class FailingContext:
+                Pipe = context.Pipe
+
+                def Process(self, *args, **kwargs):
+                    def start() -> None:
+                        raise OSError("no processes left")
+                    process = context.Process(*args, **kwargs)
+                    process.start = start
+                    return process
+            solver._context = FailingContext()
+            with self.assertRaises(OSError):
+                await solver.solve(S1, "h1")
+            solver._context = context
+            return await solver.solve(S1, "h1", deadline=30)
+        self.assertEqual(asyncio.run(run())["status"], "solved")
+
+    def test_server_streams_results_per_request(self) -> None:
+        async def run() -> list[dict]:
+            server = await service.serve(port=0, max_workers=2)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for request in ({"id": 1, "level": S17, "heuristic": "h0"},
+                            {"id": 2, "level": "#####\n#@$.#\n#####"},
+                            {"id": 1, "op": "cancel"}):
+                writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            results = []
+            while len(results) < 2:
+                message = json.loads(await reader.readline())
+                if message["event"] == "result":
+                    results.append(message)
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return sorted(results, key=lambda r: r["id"])
+        cancelled, solved = asyncio.run(run())
+        self.assertEqual(cancelled["status"], "cancelled")
+        self.assertEqual(solved["moves"], "R")
+
+    def test_server_survives_bad_requests(self) -> None:
+        async def run() -> list[dict]:
+            server = await service.serve(port=0, max_workers=1)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            level = "#####\n#@$.#\n#####"
+            for request in ({"id": [1], "level": level},
+                            {"id": 1, "level": level, "deadline": "5"},
+                            {"id": 1, "level": level}):
+                writer.write(json.dumps(request).encode() + b"\n")
+                await writer.drain()
+                await asyncio.sleep(0.1)
+            messages = []
+            while len([m for m in messages if m["event"] == "result"]) < 2:
+                messages.append(json.loads(await reader.readline()))
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return messages
+        bad_id, *results = asyncio.run(run())
+        self.assertEqual(bad_id["event"], "error")
+        self.assertNotIn("id", bad_id)
+        self.assertEqual([(r["id"], r["status"]) for r in results], [(1, "error"), (1, "solved")])
+
+
+class TestCheckpoint(unittest.TestCase):
+    def _checkpointed_run(self, start: State, every: int, **kwargs) -> tuple:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "search.npz")
+            saver = checkpoint.Checkpointer(path, every)
+            result = astar.a_star_search(start, goal_test, hw3.next_moves, h1,
+                                         labeled=True, checkpoint=saver, **kwargs)
+            self.assertGreater(saver.saved, 1)
+            resumed = checkpoint.resume_search(path, goal_test, hw3.next_moves, h1,
+                                               labeled=True, **kwargs)
+        return result, resumed
+
+    def test_resume_matches_uninterrupted_search(self) -> None:
+        (goal, *counters), (resumed_goal, *resumed_counters) = \
+            self._checkpointed_run(np.array(S10), 1000)
+        self.assertEqual(resumed_counters, counters)
+        self.assertEqual(astar.solution_moves(resumed_goal), astar.solution_moves(goal))
+
+    def test_resume_with_symmetric_keys(self) -> None:
+        start = TestSymmetry.MIRRORED
+        key = symmetry.symmetric_key(start)
+        self.assertIsNotNone(key)
+        (goal, *counters), (resumed_goal, *resumed_counters) = \
+            self._checkpointed_run(start, 10, key=key)
+        self.assertEqual(resumed_counters, counters)
+        self.assertEqual(resumed_goal.cost, goal.cost)
+
+    def test_unsupported_states_and_keys_fail_before_searching(self) -> None:
+        start = np.array(S10)
+        saver = checkpoint.Checkpointer(os.path.join(tempfile.gettempdir(), "never.npz"), 10**9)
+        stats = astar.SearchStats()
+        with self.assertRaisesRegex(TypeError, "FlatBoard"):
+            board.flat_a_star_search(start, goal_test, next_states, h1, stats=stats, checkpoint=saver)
+        with self.assertRaisesRegex(TypeError, "int"):
+            astar.a_star_search(start, goal_test, next_states, h1, stats,
+                                key=closedset.StatePacker(start), checkpoint=saver)
+        self.assertEqual(stats.node_expanded, 0)
+        self.assertEqual(saver.saved, 0)
+
+
+class TestSearchProgress(unittest.TestCase):
+    def test_events_every_n_expansions_then_result(self) -> None:
+        start = np.array(S10)
+        events = list(astar.iter_a_star_search(
+            start, goal_test, next_states, h1, progress_every=1000))
+        goal_node, generated, expanded = astar.a_star_search(
+            start, goal_test, next_states, h1)
+        *progress, final = events
+        self.assertEqual([p.node_expanded for p in progress],
+                         list(range(1000, expanded + 1, 1000)))
+        self.assertFalse(any(p.done for p in progress))
+        self.assertEqual([p.f_bound for p in progress],
+                         sorted(p.f_bound for p in progress))
+        self.assertTrue(final.done)
+        self.assertEqual([final.node_generated, final.node_expanded],
+                         [generated, expanded])
+        self.assertEqual(final.goal_node.cost, goal_node.cost)
+
+    def test_partial_expansion_events_every_n_expansions(self) -> None:
+        *progress, final = astar.iter_a_star_search(
+            np.array(S10), goal_test, next_states, h1, progress_every=100, partial_expansion=True)
+        self.assertEqual([p.node_expanded for p in progress],
+                         list(range(100, final.node_expanded + 1, 100)))
+
+    def test_abandoning_the_generator_stops_the_search(self) -> None:
+        stats = astar.SearchStats()
+        search = astar.iter_a_star_search(
+            np.array(S10), goal_test, next_states, h1, stats, progress_every=100)
+        first = next(search)
+        search.close()
+        self.assertEqual(first.node_expanded, 100)
+        self.assertEqual(stats.node_expanded, 100)
+        self.assertEqual(first.closed_size, 100)
+
+
+class TestFlatBoard(unittest.TestCase):
+    def test_round_trip_and_key(self) -> None:
+        for problem in (S1, S10, S18):
+            flat = board.FlatBoard.from_state(problem)
+            self.assertTrue(np.array_equal(flat.to_state(), problem))
+            self.assertEqual(flat.shape, np.array(problem).shape)
+            self.assertEqual(flat.position(flat.keeper),
+                             hw3.getKeeperPosition(np.array(problem)))
+            self.assertEqual(board.board_key(flat), bytes(flat.cells))
+
+    def test_matches_numpy_functions(self) -> None:
+        for problem in (S1, S4, S10, S14, S19):
+            start = np.array(problem)
+            flat = board.FlatBoard.from_state(start)
+            self.assertEqual(board.goal_test(flat), goal_test(start))
+            self.assertEqual(board.h1(flat), h1(start))
+            self.assertEqual(board.h605721982(flat), hUID(start))
+            expected = hw3.next_moves(start)
+            received = board.next_moves(flat)
+            self.assertEqual([m for m, _ in received], [m for m, _ in expected])
+            for (_, child), (_, state) in zip(received, expected):
+                self.assertTrue(np.array_equal(child.to_state(), state))
+
+    def test_search_matches_numpy_search(self) -> None:
+        start = np.array(S13)
+        goal_node, *counters = astar.a_star_search(
+            start, goal_test, hw3.next_moves, hUID, labeled=True)
+        flat_goal, *flat_counters = board.flat_a_star_search(
+            start, goal_test, next_states, hUID, labeled=True)
+        self.assertEqual(flat_counters, counters)
+        self.assertEqual(astar.solution_moves(flat_goal),
+                         astar.solution_moves(goal_node))
+        self.assertTrue(board.goal_test(flat_goal.state1))
+
+
+class TestPartialExpansion(unittest.TestCase):
+    def test_optimal_with_smaller_open_list(self) -> None:
+        for problem, heuristic in ((S10, h1), (S13, hUID)):
+            start = np.array(problem)
+            plain, partial = astar.SearchStats(), astar.SearchStats()
+            plain_goal, plain_generated, _ = astar.a_star_search(
+                start, goal_test, hw3.next_moves, heuristic, plain, labeled=True)
+            goal_node, generated, _ = astar.a_star_search(
+                start, goal_test, hw3.next_moves, heuristic, partial,
+                labeled=True, partial_expansion=True)
+            moves = astar.solution_moves(goal_node)
+            self.assertEqual(len(moves), len(astar.solution_moves(plain_goal)))
+            self.assertTrue(goal_test(hw3.replayMoves(start, moves)[-1]))
+            self.assertLessEqual(generated, plain_generated)
+            self.assertLess(partial.peak_heap_size, plain.peak_heap_size)
+            self.assertGreater(partial.reexpanded, 0)
+
+    def test_rejects_checkpoints(self) -> None:
+        with self.assertRaises(ValueError):
+            astar.a_star_search(np.array(S1), goal_test, next_states, h1,
+                                checkpoint=checkpoint.Checkpointer(os.devnull),
+                                partial_expansion=True)
+
+
+class TestEarlyDuplicateDetection(unittest.TestCase):
+    def test_duplicates_dropped_before_allocation(self) -> None:
+        for problem, heuristic in ((S10, h1), (S13, hUID)):
+            start = np.array(problem)
+            plain, early = astar.SearchStats(), astar.SearchStats()
+            plain_goal, plain_generated, _ = astar.a_star_search(
+                start, goal_test, hw3.next_moves, heuristic, plain, labeled=True)
+            goal_node, generated, _ = astar.a_star_search(
+                start, goal_test, hw3.next_moves, heuristic, early,
+                labeled=True, early_duplicate_detection=True)
+            self.assertEqual(goal_node.cost, plain_goal.cost)
+            self.assertGreater(early.closed_duplicates_avoided, 0)
+            self.assertGreater(early.open_duplicates_avoided, 0)
+            self.assertLess(generated, plain_generated)
+            # The heuristic only runs for the nodes actually built.
+            self.assertEqual(early.calls["heuristic"], generated)
+            self.assertLess(early.duplicates_skipped, plain.duplicates_skipped)
+
+
+class TestOpenLists(unittest.TestCase):
+    @staticmethod
+    def _nodes(*fg: tuple[int, int]) -> list[astar.PathNode]:
+        return [astar.PathNode(None, None, g, f, key=i) for i, (f, g) in enumerate(fg)]
+
+    def _drain(self, open_list, nodes: list[astar.PathNode]) -> list[int]:
+        for node in nodes:
+            open_list.push(node)
+        self.assertEqual(len(open_list), len(nodes))
+        return [open_list.pop().state for _ in nodes]
+
+    def test_bucket_orders(self) -> None:
+        nodes = self._nodes((3, 1), (2, 0), (3, 2), (10 ** 13, 1), (3, 1), (2, 1))
+        self.assertEqual(self._drain(openlist.BucketOpenList(), nodes),
+                         [5, 1, 4, 2, 0, 3])
+        self.assertEqual(self._drain(openlist.BucketOpenList("fifo"), nodes),
+                         [1, 5, 0, 2, 4, 3])
+        self.assertEqual(self._drain(openlist.BucketOpenList(high_g_first=True), nodes),
+                         [5, 1, 2, 4, 0, 3])
+        with self.assertRaises(IndexError):
+            openlist.BucketOpenList().pop()
+
+    def test_iteration_rebuilds_the_open_list(self) -> None:
+        nodes = self._nodes((4, 1), (2, 0), (3, 2), (1 << 20, 1), (3, 1), (2, 1))
+        for factory in (openlist.HeapOpenList, openlist.BucketOpenList,
+                        partial(openlist.BucketOpenList, "fifo", True),
+                        openlist.TieBreakingOpenList,
+                        partial(openlist.TieBreakingOpenList, "lifo")):
+            original = factory()
+            for node in nodes:
+                original.push(node)
+            rebuilt = factory()
+            for node in original:
+                rebuilt.push(node)
+            self.assertEqual([original.pop().state for _ in nodes],
+                             [rebuilt.pop().state for _ in nodes])
+
+    def test_tie_breaking_orders(self) -> None:
+        nodes = self._nodes((3, 1), (2, 0), (3, 2), (3, 1), (2, 1))
+        expected = {"high_g": [4, 1, 2, 0, 3], "low_h": [4, 1, 2, 0, 3],
+                    "lifo": [4, 1, 3, 2, 0], "fifo": [1, 4, 0, 2, 3]}
+        for policy, order in expected.items():
+            self.assertEqual(self._drain(openlist.TieBreakingOpenList(policy), nodes), order)
+        by_key = openlist.TieBreakingOpenList(lambda node: -node.state)
+        self.assertEqual(self._drain(by_key, nodes), [4, 1, 3, 2, 0])
+        with self.assertRaises(ValueError):
+            openlist.TieBreakingOpenList("random")
+
+    def test_high_g_tie_breaking_cuts_expansions(self) -> None:
+        start = np.array(S13)
+        _, _, plain_expanded = astar.a_star_search(
+            start, goal_test, hw3.next_moves, hUID, labeled=True)
+        goal_node, _, expanded = astar.a_star_search(
+            start, goal_test, hw3.next_moves, hUID, labeled=True,
+            tie_breaking="high_g")
+        self.assertEqual(goal_node.cost, OPTIMAL_DEPTHS[13])
+        self.assertLess(expanded, plain_expanded)
+        with self.assertRaises(ValueError):
+            astar.a_star_search(start, goal_test, next_states, h1, tie_breaking="lifo",
+                                open_list=openlist.BucketOpenList)
+
+    def test_search_with_bucket_queue(self) -> None:
+        start = np.array(S13)
+        for factory in (openlist.BucketOpenList,
+                        partial(openlist.BucketOpenList, high_g_first=True)):
+            goal_node, _, _ = astar.a_star_search(
+                start, goal_test, hw3.next_moves, hUID, labeled=True,
+                open_list=factory)
+            self.assertEqual(goal_node.cost, OPTIMAL_DEPTHS[13])
+
+
+class TestBatch(unittest.TestCase):
+    def test_solves_a_collection_on_a_process_pool(self) -> None:
+        problems = {1: S1, 2: S2, 3: S3, 5: S5}
+        text = "\n\n".join(levels.format_level(np.array(p)) for p in problems.values())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "set.xsb")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(text + "\n")
+            results = list(batch.solve_batch(levels.iter_levels(path),
+                                             batch.SolverConfig("h1"), max_workers=2))
+        self.assertEqual(sorted(r.index for r in results), [0, 1, 2, 3])
+        for result in results:
+            self.assertEqual(result.status, "solved")
+            self.assertEqual(result.name, f"#{result.index + 1}")
+            self.assertEqual(result.depth, OPTIMAL_DEPTHS[list(problems)[result.index]])
+
+    def test_layout_analysis_shared_between_levels(self) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+        macros._analyze.cache_clear()
+        moved_keeper = np.array(S10)
+        moved_keeper[2, 1], moved_keeper[1, 1] = 0, 3
+        inputs = [("a", S10), ("b", S13), ("c", moved_keeper), ("d", [[1, 9]])]
+        with ThreadPoolExecutor(2) as executor:
+            results = {r.name: r for r in batch.solve_batch(
+                inputs, batch.SolverConfig("hUID", macros=True), 2, executor)}
+        self.assertEqual(macros._analyze.cache_info().misses, 2)
+        self.assertEqual(results["a"].depth, OPTIMAL_DEPTHS[10])
+        self.assertEqual(results["b"].depth, OPTIMAL_DEPTHS[13])
+        self.assertEqual(results["c"].status, "solved")
+        self.assertEqual(results["d"].status, "error")
+        with self.assertRaises(ValueError):
+            list(batch.solve_batch([S1], batch.SolverConfig(engine="flat", macros=True)))
+
+    def test_levels_in_flight_bounded_by_max_workers(self) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+
+        class CountingExecutor(ThreadPoolExecutor):
+            submitted = 0
+
+            def submit(self, *args, **kwargs):
+                self.submitted += 1
+                return super().submit(*args, **kwargs)
+        with CountingExecutor(1) as executor:
+            in_flight = []
+            for done, _ in enumerate(batch.solve_batch([S1, S2, S3, S4, S5, S6] * 2,
+                                                       batch.SolverConfig("h1"), 1, executor)):
+                in_flight.append(executor.submitted - done)
+        self.assertEqual(max(in_flight), 2)
+
+
+class TestCorral(unittest.TestCase):
+    FENCED = [
+        "#########",
+        "#@  $  .#",
+        "#.$ $  .#",
+        "#   $  .#",
+        "#########",
+    ]
+
+    def test_push_search_is_move_optimal(self) -> None:
+        for i, problem in ((3, S3), (9, S9), (13, S13)):
+            start = np.array(problem)
+            goal_node, generated, _ = corral.push_a_star_search(
+                start, goal_test, next_states, hUID, pi_corrals=False)
+            _, move_generated, _ = astar.a_star_search(start, goal_test, next_states, hUID)
+            moves = astar.solution_moves(goal_node)
+            self.assertEqual(len(moves), OPTIMAL_DEPTHS[i])
+            self.assertEqual(goal_node.cost, len(moves))
+            self.assertTrue(goal_test(hw3.replayMoves(start, moves)[-1]))
+            self.assertLess(generated, move_generated)
+
+    def test_pushes_restricted_to_pi_corral(self) -> None:
+        start = board.FlatBoard.from_state(levels.parse_level(self.FENCED))
+        self.assertEqual(len(corral.next_pushes(start)), 7)
+        pruned = corral.next_pushes_pi(start)
+        # Only the three fence boxes, pushed into the corral behind them.
+        self.assertEqual(sorted(moves for moves, _ in pruned), ["ddrrR", "rrR", "rrdR"])
+        goal_node, *_ = astar.a_star_search(
+            start, board.goal_test, corral.next_pushes_pi, board.h605721982,
+            key=board.board_key, labeled=True)
+        moves = astar.solution_moves(goal_node)
+        self.assertTrue(goal_test(hw3.replayMoves(levels.parse_level(self.FENCED), moves)[-1]))
+
+    def test_frozen_box_off_goal_has_no_successors(self) -> None:
+        start = board.FlatBoard.from_state(levels.parse_level([
+            "######",
+            "#$  .#",
+            "#  $ #",
+            "# @ .#",
+            "######",
+        ]))
+        self.assertTrue(corral.next_pushes(start))
+        self.assertEqual(corral.next_pushes_pi(start), [])
+
+    def test_pruning_generates_fewer_nodes(self) -> None:
+        start = np.array(S15)
+        goal_node, generated, _ = corral.push_a_star_search(start, goal_test, next_states, hUID)
+        _, unpruned, _ = corral.push_a_star_search(
+            start, goal_test, next_states, hUID, pi_corrals=False)
+        self.assertLess(generated, unpruned)
+        self.assertTrue(goal_test(hw3.replayMoves(start, astar.solution_moves(goal_node))[-1]))
+
+
+class TestConsistentMode(unittest.TestCase):
+    def test_consistent_heuristic_needs_no_reopening(self) -> None:
+        for i, problem in ((7, S7), (9, S9)):
+            start = np.array(problem)
+            stats = astar.SearchStats()
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                goal_node, generated, _ = astar.a_star_search(
+                    start, goal_test, next_states, h1, stats=stats, consistent=True)
+            _, plain_generated, _ = astar.a_star_search(start, goal_test, next_states, h1)
+            self.assertEqual(goal_node.cost, OPTIMAL_DEPTHS[i])
+            self.assertLess(generated, plain_generated)
+            self.assertEqual(stats.calls["heuristic"], generated)
+            self.assertEqual(stats.consistency_violations, 0)
+
+    def test_sampled_edges_are_checked(self) -> None:
+        stats = astar.SearchStats()
+        goal_node, generated, _ = astar.a_star_search(
+            np.array(S9), goal_test, next_states, h1, stats=stats,
+            consistent=True, consistency_sample=1)
+        self.assertEqual(goal_node.cost, OPTIMAL_DEPTHS[9])
+        self.assertEqual(stats.calls["heuristic"],
+                         generated + stats.closed_duplicates_avoided)
+        with self.assertRaises(ValueError):
+            astar.a_star_search(np.array(S1), goal_test, next_states, h1,
+                                consistency_sample=10)
+
+    def test_warns_about_inconsistent_heuristic(self) -> None:
+        stats = astar.SearchStats()
+        with self.assertWarns(RuntimeWarning):
+            goal_node, *_ = astar.a_star_search(
+                np.array(S13), goal_test, next_states, hUID, stats=stats, consistent=True)
+        self.assertTrue(goal_test(goal_node.state1))
+        self.assertGreater(stats.consistency_violations, 0)
+        self.assertEqual(stats.reopened, 0)
+
+
+class TestDeadlockTable(unittest.TestCase):
+    def setUp(self) -> None:
+        saved = bytes(deadlock._table)
+        self.addCleanup(lambda: deadlock._table.__setitem__(slice(None), saved))
+
+    def check(self, rows: list[str], square: tuple[int, int], expected: bool) -> None:
+        s = levels.parse_level(rows)
+        self.assertEqual(deadlock.is_deadlock(s, *square), expected, rows)
+        flat = board.FlatBoard.from_state(s)
+        index = (square[0] + 1) * flat.width + square[1] + 1
+        self.assertEqual(deadlock.flat_is_deadlock(flat, index), expected, rows)
+
+    def test_freeze_patterns(self) -> None:
+        self.check(["#####", "#$  #", "#  @#", "#####"], (1, 1), True)
+        self.check(["#####", "#*  #", "#  @#", "#####"], (1, 1), False)
+        # 2x2 blocks, of boxes only or with walls.
+        self.check(["######", "# $$ #", "# $$ #", "#   @#", "######"], (1, 2), True)
+        self.check(["######", "# ** #", "# ** #", "#   @#", "######"], (1, 2), False)
+        self.check(["######", "# *$ #", "#  # #", "#   @#", "######"], (1, 2), True)
+        # Two boxes side by side against a wall hold each other.
+        self.check(["######", "# *$ #", "#   @#", "######"], (1, 2), True)
+        self.check(["######", "# $  #", "# $ @#", "#    #", "######"], (1, 2), False)
+
+    def test_register_pattern(self) -> None:
+        rows = ["#######", "#  #  #", "#  $  #", "#    @#", "#######"]
+        self.check(rows, (2, 3), False)
+        deadlock.register_pattern(["?#?", " $ "])
+        self.check(rows, (2, 3), True)
+        with self.assertRaises(ValueError):
+            deadlock.register_pattern(["$  #"])
+        with self.assertRaises(ValueError):
+            deadlock.register_pattern(["$x"])
+
+    def test_search_prunes_deadlocks(self) -> None:
+        start = np.array(S10)
+        goal_node, generated, _ = astar.a_star_search(
+            start, goal_test, deadlock.next_moves, h1, labeled=True)
+        _, plain_generated, _ = astar.a_star_search(start, goal_test, hw3.next_moves, h1, labeled=True)
+        self.assertEqual(goal_node.cost, OPTIMAL_DEPTHS[10])
+        self.assertLess(generated, plain_generated // 2)
+        flat_moves = deadlock.flat_next_moves(board.FlatBoard.from_state(start))
+        self.assertEqual([m for m, _ in flat_moves], [m for m, _ in deadlock.next_moves(start)])
+
+    def test_wraps_other_successor_functions(self) -> None:
+        start = np.array(S10)
+        for s in [start] + next_states(start):
+            filtered = deadlock.filter_deadlocks(hw3.next_moves, labeled=True)(s)
+            self.assertEqual([m for m, _ in filtered], [m for m, _ in deadlock.next_moves(s)])
+        # The deadlock engine keeps macro pushes rather than replacing them.
+        with_macros = batch.solve_level(0, "s10", start, batch.SolverConfig("hUID", "deadlock", True))
+        without = batch.solve_level(0, "s10", start, batch.SolverConfig("hUID", "deadlock"))
+        self.assertEqual(with_macros.depth, OPTIMAL_DEPTHS[10])
+        self.assertLess(with_macros.nodes_expanded, without.nodes_expanded)
+
+
+class TestClosedSets(unittest.TestCase):
+    def test_state_packer_round_trip(self) -> None:
+        for problem in (S10, S17):
+            start = np.array(problem)
+            packer = closedset.StatePacker(start)
+            keys = {packer(child) for child in next_states(start)}
+            self.assertEqual(len(keys), len(next_states(start)))
+            self.assertLess(max(keys).bit_length(), packer.bits + 1)
+            self.assertTrue(np.array_equal(packer.unpack(packer(start)), start))
+
+    def test_hash_closed_set_acts_as_dict(self) -> None:
+        for key_bits in (40, 130):
+            table = closedset.HashClosedSet(key_bits, capacity=8)
+            expected = {}
+            for i in range(500):
+                key = (i * 2654435761) % (1 << key_bits)
+                table[key] = expected[key] = i % 7
+            table[0] = expected[0] = 3
+            self.assertEqual(len(table), len(expected))
+            self.assertEqual({key: table[key] for key in table}, expected)
+            self.assertNotIn(12345, table)
+            self.assertIsNone(table.get(12345))
+
+    def test_packed_search_matches_dict_search(self) -> None:
+        start = np.array(S9)
+        goal_node, *counters = closedset.packed_a_star_search(start, goal_test, next_states, hUID)
+        plain_goal, *plain_counters = astar.a_star_search(start, goal_test, next_states, hUID)
+        self.assertEqual(counters, plain_counters)
+        self.assertEqual(goal_node.cost, plain_goal.cost)
+        with self.assertRaises(ValueError):
+            astar.a_star_search(start, goal_test, next_states, hUID, partial_expansion=True,
+                                closed_set=closedset.BloomClosedSet)
+
+    def test_bloom_filter(self) -> None:
+        bloom = closedset.BloomClosedSet(10000, 0.01)
+        for i in range(10000):
+            bloom[i] = 0
+        self.assertTrue(all(i in bloom for i in range(10000)))
+        false_positives = sum(i in bloom for i in range(10000, 30000))
+        self.assertLess(false_positives / 20000, 0.03)
+        self.assertLess(bloom.nbytes, 10000 * 10 // 8 + 1)
+        goal_node, *_ = closedset.bloom_a_star_search(
+            np.array(S7), goal_test, next_states, h1, capacity=100000)
+        self.assertEqual(goal_node.cost, OPTIMAL_DEPTHS[7])
+
+
+class TestMemoryReport(unittest.TestCase):
+    def test_attributes_search_memory(self) -> None:
+        tracemalloc.start(memreport.FRAMES)
+        try:
+            for progress in astar.iter_a_star_search(
+                    np.array(S9), goal_test, hw3.next_moves, hUID, labeled=True):
+                if progress.done:
+                    report = memreport.take_report()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(list(report.categories), list(memreport.CATEGORIES))
+        for category in ("PathNode objects", "state arrays", "state keys",
+                         "explored dict", "open list"):
+            self.assertGreater(report.categories[category], 0, category)
+        # Nearly everything still held belongs to the search.
+        self.assertLess(report.categories["other"], 0.1 * report.traced_current_bytes)
+        self.assertLessEqual(report.traced_current_bytes, report.traced_peak_bytes)
+        self.assertIn("state keys", report.format())
+
+    def test_attributes_by_function(self) -> None:
+        def line_in(function, text: str) -> tuple[str, int]:
+            source, start = inspect.getsourcelines(function)
+            return (inspect.getsourcefile(function),
+                    start + next(i for i, line in enumerate(source) if text in line))
+        cases = [
+            (closedset.StatePacker.__call__, "int.from_bytes", "state keys"),
+            (symmetry.canonical_key, "tobytes", "state keys"),
+            (closedset.HashClosedSet._allocate, "np.zeros", "explored dict"),
+            (astar.iter_a_star_search, "new_node = PathNode(", "PathNode objects"),
+            (astar.iter_a_star_search, "push(pq, new_node)", "open list"),
+            (hw3.applyDelta, "np.copy", "state arrays"),
+        ]
+        for function, text, category in cases:
+            self.assertEqual(memreport.function_category(*line_in(function, text)), category,
+                             (function, text))
+
+
+class TestValidator(unittest.TestCase):
+    def test_accepts_solutions(self) -> None:
+        for problem, moves in ((S1, "DDDldRR"), (S5, "uURuulDrdL")):
+            for solution in (moves, hw3.prettyMoves(moves)):
+                result = validator.validate(np.array(problem), solution)
+                self.assertTrue(result.ok, result.error)
+                self.assertEqual((result.moves, result.pushes), (len(moves), sum(map(str.isupper, moves))))
+
+    def test_rejects_bad_solutions(self) -> None:
+        cases = {
+            "DDDldR": "not solved",
+            "uDDldRR": "wall",
+            "dDDldRR": "pushes a box",
+            "DDDLdRR": "does not push",
+            "DDDldRx": "unknown move",
+        }
+        for moves, error in cases.items():
+            result = validator.validate(S1, moves)
+            self.assertFalse(result.ok, moves)
+            self.assertIn(error, result.error)
+        self.assertTrue(validator.validate(S1, "dddldrr", strict=False).ok)
+        self.assertFalse(validator.validate(S1, "UDDDLDRR", strict=False).legal)
+        with self.assertRaises(ValueError):
+            validator.validate(S1, ["Down", "Jump"])
+
+    def test_validate_all(self) -> None:
+        pairs = [(S1, "DDDldRR"), (S5, "uURuulDrdL"), (S1, "DDDldR"),
+                 (board.FlatBoard.from_state(np.array(S5)), "uURuulDrdL")]
+        results = list(validator.validate_all(pairs))
+        self.assertEqual([result.ok for result in results], [True, True, False, True])
+        # Replays start from a fresh copy of the level every time.
+        self.assertTrue(validator.validate(S1, "DDDldRR").ok)
+
+
+class TestPostOptimizer(unittest.TestCase):
+    def test_shorten_walks(self) -> None:
+        # S1's optimal pushes, with a detour before the fourth.
+        self.assertEqual(postopt.shorten_walks(S1, "DDDlrldRRlr"), "DDDldRR")
+        self.assertEqual(postopt.shorten_walks(S5, "uURuulDrdLrl"), "uURuulDrdL")
+        with self.assertRaises(ValueError):
+            postopt.shorten_walks(S1, "DDDldR")
+
+    def test_optimize_weighted_solutions(self) -> None:
+        for problem in (11, 15):
+            start = np.array(globals()[f"S{problem}"])
+            goal_node, *_ = astar.a_star_search(start, goal_test, hw3.next_moves,
+                                                lambda s: 5 * hUID(s), labeled=True)
+            moves = astar.solution_moves(goal_node)
+            self.assertGreater(len(moves), OPTIMAL_DEPTHS[problem])
+            shorter = postopt.optimize(start, moves, window=10, max_expansions=5000)
+            self.assertTrue(validator.validate(start, shorter).ok)
+            self.assertEqual(len(shorter), OPTIMAL_DEPTHS[problem])
+        for bad in ({"window": 0}, {"max_expansions": 0}):
+            with self.assertRaises(ValueError):
+                postopt.optimize(start, moves, **bad)
+
+    def test_batch_optimize(self) -> None:
+        config = batch.SolverConfig("hUID", "pi-corral", optimize=True)
+        result = batch.solve_level(0, "s16", np.array(S16), config)
+        self.assertEqual(result.depth, OPTIMAL_DEPTHS[16])
+        self.assertTrue(validator.validate(S16, result.moves).ok)
+
+    def test_batch_keeps_solution_when_optimizer_fails(self) -> None:
+        def fail(*args, **kwargs) -> str:
+            raise RuntimeError("optimizer bug")
+        self.addCleanup(setattr, postopt, "optimize", postopt.optimize)
+        postopt.optimize = fail
+        result = batch.solve_level(0, "s1", np.array(S1), batch.SolverConfig("h1", optimize=True))
+        self.assertEqual((result.status, result.depth), ("solved", OPTIMAL_DEPTHS[1]))
+        self.assertIn("optimizer bug", result.optimize_error)
+        self.assertIsNone(result.error)
+
+
 class TestH0(unittest.TestCase):
     def test_return_a(self) -> None:
         s1 = np.array(S1)
@@ -595,20 +1698,6 @@ def _get_depth_of_solution(goal_node: Optional[astar.PathNode]) -> int:
     return depth
 
 
-def _get_goal_node(
-    start_state: list[list[int]],
-    heuristic: HeuristicFunction,
-) -> Optional[astar.PathNode]:
-    """Wrapper for calling the provided `astar` module's search API."""
-    goal_node, *_ = astar.a_star_search(
-        np.array(start_state),
-        goal_test,
-        next_states,
-        heuristic,
-    )
-    return goal_node
-
-
 def _create_dynamic_simple_sokoban_tester(
     heuristic: HeuristicFunction,
     only_s17: bool,
@@ -625,11 +1714,10 @@ def _create_dynamic_simple_sokoban_tester(
             start_state: list[list[int]],
             depth_of_optimal_solution: int,
         ) -> None:
-            goal_node = _get_goal_node(start_state, heuristic)
-            self.assertIsNotNone(goal_node, "a solution exists")
-            depth_of_received_solution = _get_depth_of_solution(goal_node)
+            result = a_star(start_state, heuristic, cache=SOLUTION_CACHE)
+            self.assertIsNotNone(result.moves, "a solution exists")
             self.assertEqual(
-                depth_of_received_solution,
+                result.solution_depth,
                 depth_of_optimal_solution,
             )
 
@@ -683,11 +1771,10 @@ def _create_dynamic_extreme_sokoban_tester(
             start_state: list[list[int]],
             depth_of_optimal_solution: int,
         ) -> None:
-            goal_node = _get_goal_node(start_state, heuristic)
-            self.assertIsNotNone(goal_node, "a solution exists")
-            depth_of_received_solution = _get_depth_of_solution(goal_node)
+            result = a_star(start_state, heuristic, cache=SOLUTION_CACHE)
+            self.assertIsNotNone(result.moves, "a solution exists")
             self.assertEqual(
-                depth_of_received_solution,
+                result.solution_depth,
                 depth_of_optimal_solution,
             )
 
@@ -748,13 +1835,34 @@ class AStarSearchResult:
     num_nodes_generated: int
     num_nodes_expanded: int
     solution_depth: Optional[int]  # None if no solution found.
-    path: Optional[list[tuple[int]]]  # None if no solution found.
+    moves: Optional[str]  # LURD format. None if no solution found.
     elapsed_seconds: float
+    start_state: list[list[int]]
+    cached: bool = False  # Whether the result came from `SOLUTION_CACHE`.
+
+    def states(self) -> Iterator[State]:
+        """Lazily regenerate the boards along the solution."""
+        if self.moves is None:
+            raise ValueError("no solution was found")
+        return hw3.iterStates(np.array(self.start_state), self.moves)
+
+
+# Solutions are looked up in and saved to this store when it is set
+# (see --cache). Only solutions found with the same heuristic are used,
+# so cached runs still check that heuristic's optimality.
+SOLUTION_CACHE: Optional[solution_cache.SolutionCache] = None
+
+PROGRESS_EVERY = 5000
 
 
 def a_star(
     start_state: list[list[int]],
     heuristic: HeuristicFunction,
+    stats: Optional[astar.SearchStats] = None,
+    trace: Optional[searchtrace.TraceWriter] = None,
+    cache: Optional[solution_cache.SolutionCache] = None,
+    on_progress: Optional[Callable[[astar.SearchProgress], None]] = None,
+    on_finish: Optional[Callable[[astar.SearchProgress], None]] = None,
 ) -> AStarSearchResult:
     """
     Perform the A* algorithm and return relevant details of the search.
@@ -763,37 +1871,76 @@ def a_star(
     logic from presentation. Also, it has been merged with the shorthand
     conveniences of `sokoban` (namely, it automatically handles
     converting start states into NDArrays and automatically uses the
-    student's `goal_test` and `next_states` functions).
+    student's `goal_test` and `next_states` functions). The successors
+    come from `next_moves`, which labels each `next_states` successor
+    with its move, so the solution is returned as a move string rather
+    than a list of boards.
+
+    If a solution cache is given, a solution it holds for the same
+    heuristic is checked with the validator and returned instead of
+    searching (an invalid one is searched again), and new solutions are
+    added to it. `on_progress` is called with a progress event every
+    `PROGRESS_EVERY` expansions, and `on_finish` with the final event,
+    while the search's tables are still alive (e.g. to measure them).
     """
+    if cache is not None:
+        hit = cache.get(start_state, heuristic.__name__, "astar")
+        if hit is not None and validator.validate(start_state, hit.moves).ok:
+            return AStarSearchResult(
+                hit.nodes_generated,
+                hit.nodes_expanded,
+                hit.depth,
+                hit.moves,
+                0.0,
+                start_state,
+                cached=True,
+            )
+
     start_time = time.perf_counter()
-    goal_node, num_nodes_generated, num_nodes_expanded = astar.a_star_search(
+    for progress in astar.iter_a_star_search(
         np.array(start_state),
         goal_test,
-        next_states,
+        hw3.next_moves,
         heuristic,
-    )
+        stats,
+        trace,
+        labeled=True,
+        progress_every=PROGRESS_EVERY if on_progress is not None else None,
+    ):
+        if not progress.done:
+            on_progress(progress)
+        elif on_finish is not None:
+            on_finish(progress)
+    goal_node = progress.goal_node
+    num_nodes_generated = progress.node_generated
+    num_nodes_expanded = progress.node_expanded
     end_time = time.perf_counter()
     elapsed_seconds = end_time - start_time
 
-    # Reconstruct the path from the start state to the goal state.
+    # Read the moves from the start state to the goal state.
     if goal_node:
-        node = goal_node
-        path = [node.state1]
-        while node.parent:
-            node = node.parent
-            path.append(node.state1)
-        path.reverse()
-        solution_depth = len(path) - 1
+        moves = astar.solution_moves(goal_node)
+        solution_depth = len(moves)
+        if cache is not None:
+            cache.put(
+                start_state,
+                moves,
+                heuristic.__name__,
+                "astar",
+                num_nodes_generated,
+                num_nodes_expanded,
+            )
     else:
-        path = None
+        moves = None
         solution_depth = None
 
     return AStarSearchResult(
         num_nodes_generated,
         num_nodes_expanded,
         solution_depth,
-        path,
+        moves,
         elapsed_seconds,
+        start_state,
     )
 
 
@@ -805,6 +1952,30 @@ def a_star(
 STATIC_TEST_SUITES: dict[str, TestCaseClass] = {
     "goal_test": TestGoalTest,
     "next_states": TestNextStates,
+    "successor_deltas": TestSuccessorDeltas,
+    "flat_board": TestFlatBoard,
+    "corral": TestCorral,
+    "deadlock": TestDeadlockTable,
+    "closed_sets": TestClosedSets,
+    "levels": TestLevels,
+    "benchmark": TestBenchmark,
+    "search_stats": TestSearchStats,
+    "search_progress": TestSearchProgress,
+    "memory_report": TestMemoryReport,
+    "validator": TestValidator,
+    "post_optimizer": TestPostOptimizer,
+    "partial_expansion": TestPartialExpansion,
+    "early_duplicate_detection": TestEarlyDuplicateDetection,
+    "consistent_mode": TestConsistentMode,
+    "open_lists": TestOpenLists,
+    "search_trace": TestSearchTrace,
+    "solution_cache": TestSolutionCache,
+    "symmetry": TestSymmetry,
+    "macros": TestMacros,
+    "move_strings": TestMoveStrings,
+    "service": TestService,
+    "batch": TestBatch,
+    "checkpoint": TestCheckpoint,
     "h0": TestH0,
     "h1": TestH1,
 }
@@ -839,7 +2010,8 @@ test_type_group.add_argument(
     metavar=("NUM", "HEURISTIC"),
     nargs=2,
     help="simply time the Sokoban solver with initial state and heuristic "
-         "e.g. `s17 hUID` to time on s17 with UID heuristic",
+         "e.g. `s17 hUID` to time on s17 with UID heuristic, or "
+         "`levels.xsb:3 hUID` for the 3rd level of an XSB collection",
 )
 test_type_group.add_argument(
     "-c", "--compare",
@@ -868,6 +2040,32 @@ s17_inclusion_group.add_argument(
          "(used with -x)",
 )
 
+parser.add_argument(
+    "-p", "--profile",
+    dest="profile",
+    action="store_true",
+    help="print per-phase timers and search counters (used with -m)",
+)
+parser.add_argument(
+    "-T", "--trace",
+    dest="trace_path",
+    metavar="FILE",
+    help="write a binary search trace to FILE and summarize it (used with -m)",
+)
+parser.add_argument(
+    "-M", "--memory",
+    dest="memory",
+    action="store_true",
+    help="print peak RSS and a tracemalloc breakdown of the memory held "
+         "at the end of the search (used with -m)",
+)
+parser.add_argument(
+    "--cache",
+    dest="cache_path",
+    metavar="FILE",
+    help="reuse and save solutions in the SQLite solution store FILE "
+         "(used with -s/-c)",
+)
 parser.add_argument(
     "-v", "--verbose",
     dest="verbose",
@@ -908,6 +2106,14 @@ def main() -> None:
     compare_all_solvers: bool = args.compare_all_solvers
     exclude_s17: bool = args.exclude_s17
     only_s17: bool = args.only_s17
+    profile: bool = args.profile
+    trace_path: Optional[str] = args.trace_path
+    memory: bool = args.memory
+    cache_path: Optional[str] = args.cache_path
+
+    global SOLUTION_CACHE
+    if cache_path is not None:
+        SOLUTION_CACHE = solution_cache.SolutionCache(cache_path)
 
     if compare_all_solvers:
         if run_extreme_sokoban_too and not bypass_confirmations:
@@ -917,9 +2123,19 @@ def main() -> None:
 
     if config_to_time is not None:
         initial_state, heuristic = _validate_config_to_time(config_to_time)
-        _simply_time_a_config(initial_state, heuristic)
+        _simply_time_a_config(initial_state, heuristic, profile, trace_path,
+                              memory)
         return
 
+    if profile or trace_path or memory:
+        print(
+            "Profiling, tracing and memory reports only apply to the "
+            "performance timer. "
+            "Use with -m.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
     if run_extreme_sokoban_too and sokoban_heuristic_name is None:
         print(
             "Opting into extreme Sokoban test cases does not make sense "
@@ -996,9 +2212,11 @@ def _compare_all_solvers(
 
         # Only test h1 and hUID. h0 just wastes time.
         print(f"\rRunning s{state_num}, {h1.__name__}...", end="")
-        h1_result = a_star(initial_state, h1)
-        print(f"\rRunning s{state_num}, {hUID.__name__}...", end="")
-        hUID_result = a_star(initial_state, hUID)
+        h1_result = a_star(initial_state, h1, cache=SOLUTION_CACHE,
+                           on_progress=_show_progress(state_num, h1))
+        print(f"\r\033[KRunning s{state_num}, {hUID.__name__}...", end="")
+        hUID_result = a_star(initial_state, hUID, cache=SOLUTION_CACHE,
+                             on_progress=_show_progress(state_num, hUID))
 
         comparison = _compare_h1_and_HUID(h1_result, hUID_result, state_num)
 
@@ -1027,7 +2245,7 @@ def _compare_all_solvers(
             )
 
             print(
-                f"\r{state_num:>5} | {h_id:>4} | " +
+                f"\r\033[K{state_num:>5} | {h_id:>4} | " +
                 generated_line + " | " + expanded_line + " | " +
                 elapsed_line + " | " + depth_line + " || " +
                 f"{OPTIMAL_DEPTHS[state_num]:<5}"
@@ -1035,6 +2253,21 @@ def _compare_all_solvers(
         print(div)
 
 
+def _show_progress(
+    state_num: int,
+    heuristic: HeuristicFunction,
+) -> Callable[[astar.SearchProgress], None]:
+    def show(progress: astar.SearchProgress) -> None:
+        print(
+            f"\rRunning s{state_num}, {heuristic.__name__}... "
+            f"f={progress.f_bound}, {progress.node_expanded} expanded, "
+            f"{progress.open_size} open, {progress.nodes_per_second:.0f}/s",
+            end="",
+            flush=True,
+        )
+    return show
+
+
 def _get_state_nums_to_compare(
     run_extreme_sokoban_too: bool,
     exclude_s17: bool,
@@ -1098,8 +2331,16 @@ def _validate_config_to_time(
         # pylint: disable=eval-used
         state_matrix: list[list[int]] = eval(f"S{state_num}")  # Hack.
     else:
-        print(f"Invalid initial state {state_str!r}", file=sys.stderr)
-        sys.exit(2)
+        # Otherwise treat it as `FILE[:N]`, the Nth level of an XSB file.
+        path, _, index = state_str.rpartition(":")
+        if not (path and index.isdigit()):
+            path, index = state_str, "1"
+        try:
+            level = levels.load_level(path, int(index))
+        except (OSError, LookupError, ValueError):
+            print(f"Invalid initial state {state_str!r}", file=sys.stderr)
+            sys.exit(2)
+        state_matrix = level.state.tolist()
 
     if heuristic_str == "h0":
         heuristic = h0
@@ -1117,15 +2358,45 @@ def _validate_config_to_time(
 def _simply_time_a_config(
     initial_state: list[list[int]],
     heuristic: HeuristicFunction,
+    profile: bool = False,
+    trace_path: Optional[str] = None,
+    memory: bool = False,
 ) -> None:
     print("Running performance timer...")
 
-    result = a_star(initial_state, heuristic)
+    # Instrumentation slows the search down, so the elapsed time printed
+    # with --profile, --trace or --memory is not comparable with a plain
+    # run.
+    stats = astar.SearchStats() if profile else None
+    trace = searchtrace.TraceWriter(trace_path) if trace_path else None
+    reports: list[memreport.MemoryReport] = []
+    if memory:
+        tracemalloc.start(memreport.FRAMES)
+    try:
+        result = a_star(
+            initial_state, heuristic, stats, trace,
+            on_finish=(lambda _: reports.append(memreport.take_report()))
+            if memory else None,
+        )
+    finally:
+        if trace is not None:
+            trace.close()
+        if memory:
+            tracemalloc.stop()
 
     print(f"Nodes Generated by A*: {result.num_nodes_generated}")
     print(f"Nodes Expanded by A*: {result.num_nodes_expanded}")
     print(f"Solution Depth: {result.solution_depth}")
     print(f"Elapsed Time: {result.elapsed_seconds:.3f}s")
+    if stats is not None:
+        print()
+        print(stats.report())
+    if trace_path:
+        print()
+        print(searchtrace.summarize_trace(trace_path).report())
+    for report in reports:
+        print()
+        print(report.format())
 
 
 def _prepare_test_suites(
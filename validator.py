@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Fast solution validator.
+
+`validate` replays a solution on a flat bytearray board (see board.py)
+in place, one index addition and a couple of byte reads per move, and
+reports whether every move is legal and the level ends up solved. It
+never copies a board, so checking a solution costs O(moves) plus one
+conversion of the level.
+
+Solutions are LURD strings, with pushes in uppercase (a move whose case
+does not match whether it pushes is an error unless strict=False), or
+lists of move names as returned by `hw3.prettyMoves`:
+
+    result = validator.validate(s1, "dLuuRR")
+    if not result.ok:
+        print(result.error)
+
+`validate_all` checks many (level, solution) pairs, converting each
+distinct level once, for verifying thousands of cached or externally
+supplied solutions. From the command line, the solutions come from the
+levels' `Solution:` lines, a file with one solution per level, or a
+solution cache:
+
+    python validator.py set.xsb
+    python validator.py set.xsb --solutions set.lurd
+    python validator.py set.xsb --cache solutions.db
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+
+import levels
+from board import FlatBoard
+from hw3 import MOVE_LETTERS, blank, box, boxstar, keeper, keeperstar, star
+
+State = npt.NDArray[np.int_]
+Level = Union[State, list[list[int]], FlatBoard]
+Moves = Union[str, Iterable[str]]
+
+
+@dataclass
+class ValidationResult:
+    legal: bool  # Every move was legal.
+    solved: bool  # The level was solved after the last move.
+    moves: int  # Moves replayed, up to the first illegal one.
+    pushes: int
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.legal and self.solved
+
+
+def move_string(moves: Moves) -> str:
+    """A LURD string of a solution: the string itself, or the letters of
+    a list of move names such as hw3.prettyMoves returns."""
+    if isinstance(moves, str):
+        return moves
+    try:
+        return "".join(MOVE_LETTERS[name] for name in moves)
+    except KeyError as err:
+        raise ValueError(f"unknown move name {err.args[0]!r}") from None
+
+
+def validate(level: Level, moves: Moves, strict: bool = True) -> ValidationResult:
+    """Replay a solution on a level.
+
+    :param level: the start state, as a numpy state, nested lists or a
+        FlatBoard
+    :param moves: a LURD string or a list of move names
+    :param strict: for LURD strings, require pushes in uppercase and
+        other moves in lowercase. Move names have no case to check
+    """
+    start = level if isinstance(level, FlatBoard) else FlatBoard.from_state(np.asarray(level))
+    return _replay(bytearray(start.cells), start.width, start.keeper, moves, strict)
+
+
+def _replay(cells: bytearray, width: int, k: int, moves: Moves, strict: bool) -> ValidationResult:
+    check_case = strict and isinstance(moves, str)
+    moves = move_string(moves)
+    offsets = {"u": -width, "d": width, "l": -1, "r": 1,
+               "U": -width, "D": width, "L": -1, "R": 1}
+    pushes = 0
+    for i, letter in enumerate(moves):
+        offset = offsets.get(letter)
+        if offset is None:
+            return ValidationResult(False, False, i, pushes, f"unknown move {letter!r} at move {i + 1}")
+        k1 = k + offset
+        v1 = cells[k1]
+        if v1 == blank or v1 == star:
+            if check_case and letter.isupper():
+                return ValidationResult(False, False, i, pushes, f"{letter!r} at move {i + 1} does not push")
+            cells[k1] = keeper if v1 == blank else keeperstar
+        elif v1 == box or v1 == boxstar:
+            k2 = k1 + offset
+            v2 = cells[k2]
+            if v2 != blank and v2 != star:
+                return ValidationResult(False, False, i, pushes, f"{letter!r} at move {i + 1} pushes a blocked box")
+            if check_case and letter.islower():
+                return ValidationResult(False, False, i, pushes, f"{letter!r} at move {i + 1} pushes a box")
+            cells[k2] = box if v2 == blank else boxstar
+            cells[k1] = keeper if v1 == box else keeperstar
+            pushes += 1
+        else:
+            return ValidationResult(False, False, i, pushes, f"{letter!r} at move {i + 1} walks into a wall")
+        cells[k] = star if cells[k] == keeperstar else blank
+        k = k1
+    solved = box not in cells
+    return ValidationResult(True, solved, len(moves), pushes, None if solved else "the level is not solved")
+
+
+def validate_all(solutions: Iterable[tuple[Level, Moves]], strict: bool = True) -> Iterator[ValidationResult]:
+    """validate() every (level, solution) pair, in order. Each distinct
+    level is converted to a board once, however many solutions it has."""
+    boards: dict[bytes, FlatBoard] = {}
+    for level, moves in solutions:
+        if isinstance(level, FlatBoard):
+            start = level
+        else:
+            state = np.asarray(level)
+            key = np.array(state.shape, dtype=np.int32).tobytes() + state.astype(np.int8).tobytes()
+            start = boards.get(key)
+            if start is None:
+                start = boards[key] = FlatBoard.from_state(state)
+        yield _replay(bytearray(start.cells), start.width, start.keeper, moves, strict)
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Check the solutions of an XSB collection.")
+    parser.add_argument("path")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--solutions", metavar="FILE",
+                        help="one LURD solution per line, in level order")
+    source.add_argument("--cache", metavar="DB",
+                        help="check the shortest solution in this solution cache")
+    parser.add_argument("--lenient", action="store_true",
+                        help="accept pushes written in lowercase and vice versa")
+    args = parser.parse_args()
+
+    collection = list(levels.iter_levels(args.path))
+    if args.solutions:
+        with open(args.solutions, encoding="utf-8") as file:
+            moves = [line.strip() for line in file]
+    elif args.cache:
+        import solution_cache
+        with solution_cache.SolutionCache(args.cache) as cache:
+            hits = [cache.get(level.state) for level in collection]
+        moves = [hit.moves if hit else None for hit in hits]
+    else:
+        moves = [level.metadata.get("Solution") for level in collection]
+    pairs = [(level, m) for level, m in zip(collection, moves) if m]
+
+    start = time.perf_counter()
+    results = list(validate_all(((level.state, m) for level, m in pairs), not args.lenient))
+    elapsed = time.perf_counter() - start
+    failed = 0
+    for (level, _), result in zip(pairs, results):
+        if not result.ok:
+            failed += 1
+            print(f"{level.title or f'#{level.index}'}: {result.error}")
+    print(f"{len(results) - failed}/{len(results)} solutions valid "
+          f"({len(collection) - len(pairs)} levels without one), "
+          f"{sum(r.moves for r in results)} moves in {elapsed:.3f} s")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()